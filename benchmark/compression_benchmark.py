@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""
+Compression benchmark: bytes saved against CPU spent
+
+Compresses the bodies of /sample_1/teams-with-detail (json and normalized) and
+of GraphQL nested_4_layers_with_owners, on the dataset of
+identity_map_benchmark.py, with the compressors of src/compression.py.
+zstd is measured when the optional `zstandard` package is installed.
+
+Usage:
+    python benchmark/compression_benchmark.py [--teams 20] [--iterations 5]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from statistics import median
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+
+async def fetch_bodies() -> dict[str, bytes]:
+    from benchmark.identity_map_benchmark import NESTED_4_LAYERS_WITH_OWNERS
+    from src.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://benchmark', timeout=120) as client:
+        headers = {'accept-encoding': 'identity'}
+        rest = await client.get('/sample_1/teams-with-detail', headers=headers)
+        normalized = await client.get('/sample_1/teams-with-detail?format=normalized', headers=headers)
+        graphql = await client.post('/graphql', json={'query': NESTED_4_LAYERS_WITH_OWNERS}, headers=headers)
+    return {'teams-with-detail': rest.content,
+            'teams-with-detail normalized': normalized.content,
+            'graphql nested_4_layers': graphql.content}
+
+
+async def run(args):
+    from benchmark.identity_map_benchmark import seed
+    from src.compression import GzipCompressor, ZstdCompressor, zstandard
+
+    counts = await seed(args.teams, args.sprints, args.stories, args.tasks, args.users)
+    print(f"Dataset: {counts}")
+
+    compressors = [(f'gzip-{level}', lambda level=level: GzipCompressor(level)) for level in (1, 6, 9)]
+    if zstandard is not None:
+        compressors += [(f'zstd-{level}', lambda level=level: ZstdCompressor(level)) for level in (1, 3, 9)]
+    else:
+        print("zstandard is not installed, zstd skipped")
+
+    for name, body in (await fetch_bodies()).items():
+        print(f"\n  {name}: {len(body)} bytes")
+        print(f"    {'encoding':<10} {'bytes':>10} {'ratio':>7} {'cpu':>9} {'saved/cpu ms':>14}")
+        for encoding, create in compressors:
+            times = []
+            for _ in range(args.iterations):
+                compressor = create()
+                start = time.perf_counter()
+                compressed = compressor.compress(body, final=True)
+                times.append((time.perf_counter() - start) * 1000)
+            cpu_ms = median(times)
+            saved = len(body) - len(compressed)
+            print(f"    {encoding:<10} {len(compressed):>10} {len(body) / len(compressed):>6.1f}x "
+                  f"{cpu_ms:>6.1f} ms {saved / cpu_ms:>14.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compression benchmark")
+    parser.add_argument("--teams", type=int, default=20)
+    parser.add_argument("--sprints", type=int, default=5, help="sprints per team")
+    parser.add_argument("--stories", type=int, default=10, help="stories per sprint")
+    parser.add_argument("--tasks", type=int, default=10, help="tasks per story")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--iterations", type=int, default=5)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""
+Document cache benchmark: per request GraphQL overhead before execution
+
+Times what /graphql does to a document before running it (response cache key,
+operation type, field tree), for the benchmark queries, with the plain
+GraphQLHandler and with CachedGraphQLHandler (src/graphql_documents.py),
+where a repeated document is parsed and validated once.
+
+Usage:
+    python benchmark/document_cache_benchmark.py [--iterations 1000]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from graphql import parse, print_ast, validate
+
+
+def timed(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1_000_000
+
+
+def run(args):
+    from benchmark.identity_map_benchmark import NESTED_4_LAYERS_WITH_OWNERS
+    from src.main import graphql_handler
+    from src.response_cache import graphql_cache_key
+    from pydantic_resolve.graphql import GraphQLHandler
+    from pydantic_resolve.graphql.query_parser import QueryParser
+
+    queries = {
+        'users': '{ userGetUsers { id name } }',
+        'nested_4_layers_with_owners': NESTED_4_LAYERS_WITH_OWNERS,
+    }
+    parser = QueryParser()
+    documents = graphql_handler.documents
+
+    for name, query in queries.items():
+        def uncached():
+            print_ast(parse(query)), json.dumps({})  # response cache key
+            GraphQLHandler._detect_operation_type(graphql_handler, query)
+            parser.parse(query)
+
+        def uncached_validated():
+            uncached()
+            validate(graphql_handler.schema, parse(query))
+
+        def cached():
+            graphql_cache_key(query, None, None)
+            documents.validate(query, graphql_handler.schema)
+            graphql_handler._detect_operation_type(query)
+            graphql_handler.parser.parse(query)
+
+        print(f"\n  {name} ({len(query)} chars)")
+        print(f"    {'parse per request':<30} {timed(uncached, args.iterations):>8.1f} us")
+        print(f"    {'parse + validate per request':<30} {timed(uncached_validated, args.iterations // 10):>8.1f} us")
+        print(f"    {'document cache':<30} {timed(cached, args.iterations):>8.1f} us")
+    print(f"\n  {documents.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Document cache benchmark")
+    parser.add_argument("--iterations", type=int, default=1000)
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+"""
+Execution plan benchmark: compiled vs interpreted GraphQL execution
+
+Runs every TEST_SCENARIOS query of benchmark/tests/test_queries.py through
+CachedGraphQLHandler, interpreted (the Resolver walks the response models) and
+from the plan compiled for the document (src/execution_plans.py), over a
+generated dataset, checks both return the same result and reports the median.
+
+Usage:
+    python benchmark/execution_plan_benchmark.py [--teams 20] [--sprints 5] [--stories 10] [--tasks 10] [--users 50]
+"""
+
+import argparse
+import asyncio
+import os
+import re
+import sys
+import time
+from statistics import median
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark.identity_map_benchmark import seed
+from benchmark.tests.test_queries import QUERIES, TEST_SCENARIOS
+
+# the benchmark queries predate the entity prefixed names of the root fields
+ROOT_FIELDS = {
+    'get_users': 'userGetUsers',
+    'get_teams': 'teamGetTeams',
+    'get_sprints': 'sprintGetSprints',
+    'get_stories': 'storyGetStories',
+    'get_tasks': 'taskGetTasks',
+}
+
+
+def scenario_query(name: str) -> str:
+    return re.sub(r'\bget_\w+\b', lambda m: ROOT_FIELDS.get(m.group(), m.group()), QUERIES[name])
+
+
+async def measure(execute, iterations: int) -> float:
+    times = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await execute()
+        times.append((time.perf_counter() - start) * 1000)
+    return median(times)
+
+
+async def run(args):
+    import src.main as main
+    from src.main import graphql_documents, graphql_handler, plan_compiler
+
+    counts = await seed(args.teams, args.sprints, args.stories, args.tasks, args.users)
+    print(f"Dataset: {counts}")
+    main.cache_hints.hints.clear()  # nothing served by the field cache, both sides execute
+
+    print(f"  {'scenario':<32} {'interpreted':>12} {'compiled':>12} {'speedup':>8}")
+    for name in TEST_SCENARIOS:
+        query = scenario_query(name)
+        prepared = graphql_documents.pin(query)
+
+        async def execute():
+            result = await graphql_handler.execute(query=query)
+            assert not result.get('errors'), result['errors']
+            return result
+
+        prepared.plans.clear()
+        interpreted = await execute()  # warmup, response models are built on the first run
+        interpreted_ms = await measure(execute, args.iterations)
+
+        plan_compiler.compile(graphql_handler, query)
+        compiled = await execute()
+        assert compiled['data'] == interpreted['data'], f'{name}: compiled result differs'
+        compiled_ms = await measure(execute, args.iterations)
+
+        print(f"  {name:<32} {interpreted_ms:>9.1f} ms {compiled_ms:>9.1f} ms {interpreted_ms / compiled_ms:>7.1f}x")
+    print(f"\n  {graphql_handler.executor.executor.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Execution plan benchmark")
+    parser.add_argument("--teams", type=int, default=20)
+    parser.add_argument("--sprints", type=int, default=5, help="sprints per team")
+    parser.add_argument("--stories", type=int, default=10, help="stories per sprint")
+    parser.add_argument("--tasks", type=int, default=10, help="tasks per story")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--iterations", type=int, default=5)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+"""
+Identity map benchmark: nested_4_layers_with_owners at scale
+
+Builds team -> sprint -> story(owner) -> task(owner) trees over a generated
+dataset where most tasks are owned by a few users, with and without the
+identity map (src/identity_map.py), and reports construction time and the
+memory held by the tree.
+
+Usage:
+    python benchmark/identity_map_benchmark.py [--teams 20] [--sprints 5] [--stories 10] [--tasks 10] [--users 50]
+"""
+
+import argparse
+import asyncio
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from statistics import median
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+NESTED_4_LAYERS_WITH_OWNERS = """
+    query {
+        teamGetTeams {
+            id name
+            sprints {
+                id name
+                stories {
+                    id name
+                    owner { id name }
+                    tasks { id name estimate owner { id name } }
+                }
+            }
+        }
+    }
+"""
+
+
+async def seed(teams: int, sprints: int, stories: int, tasks: int, users: int, seed: int = 42):
+    """replace the mock data by a synthetic dataset (src/dataset.py), ~80% of the owners are the first 3 users."""
+    import src.db as db
+    from src.dataset import DatasetSpec, load
+
+    await db.init()
+    spec = DatasetSpec(teams=teams, sprints=sprints, stories=stories, tasks=tasks, users=users, skew=2.0, seed=seed)
+    return (await load(db.engine, spec)).rows
+
+
+async def build_rest_tree(resolver_class):
+    """sample_1 teams-with-detail, the tree stays alive so its size can be measured."""
+    import src.db as db
+    import src.services.team.query as tmq
+    from src.router.sample_1.schema import Sample1TeamDetail
+
+    async with db.async_session() as session:
+        teams = await tmq.get_teams(session)
+        teams = [Sample1TeamDetail.model_validate(t) for t in teams]
+        return await resolver_class().resolve(teams)
+
+
+async def measure(build, iterations: int) -> dict:
+    """median time of untraced runs, memory from one run under tracemalloc (which slows it down)."""
+    times = []
+    for _ in range(iterations):
+        gc.collect()
+        start = time.perf_counter()
+        await build()
+        times.append((time.perf_counter() - start) * 1000)
+
+    gc.collect()
+    tracemalloc.start()
+    result = await build()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return dict(time_ms=median(times), retained_mb=retained / 2**20, peak_mb=peak / 2**20)
+
+
+def print_row(name: str, metrics: dict):
+    print(f"  {name:<28} {metrics['time_ms']:>10.1f} ms {metrics['retained_mb']:>10.2f} MB {metrics['peak_mb']:>10.2f} MB")
+
+
+async def run(args):
+    from pydantic_resolve import Resolver
+    from src.identity_map import IdentityMapResolver, with_identity_map
+    from src.main import graphql_handler
+
+    counts = await seed(args.teams, args.sprints, args.stories, args.tasks, args.users)
+    print(f"Dataset: {counts}")
+    print(f"  {'':<28} {'time':>13} {'retained':>13} {'peak':>13}")
+
+    plain_resolver_class = graphql_handler.executor.resolver_class
+    shared_resolver_class = with_identity_map(plain_resolver_class)
+
+    async def execute_graphql():
+        return await graphql_handler.execute(query=NESTED_4_LAYERS_WITH_OWNERS)
+
+    # warmup, metadata analysis and type adapters are built on the first run
+    await build_rest_tree(Resolver)
+    await build_rest_tree(IdentityMapResolver)
+    await execute_graphql()
+
+    print_row('REST tree', await measure(lambda: build_rest_tree(Resolver), args.iterations))
+    print_row('REST tree + identity map', await measure(lambda: build_rest_tree(IdentityMapResolver), args.iterations))
+
+    graphql_handler.executor.resolver_class = plain_resolver_class
+    print_row('GraphQL', await measure(execute_graphql, args.iterations))
+    graphql_handler.executor.resolver_class = shared_resolver_class
+    await execute_graphql()
+    print_row('GraphQL + identity map', await measure(execute_graphql, args.iterations))
+    graphql_handler.executor.resolver_class = plain_resolver_class
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Identity map benchmark")
+    parser.add_argument("--teams", type=int, default=20)
+    parser.add_argument("--sprints", type=int, default=5, help="sprints per team")
+    parser.add_argument("--stories", type=int, default=10, help="stories per sprint")
+    parser.add_argument("--tasks", type=int, default=10, help="tasks per story")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--iterations", type=int, default=5)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""
+MessagePack benchmark: encoding and decoding a large tree, against JSON
+
+Measures, on the dataset of identity_map_benchmark.py, the bodies
+src/formats.py produces for /sample_1/teams-with-detail (nested and normalized)
+and for the result of GraphQL nested_4_layers_with_owners: encode time on the
+server, decode time on a (python) client and size, raw and gzipped.
+Needs the optional `msgpack` package.
+
+Usage:
+    python benchmark/msgpack_benchmark.py [--teams 20] [--iterations 5]
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import sys
+import time
+from statistics import median
+from typing import List
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydantic import TypeAdapter
+
+
+def timed(fn, iterations: int) -> float:
+    times = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return median(times)
+
+
+async def run(args):
+    from benchmark.identity_map_benchmark import NESTED_4_LAYERS_WITH_OWNERS, build_rest_tree, seed
+    from src.formats import Representation, msgpack
+    from src.identity_map import IdentityMapResolver
+    from src.main import graphql_handler
+    from src.normalize import normalize_models
+    from src.router.sample_1.schema import Sample1TeamDetail
+
+    if msgpack is None:
+        print("msgpack is not installed")
+        return
+
+    counts = await seed(args.teams, args.sprints, args.stories, args.tasks, args.users)
+    print(f"Dataset: {counts}")
+    tree = await build_rest_tree(IdentityMapResolver)
+    adapter = TypeAdapter(List[Sample1TeamDetail])
+    graphql_result = await graphql_handler.execute(query=NESTED_4_LAYERS_WITH_OWNERS)
+    assert not graphql_result.get('errors'), graphql_result['errors']
+
+    cases = {
+        'teams-with-detail': (lambda: adapter.dump_json(tree),
+                              lambda: adapter.dump_python(tree, mode='json')),
+        'teams-with-detail normalized': (
+            lambda: Representation(normalized=True).encode(normalize_models(tree, adapter.dump_python(tree, mode='json'))),
+            lambda: normalize_models(tree, adapter.dump_python(tree, mode='json'))),
+        'graphql nested_4_layers': (lambda: Representation().encode(graphql_result),
+                                    lambda: graphql_result),
+    }
+    binary = Representation(binary=True)
+
+    for name, (encode_json, dump) in cases.items():
+        as_json = encode_json()
+        as_msgpack = binary.encode(dump())
+        assert msgpack.unpackb(as_msgpack) == json.loads(as_json)
+
+        print(f"\n  {name}")
+        print(f"    {'encoding':<9} {'encode':>9} {'decode':>9} {'bytes':>10} {'gzip-6':>9}")
+        for encoding, body, encode, decode in [
+            ('json', as_json, encode_json, json.loads),
+            ('msgpack', as_msgpack, lambda: binary.encode(dump()), msgpack.unpackb),
+        ]:
+            encode_ms = timed(encode, args.iterations)
+            decode_ms = timed(lambda: decode(body), args.iterations)
+            print(f"    {encoding:<9} {encode_ms:>6.1f} ms {decode_ms:>6.1f} ms {len(body):>10} "
+                  f"{len(gzip.compress(body, 6)):>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MessagePack benchmark")
+    parser.add_argument("--teams", type=int, default=20)
+    parser.add_argument("--sprints", type=int, default=5, help="sprints per team")
+    parser.add_argument("--stories", type=int, default=10, help="stories per sprint")
+    parser.add_argument("--tasks", type=int, default=10, help="tasks per story")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--iterations", type=int, default=5)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,11 +3,13 @@
 pydantic-resolve vs Strawberry GraphQL Performance Benchmark
 
 Usage:
-    python benchmark/run_benchmark.py [--quick] [--output-dir DIR]
+    python benchmark/run_benchmark.py [--quick] [--output-dir DIR] [--dataset SPEC]
 
 Options:
     --quick         Run quick test (10 iterations instead of 50)
     --output-dir    Specify output directory for results
+    --dataset       Synthetic dataset instead of the mock data, eg: teams=50,users=500,skew=1.2
+                    (parameters of src.dataset.DatasetSpec)
 """
 
 import asyncio
@@ -41,7 +43,7 @@ async def execute_strawberry(query: str) -> dict:
     return result
 
 
-async def run_benchmark(quick: bool = False, output_dir: str = "benchmark/results"):
+async def run_benchmark(quick: bool = False, output_dir: str = "benchmark/results", dataset: str = None):
     """Run complete benchmark suite."""
     iterations = 10 if quick else 50
     collector = MetricsCollector()
@@ -58,7 +60,11 @@ async def run_benchmark(quick: bool = False, output_dir: str = "benchmark/result
     print("Initializing database...")
     import src.db as db
     await db.init()
-    await db.prepare()
+    if dataset:
+        from src.dataset import DatasetSpec, load
+        print(f"Dataset: {await load(db.engine, DatasetSpec.parse(dataset))}")
+    else:
+        await db.prepare()
     print("Database initialized.\n")
 
     # Warmup: Execute each scenario once to prime caches
@@ -223,9 +229,13 @@ def main():
         default="benchmark/results",
         help="Output directory for results (default: benchmark/results)"
     )
+    parser.add_argument(
+        "--dataset",
+        help="Synthetic dataset instead of the mock data, eg: teams=50,users=500,skew=1.2"
+    )
     args = parser.parse_args()
 
-    asyncio.run(run_benchmark(quick=args.quick, output_dir=args.output_dir))
+    asyncio.run(run_benchmark(quick=args.quick, output_dir=args.output_dir, dataset=args.dataset))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+"""
+Serialization benchmark: encoding a large teams-with-detail tree
+
+Compares, on the dataset of identity_map_benchmark.py:
+- FastAPI: serialize_response (dump, validate again) + JSONResponse rendering
+- one pass by pydantic-core (`TypeAdapter.dump_json`, what CachedRoute does)
+- splicing JSON fragments of repeated entities (eg: User) cached per (class, id)
+  into a tree encoded model by model
+
+Usage:
+    python benchmark/serialization_benchmark.py [--teams 20] [--iterations 5]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from statistics import median
+from typing import List
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydantic import BaseModel, TypeAdapter
+
+
+def splice_encoder():
+    from src.normalize import _object_fields
+    fragments: dict[tuple, bytes] = {}
+
+    def encode(value) -> bytes:
+        if isinstance(value, list):
+            return b'[' + b','.join(encode(v) for v in value) + b']'
+        if not isinstance(value, BaseModel):
+            return json.dumps(value).encode()
+
+        kls = type(value)
+        object_fields = _object_fields(kls)
+        if not object_fields:
+            key = (kls, value.id)
+            fragment = fragments.get(key)
+            if fragment is None:
+                fragment = fragments[key] = kls.__pydantic_serializer__.to_json(value, by_alias=True)
+            return fragment
+
+        head = kls.__pydantic_serializer__.to_json(value, by_alias=True, exclude={n for n, _ in object_fields})
+        parts = [head[:-1]]
+        for name, key in object_fields:
+            parts.append(b'%s"%s":' % (b',' if len(parts) > 1 or len(head) > 2 else b'', key.encode()))
+            parts.append(encode(getattr(value, name)))
+        parts.append(b'}')
+        return b''.join(parts)
+
+    return encode
+
+
+async def run(args):
+    import src.main  # noqa: F401, configures the ER diagram
+    from fastapi.routing import serialize_response
+    from fastapi.utils import create_model_field
+    from benchmark.identity_map_benchmark import build_rest_tree, seed
+    from src.identity_map import IdentityMapResolver
+    from src.router.sample_1.schema import Sample1TeamDetail
+
+    counts = await seed(args.teams, args.sprints, args.stories, args.tasks, args.users)
+    print(f"Dataset: {counts}")
+    tree = await build_rest_tree(IdentityMapResolver)
+
+    adapter = TypeAdapter(List[Sample1TeamDetail])
+    field = create_model_field(name='Response', type_=List[Sample1TeamDetail], mode='serialization')
+    splice = splice_encoder()
+
+    async def fastapi_default():
+        content = await serialize_response(field=field, response_content=tree, is_coroutine=True)
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+    async def one_pass():
+        return adapter.dump_json(tree)
+
+    async def fragments():
+        return splice(tree)
+
+    expected = await fastapi_default()
+    for name, encode in [('FastAPI default', fastapi_default), ('pydantic-core one pass', one_pass),
+                         ('cached fragments', fragments)]:
+        body = await encode()
+        assert json.loads(body) == json.loads(expected)
+        times = []
+        for _ in range(args.iterations):
+            start = time.perf_counter()
+            await encode()
+            times.append((time.perf_counter() - start) * 1000)
+        print(f"  {name:<24} {median(times):>8.1f} ms {len(body):>10} bytes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serialization benchmark")
+    parser.add_argument("--teams", type=int, default=20)
+    parser.add_argument("--sprints", type=int, default=5, help="sprints per team")
+    parser.add_argument("--stories", type=int, default=10, help="stories per sprint")
+    parser.add_argument("--tasks", type=int, default=10, help="tasks per story")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--iterations", type=int, default=5)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
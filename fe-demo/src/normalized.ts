@@ -0,0 +1,68 @@
+/**
+ * Client side of the normalized response format (see src/normalize.py).
+ *
+ * Every entity is sent once in `entities[type][id]`, nested occurrences are
+ * replaced by the id and `types[type][field]` tells the type of the fields
+ * holding objects. `denormalize` rebuilds the nested tree, entities are shared
+ * (the same object for every occurrence of an id).
+ *
+ * Usage with the generated sdk:
+ *
+ *   const teams = (await Sample1.getTeamsWithDetail({ ...normalized })).data!;
+ */
+
+export const NORMALIZED_MEDIA_TYPE = 'application/vnd.normalized+json';
+
+type Id = string | number;
+type Row = Record<string, unknown>;
+
+export interface NormalizedDocument {
+  root: string | null;
+  data: unknown;
+  entities: Record<string, Record<string, Row>>;
+  types: Record<string, Record<string, string>>;
+  errors?: unknown[];
+}
+
+export function denormalize<T = unknown>(doc: NormalizedDocument): T {
+  const built = new Map<string, Row>();
+
+  const object = (row: Row, type: string): Row => {
+    const fields = doc.types[type] ?? {};
+    for (const [key, fieldType] of Object.entries(fields)) {
+      if (row[key] !== null && row[key] !== undefined) {
+        row[key] = value(row[key], fieldType);
+      }
+    }
+    return row;
+  };
+
+  const entity = (id: Id, type: string): Row | undefined => {
+    const cacheKey = `${type}:${id}`;
+    let row = built.get(cacheKey);
+    if (row === undefined) {
+      const source = doc.entities[type]?.[String(id)];
+      if (source === undefined) return undefined;
+      row = { ...source };
+      built.set(cacheKey, row); // set before filling, entities may reference each other
+      object(row, type);
+    }
+    return row;
+  };
+
+  const value = (v: unknown, type: string | null): unknown => {
+    if (Array.isArray(v)) return v.map((item) => value(item, type));
+    if (type === null || v === null || v === undefined) return v;
+    if (typeof v === 'object') return object({ ...(v as Row) }, type);
+    return type in doc.entities ? entity(v as Id, type) : v;
+  };
+
+  return value(doc.data, doc.root) as T;
+}
+
+/** request options asking for the normalized format and rebuilding the tree */
+export const normalized = {
+  headers: { Accept: NORMALIZED_MEDIA_TYPE },
+  responseTransformer: async (data: unknown) =>
+    denormalize(data as NormalizedDocument),
+};
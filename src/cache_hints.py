@@ -0,0 +1,87 @@
+"""
+Cache-control hints of the GraphQL schema, declared next to `__relationships__`.
+
+    class Team(BaseModel, BaseEntity):
+        __relationships__ = [...]
+        __cache_control__ = CacheHint(max_age=300, fields={'sprints': CacheHint(max_age=30)})
+
+An object field (a root query or a relationship) takes the hint declared for it
+on its parent entity, else the hint of the entity it returns; entities without
+a hint are not cacheable. Scalar fields inherit from their parent. A selection
+is cacheable for the lowest max-age of its object fields, and private as soon
+as one of them is.
+
+- the response gets `Cache-Control: public|private, max-age=N` when N > 0
+- the resolved subtree of public cacheable root fields is cached across
+  requests (see src.field_cache)
+"""
+from dataclasses import dataclass, field
+from typing import Any, Optional, get_args, get_origin
+
+from graphql.language.ast import OperationType
+from pydantic_resolve.graphql.types import FieldSelection
+from pydantic_resolve.utils.er_diagram import ErDiagram
+
+PUBLIC = 'PUBLIC'
+PRIVATE = 'PRIVATE'
+
+
+@dataclass(frozen=True)
+class CacheHint:
+    max_age: int = 0
+    scope: str = PUBLIC
+    fields: dict[str, 'CacheHint'] = field(default_factory=dict, compare=False, hash=False)  # by relationship
+
+    def restrict(self, other: 'CacheHint') -> 'CacheHint':
+        return CacheHint(max_age=min(self.max_age, other.max_age),
+                         scope=PRIVATE if PRIVATE in (self.scope, other.scope) else PUBLIC)
+
+    def header(self) -> Optional[str]:
+        """Cache-Control value, None when not cacheable."""
+        return f'{self.scope.lower()}, max-age={self.max_age}' if self.max_age > 0 else None
+
+
+NO_CACHE = CacheHint()
+
+
+def _target(relationship_target: Any) -> Any:
+    return get_args(relationship_target)[0] if get_origin(relationship_target) is list else relationship_target
+
+
+class CacheHints:
+    def __init__(self, diagram: ErDiagram):
+        self.hints: dict[type, CacheHint] = {cfg.kls: getattr(cfg.kls, '__cache_control__', None) or NO_CACHE
+                                             for cfg in diagram.configs}
+        self.targets: dict[tuple[type, str], type] = {(cfg.kls, rel.name): _target(rel.target)
+                                                      for cfg in diagram.configs for rel in cfg.relationships}
+
+    def policy(self, entity: type, selection: FieldSelection, hint: Optional[CacheHint] = None) -> CacheHint:
+        """policy of a field returning entity, with its selection."""
+        declared = self.hints.get(entity, NO_CACHE)
+        hint = hint or declared
+        for name, sub in (selection.sub_fields or {}).items():
+            if hint.max_age <= 0:
+                break
+            target = self.targets.get((entity, name))
+            if target is not None:
+                hint = hint.restrict(self.policy(target, sub, declared.fields.get(name)))
+        return hint
+
+    def operation_policy(self, handler, query: str, operation_name: Optional[str] = None) -> CacheHint:
+        """policy of the operation executed by a CachedGraphQLHandler, cached with the document."""
+        prepared = handler.documents.get(query)
+        node = prepared.operation(operation_name)
+        if node is None or node.operation != OperationType.QUERY:
+            return NO_CACHE
+        name = node.name.value if node.name else None
+        policy = prepared.cache_policies.get(name)
+        if policy is None:
+            parsed = prepared.parsed.get(name)
+            if parsed is None:
+                parsed = prepared.parsed[name] = handler.parser.parse_operation(prepared.document, node)
+            policy = CacheHint(max_age=2 ** 31)
+            for root, selection in parsed.field_tree.items():
+                entity, _ = handler.query_map.get(root, (None, None))
+                policy = policy.restrict(self.policy(entity, selection) if entity else NO_CACHE)
+            prepared.cache_policies[name] = policy
+        return policy
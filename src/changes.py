@@ -0,0 +1,45 @@
+"""
+Change feed for mutations.
+
+Every function in `src/services/*/mutation.py` reports the rows it wrote via
+`notify(table, *ids)` once its transaction is committed. Read-side caches
+subscribe to the feed and drop whatever was built from those rows, and each
+table keeps a monotonically increasing version bumped on every change.
+
+Changes to a child collection (eg: a sprint created for team 1) are also
+reported against the parent row (`team` 1), because the parent is what every
+response containing that collection was built from.
+"""
+from collections import defaultdict
+from typing import Any, Callable, Iterable
+
+Listener = Callable[[str, tuple[Any, ...]], None]
+
+_listeners: list[Listener] = []
+_versions: defaultdict[str, int] = defaultdict(int)
+
+
+def subscribe(listener: Listener) -> Listener:
+    """register listener(table, ids), ids == () means the whole table changed."""
+    _listeners.append(listener)
+    return listener
+
+
+def unsubscribe(listener: Listener) -> None:
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+
+def notify(table: str, *ids: Any) -> None:
+    """report committed changes of `ids` in `table`, or of the whole table if no id is given."""
+    _versions[table] += 1
+    for listener in list(_listeners):
+        listener(table, ids)
+
+
+def version(table: str) -> int:
+    return _versions[table]
+
+
+def versions(tables: Iterable[str]) -> dict[str, int]:
+    return {table: _versions[table] for table in sorted(tables)}
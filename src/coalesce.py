@@ -0,0 +1,75 @@
+"""
+Coalescing of identical in-flight GET requests.
+
+When many identical requests arrive together (eg: after a deploy or a cache
+flush), the first one runs the handler and the others wait for its response
+instead of building the same tree again. Requests are identical when path,
+query and the `vary` headers match, credentials are part of `vary` so
+requests carrying different auth contexts are never coalesced.
+
+Usage (router must use `src.response_cache.CachedRoute`):
+
+    @route.get('/sprints-with-detail', response_model=List[Sample1SprintDetail])
+    @request_coalescer.coalesced
+    async def get_sprints_with_detail(...): ...
+
+Only endpoints returning a complete body (not streaming responses) can opt in.
+"""
+import asyncio
+import hashlib
+from typing import Awaitable, Callable, Hashable, Optional
+
+from fastapi import Request, Response
+
+DEFAULT_VARY = ('accept', 'authorization', 'cookie')
+
+
+class RequestCoalescer:
+    def __init__(self):
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def stats(self) -> dict[str, int]:
+        return dict(inflight=len(self._inflight), leaders=self.leaders, followers=self.followers)
+
+    @staticmethod
+    def request_key(path: str, request: Request, vary: tuple[str, ...]) -> tuple:
+        headers = '\0'.join(request.headers.get(name, '') for name in vary)
+        return (path,
+                tuple(sorted(request.path_params.items())),
+                tuple(sorted(request.query_params.multi_items())),
+                hashlib.sha256(headers.encode()).hexdigest())
+
+    async def run(self, key: Hashable, compute: Callable[[], Awaitable[Response]]) -> Response:
+        """
+        run compute() once for all concurrent callers of the same key, each caller gets its own copy.
+        compute runs in its own task, a disconnecting leader doesn't cancel it for the followers.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(compute())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.get(key) is task and self._inflight.pop(key))
+        else:
+            self.followers += 1
+
+        response = await asyncio.shield(task)
+        return _copy_response(response)
+
+    def coalesced(self, endpoint: Optional[Callable] = None, *, vary: tuple[str, ...] = DEFAULT_VARY) -> Callable:
+        """opt a GET endpoint into coalescing, used bare or with the headers which tell requests apart."""
+        def mark(endpoint: Callable) -> Callable:
+            endpoint.__coalesce__ = (self, tuple(h.lower() for h in vary))
+            return endpoint
+
+        return mark(endpoint) if endpoint is not None else mark
+
+
+def _copy_response(response: Response) -> Response:
+    headers = {k: v for k, v in response.headers.items() if k != 'content-length'}
+    return Response(response.body, status_code=response.status_code, headers=headers)
+
+
+request_coalescer = RequestCoalescer()
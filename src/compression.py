@@ -0,0 +1,193 @@
+"""
+Response compression negotiated from `Accept-Encoding`: zstd (when the optional
+`zstandard` package is installed) or gzip.
+
+- bodies under `minimum_size` are sent as they are
+- bodies of `offload_size` or more are compressed in a worker thread, so a
+  large tree doesn't hold the event loop
+- streaming responses are compressed chunk by chunk, each chunk is flushed so
+  clients receive it right away (text/event-stream is never compressed)
+- a strong ETag of the upstream response is made weak (`W/`): the compressed
+  bytes differ from the ones it was computed for, If-None-Match comparisons are
+  weak (see src.etag)
+
+Bytes in/out and the time spent compressing are counted in `compression_stats`.
+"""
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Optional, Protocol
+
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import zstandard
+except ImportError:  # optional
+    zstandard = None
+
+EXCLUDED_CONTENT_TYPES = ('text/event-stream',)
+
+
+class Compressor(Protocol):
+    def compress(self, data: bytes, final: bool) -> bytes: ...
+
+
+class GzipCompressor:
+    def __init__(self, level: int):
+        self._obj = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip container
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        return self._obj.compress(data) + self._obj.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class ZstdCompressor:
+    def __init__(self, level: int):
+        self._obj = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        flush_mode = zstandard.COMPRESSOBJ_FLUSH_FINISH if final else zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        return self._obj.compress(data) + self._obj.flush(flush_mode)
+
+
+@dataclass
+class CompressionStats:
+    responses: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0
+    seconds: float = 0.0
+    offloaded: int = 0
+
+    def as_dict(self) -> dict:
+        saved = self.bytes_in - self.bytes_out
+        return dict(responses=self.responses, bytes_in=self.bytes_in, bytes_out=self.bytes_out,
+                    bytes_saved=saved, cpu_ms=round(self.seconds * 1000, 3), offloaded=self.offloaded,
+                    saved_bytes_per_cpu_ms=round(saved / (self.seconds * 1000)) if self.seconds else None)
+
+
+compression_stats = CompressionStats()
+
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """zstd or gzip, the one with the highest q-value (zstd on ties), None when neither is accepted."""
+    accepted: dict[str, float] = {}
+    for item in (accept_encoding or '').split(','):
+        name, _, params = item.strip().partition(';')
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name:
+            accepted[name.lower()] = q
+
+    candidates = ['zstd', 'gzip'] if zstandard is not None else ['gzip']
+    scored = [(accepted.get(c, accepted.get('*', 0.0)), -i, c) for i, c in enumerate(candidates)]
+    q, _, encoding = max(scored)
+    return encoding if q > 0 else None
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, offload_size: int = 256 * 1024,
+                 gzip_level: int = 6, zstd_level: int = 3) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.offload_size = offload_size
+        self.levels = {'gzip': gzip_level, 'zstd': zstd_level}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate(Headers(scope=scope).get('accept-encoding'))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _Responder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+    def compressor(self, encoding: str) -> Compressor:
+        level = self.levels[encoding]
+        return ZstdCompressor(level) if encoding == 'zstd' else GzipCompressor(level)
+
+
+class _Responder:
+    """holds `http.response.start` until the first body chunk tells whether to compress."""
+
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.downstream = send
+        self.start: Message = {}
+        self.compressor: Optional[Compressor] = None
+        self.started = False
+        self.passthrough = False
+
+    async def send(self, message: Message) -> None:
+        if message['type'] == 'http.response.start':
+            self.start = message
+            headers = Headers(raw=message['headers'])
+            self.passthrough = ('content-encoding' in headers
+                                or headers.get('content-type', '').startswith(EXCLUDED_CONTENT_TYPES))
+            return
+
+        if message['type'] != 'http.response.body' or self.passthrough:
+            await self._send_start()
+            await self.downstream(message)
+            return
+
+        body = message.get('body', b'')
+        more_body = message.get('more_body', False)
+        if not self.started:
+            if not more_body and len(body) < self.middleware.minimum_size:
+                await self._send_start()
+                await self.downstream(message)
+                return
+
+            self.compressor = self.middleware.compressor(self.encoding)
+            headers = MutableHeaders(raw=self.start['headers'])
+            headers['content-encoding'] = self.encoding
+            headers.add_vary_header('Accept-Encoding')
+            if 'content-length' in headers:
+                del headers['content-length']
+            etag = headers.get('etag')
+            if etag is not None and not etag.startswith('W/'):
+                headers['etag'] = f'W/{etag}'
+            compressed = await self._compress(body, final=not more_body)
+            if not more_body:
+                headers['content-length'] = str(len(compressed))
+            await self._send_start()
+            await self.downstream({**message, 'body': compressed})
+            return
+
+        await self.downstream({**message, 'body': await self._compress(body, final=not more_body)})
+
+    async def _send_start(self) -> None:
+        if not self.started:
+            self.started = True
+            await self.downstream(self.start)
+
+    async def _compress(self, body: bytes, final: bool) -> bytes:
+        if len(body) >= self.middleware.offload_size:
+            compressed, seconds = await anyio.to_thread.run_sync(self._timed_compress, body, final)
+            compression_stats.offloaded += 1
+        else:
+            compressed, seconds = self._timed_compress(body, final)
+
+        compression_stats.seconds += seconds
+        compression_stats.bytes_in += len(body)
+        compression_stats.bytes_out += len(compressed)
+        if final:
+            compression_stats.responses += 1
+        return compressed
+
+    def _timed_compress(self, body: bytes, final: bool) -> tuple[bytes, float]:
+        start = time.perf_counter()
+        compressed = self.compressor.compress(body, final)
+        return compressed, time.perf_counter() - start
@@ -0,0 +1,167 @@
+"""
+Synthetic datasets: teams, sprints, stories, tasks and users, at any scale.
+
+The mock modules (`src/services/*/mock.py`) hold 2 teams and 13 tasks, too few
+to observe the loaders or the Resolver. A `DatasetSpec` describes a tree:
+
+- `teams`, each with `sprints` sprints, of `stories` stories, of `tasks` tasks
+- `users`, `members` of them in each team (`team_user`)
+- `skew`: owners of stories and tasks follow a Zipf law of exponent skew over
+  the users, user 1 owning the most (0: uniform)
+
+`generate` yields the rows table by table, lazily and deterministically: the
+same spec (`seed` included) always gives the same dataset, whatever the order
+the tables are read in. `load` bulk loads it (see src.seed) in place of the
+current data; 1k to 10M rows:
+
+    await load(db.engine, DatasetSpec(teams=200, sprints=10, stories=20, tasks=20))
+    await load(db.engine, DatasetSpec.of_size(1_000_000, skew=1.5))
+
+At startup `SEED_DATASET` (`teams=100,users=1000,skew=1.2`) loads one instead
+of the mock data, and from the command line:
+
+    python -m src.dataset --teams 1000 --sprints 10 --stories 20 --tasks 50 --database sqlite+aiosqlite:///big.db
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+from dataclasses import asdict, dataclass, replace
+from typing import Any, Iterator
+
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+import src.db  # noqa: F401, registers every ORM model on Base.metadata
+from src.seed import SEED_BATCH_SIZE, LoadReport, bulk_load
+
+SEED_DATASET = os.getenv('SEED_DATASET')
+LEVELS = ('junior', 'senior')
+
+
+@dataclass(frozen=True)
+class DatasetSpec:
+    teams: int = 10
+    sprints: int = 5  # per team
+    stories: int = 10  # per sprint
+    tasks: int = 10  # per story
+    users: int = 100
+    members: int = 10  # per team
+    skew: float = 1.1  # Zipf exponent of the owners
+    seed: int = 42
+
+    @property
+    def rows(self) -> dict[str, int]:
+        sprints = self.teams * self.sprints
+        stories = sprints * self.stories
+        return dict(user=self.users, team=self.teams, team_user=self.teams * min(self.members, self.users),
+                    sprint=sprints, story=stories, task=stories * self.tasks)
+
+    @classmethod
+    def of_size(cls, rows: int, **shape) -> 'DatasetSpec':
+        """the spec of about rows rows, by the number of teams of the given shape."""
+        spec = cls(teams=1, **shape)
+        per_team = sum(spec.rows.values()) - spec.users
+        return replace(spec, teams=max(1, round((rows - spec.users) / per_team)))
+
+    @classmethod
+    def parse(cls, text: str) -> 'DatasetSpec':
+        """spec from `teams=100,users=1000,skew=1.2`."""
+        defaults = asdict(cls())
+        values = dict(item.split('=', 1) for item in text.replace(' ', '').split(',') if item)
+        unknown = values.keys() - defaults.keys()
+        if unknown:
+            raise ValueError(f'unknown dataset parameters: {sorted(unknown)}')
+        return cls(**{k: type(defaults[k])(v) for k, v in values.items()})
+
+
+def _random(spec: DatasetSpec, table: str) -> random.Random:
+    return random.Random(f'{spec.seed}:{table}')
+
+
+def _owners(spec: DatasetSpec, rnd: random.Random, parents: int, children: int) -> Iterator[list[int]]:
+    """owners of the children of each parent, Zipf distributed over the user ids."""
+    users = range(1, spec.users + 1)
+    weights = list(itertools.accumulate(1 / rank ** spec.skew for rank in users))
+    for _ in range(parents):
+        yield rnd.choices(users, cum_weights=weights, k=children)
+
+
+def users(spec: DatasetSpec) -> Iterator[dict[str, Any]]:
+    rnd = _random(spec, 'user')
+    for id in range(1, spec.users + 1):
+        yield dict(id=id, name=f'user-{id}', level=rnd.choice(LEVELS))
+
+
+def teams(spec: DatasetSpec) -> Iterator[dict[str, Any]]:
+    for id in range(1, spec.teams + 1):
+        yield dict(id=id, name=f'team-{id}')
+
+
+def team_users(spec: DatasetSpec) -> Iterator[dict[str, Any]]:
+    rnd = _random(spec, 'team_user')
+    id = itertools.count(1)
+    for team_id in range(1, spec.teams + 1):
+        for user_id in sorted(rnd.sample(range(1, spec.users + 1), min(spec.members, spec.users))):
+            yield dict(id=next(id), user_id=user_id, team_id=team_id)
+
+
+def sprints(spec: DatasetSpec) -> Iterator[dict[str, Any]]:
+    rnd = _random(spec, 'sprint')
+    for id in range(1, spec.teams * spec.sprints + 1):
+        yield dict(id=id, name=f'sprint-{id}', status=rnd.choice(('open', 'closed')),
+                   team_id=(id - 1) // spec.sprints + 1)
+
+
+def stories(spec: DatasetSpec) -> Iterator[dict[str, Any]]:
+    id = itertools.count(1)
+    sprints = spec.teams * spec.sprints
+    for sprint_id, owners in enumerate(_owners(spec, _random(spec, 'story'), sprints, spec.stories), 1):
+        for owner_id in owners:
+            story_id = next(id)
+            yield dict(id=story_id, name=f'story-{story_id}', owner_id=owner_id, sprint_id=sprint_id)
+
+
+def tasks(spec: DatasetSpec) -> Iterator[dict[str, Any]]:
+    rnd = _random(spec, 'task')
+    id = itertools.count(1)
+    stories = spec.teams * spec.sprints * spec.stories
+    for story_id, owners in enumerate(_owners(spec, rnd, stories, spec.tasks), 1):
+        for owner_id in owners:
+            task_id = next(id)
+            yield dict(id=task_id, name=f'task-{task_id}', owner_id=owner_id, story_id=story_id,
+                       estimate=rnd.randint(1, 8))
+
+
+def generate(spec: DatasetSpec) -> dict[str, Iterator[dict[str, Any]]]:
+    """rows of the dataset by table name, generated while they are read."""
+    return dict(user=users(spec), team=teams(spec), team_user=team_users(spec),
+                sprint=sprints(spec), story=stories(spec), task=tasks(spec))
+
+
+async def load(engine: AsyncEngine, spec: DatasetSpec, batch_size: int = SEED_BATCH_SIZE) -> LoadReport:
+    """replace the data of the database by the dataset of spec."""
+    return await bulk_load(engine, generate(spec), batch_size, replace=True)
+
+
+async def _main(args):
+    spec = DatasetSpec(**{k: v for k, v in vars(args).items() if k in DatasetSpec.__dataclass_fields__})
+    print(f'{spec}: {sum(spec.rows.values())} rows')
+    engine = create_async_engine(args.database)
+    try:
+        print(await load(engine, spec, args.batch_size))
+    finally:
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load a synthetic dataset")
+    for name, default in asdict(DatasetSpec()).items():
+        parser.add_argument(f"--{name}", type=type(default), default=default)
+    parser.add_argument("--database", default=os.getenv('DATABASE_URL', 'sqlite+aiosqlite://'))
+    parser.add_argument("--batch-size", type=int, default=SEED_BATCH_SIZE)
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
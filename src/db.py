@@ -1,3 +1,4 @@
+import os
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from .model import Base
 import src.services.sprint.mock as sm
@@ -7,7 +8,7 @@ import src.services.team.mock as tem
 import src.services.user.mock as um
 
 engine = create_async_engine(
-    "sqlite+aiosqlite://",
+    os.getenv('DATABASE_URL', 'sqlite+aiosqlite://'),
     echo=False,
 )
 
@@ -0,0 +1,91 @@
+"""
+Weak ETags for GET routes, derived from per-table versions (see src.changes).
+
+The tables a route depends on are found by walking its response model: every
+nested class which is (or inherits from, or is a subset of) an entity of the
+ER diagram contributes the table of the ORM model with the same name.
+
+Versions live in process memory, like the in-memory database each worker
+seeds at startup, so the ETag also carries a per-process epoch and tags from
+another worker (or from before a restart) never match. A forked worker (see
+src.prefork) draws its own epoch: the one of the master would be shared.
+"""
+import hashlib
+import os
+import uuid
+from functools import lru_cache
+from typing import Any, Optional
+
+from pydantic import BaseModel
+from pydantic_resolve.constant import ENSURE_SUBSET_REFERENCE
+from pydantic_resolve.utils.class_util import safe_issubclass
+from pydantic_resolve.utils.types import get_core_types
+
+import src.changes as changes
+from src.model import Base
+from src.services.er_diagram import BaseEntity
+
+EPOCH = uuid.uuid4().hex[:8]
+
+
+def _new_epoch():
+    global EPOCH
+    EPOCH = uuid.uuid4().hex[:8]
+
+
+os.register_at_fork(after_in_child=_new_epoch)
+
+
+@lru_cache
+def _entity_tables() -> dict[type, str]:
+    orm_tables = {m.class_.__name__: m.local_table.name for m in Base.registry.mappers}
+    diagram = BaseEntity.get_diagram()
+    return {cfg.kls: orm_tables[cfg.kls.__name__] for cfg in diagram.configs if cfg.kls.__name__ in orm_tables}
+
+
+def _tables_of_class(kls: type) -> set[str]:
+    entity_tables = _entity_tables()
+    sources = list(kls.__mro__)
+    subset_of = getattr(kls, ENSURE_SUBSET_REFERENCE, None)
+    if subset_of is not None:
+        sources.extend(subset_of.__mro__)
+    return {entity_tables[s] for s in sources if s in entity_tables}
+
+
+@lru_cache
+def response_tables(response_model: Any) -> frozenset[str]:
+    """tables touched by any class nested in response_model, eg: List[Sample1TeamDetail]."""
+    tables: set[str] = set()
+    visited: set[type] = set()
+    queue = list(get_core_types(response_model))
+
+    while queue:
+        kls = queue.pop()
+        if kls in visited or not safe_issubclass(kls, BaseModel):
+            continue
+        visited.add(kls)
+        if not kls.__pydantic_complete__:
+            kls.model_rebuild()  # resolve forward refs, eg: modules using `from __future__ import annotations`
+        tables |= _tables_of_class(kls)
+        for field in kls.model_fields.values():
+            queue.extend(get_core_types(field.annotation))
+
+    return frozenset(tables)
+
+
+def compute_etag(tables: frozenset[str], variant: str = '') -> str:
+    """variant tells representations apart, eg: the negotiated media type."""
+    versions = ','.join(f'{table}:{version}' for table, version in changes.versions(tables).items())
+    versions += variant
+    digest = hashlib.sha1(versions.encode()).hexdigest()[:16]
+    return f'W/"{EPOCH}-{digest}"'
+
+
+def if_none_match(header: Optional[str], etag: str) -> bool:
+    """weak comparison of an If-None-Match header against etag."""
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    opaque = etag.removeprefix('W/')
+    return any(tag.strip().removeprefix('W/') == opaque for tag in header.split(','))
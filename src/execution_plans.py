@@ -0,0 +1,181 @@
+"""
+Execution plans compiled ahead of time for allow-listed GraphQL operations.
+
+Production clients send a fixed set of operations (the persisted query
+manifest). For each operation of such a document `PlanCompiler` fixes, once:
+- the loader call graph: which relationship loads from which foreign key,
+  level by level
+- the projection of every level: a response model (selected fields and the
+  foreign keys they need) built by the handler's ResponseBuilder, wrapped in a
+  TypeAdapter validating and dumping a whole level in one pass
+
+`CompiledExecutor` runs a root field from its plan: the query method, then one
+call of each relationship's batch loader per level (keys already loaded by the
+same loader in this execution are not asked again), without the Resolver
+walking the selection set object by object. The result is the same as the
+interpreted execution. Operations without a plan, relationships the plan
+doesn't support (fk_fn, load_many, fk_none_default, DataLoader classes) and
+operations sharing loaders in a batch (see src.shared_loaders) run interpreted.
+"""
+import asyncio
+import inspect
+import logging
+from dataclasses import dataclass
+from typing import Any, Callable, Optional, get_args, get_origin
+
+from graphql.language.ast import OperationType
+from pydantic import TypeAdapter
+from pydantic_resolve.graphql.exceptions import GraphQLError
+from pydantic_resolve.graphql.executor import QueryExecutor
+from pydantic_resolve.graphql.types import FieldSelection
+from pydantic_resolve.utils.er_diagram import ErDiagram
+
+from src.graphql_documents import current_operation
+from src.shared_loaders import sharing
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Relation:
+    key: str  # in the output, alias or name
+    fk: str
+    loader: Callable
+    many: bool
+    node: 'Node'
+
+
+@dataclass(frozen=True)
+class Node:
+    adapter: TypeAdapter  # list of the response model of the level
+    relations: tuple[Relation, ...]
+
+
+class PlanCompiler:
+    def __init__(self, diagram: ErDiagram, builder):
+        self.builder = builder
+        self.relationships = {(cfg.kls, rel.name): rel for cfg in diagram.configs for rel in cfg.relationships}
+
+    def compile(self, handler, query: str) -> int:
+        """plans of the query operations of a document, kept with it; the number of root fields compiled."""
+        prepared = handler.documents.validate(query, handler.schema)
+        if prepared.errors:
+            raise ValueError(f'cannot compile an invalid document: {prepared.errors[0]["message"]}')
+        compiled = 0
+        for node in prepared.document.definitions:
+            if getattr(node, 'operation', None) != OperationType.QUERY:
+                continue
+            name = node.name.value if node.name else None
+            parsed = prepared.parsed.get(name)
+            if parsed is None:
+                parsed = prepared.parsed[name] = handler.parser.parse_operation(prepared.document, node)
+            roots = {}
+            for root, selection in parsed.field_tree.items():
+                entity, _ = handler.query_map.get(root, (None, None))
+                plan = self.node(entity, selection) if entity else None
+                if plan is not None:
+                    roots[root] = plan
+            prepared.plans[name] = roots
+            compiled += len(roots)
+        return compiled
+
+    def node(self, entity: type, selection: FieldSelection) -> Optional[Node]:
+        """plan of a selection on entity, None when part of it can't be compiled."""
+        fields: dict[str, FieldSelection] = {}
+        relations = []
+        for name, sub in (selection.sub_fields or {}).items():
+            rel = self.relationships.get((entity, name))
+            if rel is None or name in entity.model_fields:
+                fields[name] = sub
+                continue
+            if not _compilable(rel):
+                return None
+            target, many = _target(rel.target)
+            node = self.node(target, sub)
+            if node is None:
+                return None
+            relations.append(Relation(sub.alias or name, rel.fk, rel.loader, many, node))
+        for relation in relations:
+            fields.setdefault(relation.fk, FieldSelection())  # like the interpreted response model
+        model = self.builder.build_response_model(entity, FieldSelection(alias=selection.alias, sub_fields=fields))
+        return Node(TypeAdapter(list[model]), tuple(relations))
+
+
+def _compilable(rel) -> bool:
+    return (inspect.iscoroutinefunction(rel.loader) and rel.fk_fn is None and not rel.load_many
+            and not {'fk_none_default', 'fk_none_default_factory'} & rel.model_fields_set)
+
+
+def _target(target: Any) -> tuple[type, bool]:
+    return (get_args(target)[0], True) if get_origin(target) is list else (target, False)
+
+
+async def run(node: Node, rows: list, loaded: dict[Callable, dict]) -> list[dict[str, Any]]:
+    """output of rows, with their relations loaded one level at a time."""
+    instances = node.adapter.validate_python(rows, from_attributes=True)
+    output = node.adapter.dump_python(instances, mode='json', by_alias=True)
+    if node.relations:
+        await asyncio.gather(*[_load(relation, instances, output, loaded) for relation in node.relations])
+    return output
+
+
+async def _load(relation: Relation, instances: list, output: list[dict], loaded: dict[Callable, dict]):
+    fks = [getattr(i, relation.fk) for i in instances]
+    cache = loaded.setdefault(relation.loader, {})
+    missing = list(dict.fromkeys(fk for fk in fks if fk is not None and fk not in cache))
+    if missing:
+        cache.update(zip(missing, await relation.loader(missing)))
+
+    if relation.many:
+        groups = [cache[fk] if fk is not None else [] for fk in fks]
+    else:
+        groups = [[cache[fk]] if fk is not None and cache[fk] is not None else [] for fk in fks]
+    children = iter(await run(relation.node, [row for group in groups for row in group], loaded))
+    for item, group in zip(output, groups):
+        if relation.many:
+            item[relation.key] = [next(children) for _ in group]
+        else:
+            item[relation.key] = next(children) if group else None
+
+
+class CompiledExecutor(QueryExecutor):
+    """QueryExecutor running root fields from the plan of their operation, when there is one."""
+
+    def __init__(self, executor: QueryExecutor):
+        super().__init__(parser=executor.parser, builder=executor.builder, resolver_class=executor.resolver_class,
+                         enable_from_attribute_in_type_adapter=executor.enable_from_attribute_in_type_adapter)
+        self.compiled = 0
+        self.interpreted = 0
+
+    def stats(self) -> dict[str, int]:
+        return dict(compiled=self.compiled, interpreted=self.interpreted)
+
+    def plan(self, query_name: str) -> Optional[Node]:
+        operation = current_operation()
+        if operation is None or operation.prepared is None or sharing():
+            return None
+        name = operation.node.name.value if operation.node.name else None
+        return operation.prepared.plans.get(name, {}).get(query_name)
+
+    async def _execute_single_query(self, query_name, entity, query_method, field_selection, response_model):
+        node = self.plan(query_name)
+        if node is None:
+            self.interpreted += 1
+            return await super()._execute_single_query(
+                query_name, entity, query_method, field_selection, response_model)
+
+        self.compiled += 1
+        try:
+            data = await self._execute_method(query_method, field_selection.arguments or {}, 'query', entity)
+            if data is None:
+                return None, None
+            if isinstance(data, list):
+                return await run(node, data, {}), None
+            return (await run(node, [data], {}))[0], None
+        except GraphQLError as e:
+            logger.warning(f"GraphQL error for {query_name}: {e.message}")
+            return None, e.to_dict()
+        except Exception as e:
+            logger.exception(f"Error executing the plan of {query_name}")
+            return None, {"message": f"Execution failed for {query_name}: {str(e)}",
+                          "extensions": {"code": type(e).__name__}}
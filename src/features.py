@@ -0,0 +1,86 @@
+"""
+Optional subsystems of the API, enabled by settings and built on first use.
+
+Voyager (`/voyager`), the MCP server (`/mcp`) and GraphiQL (`GET /graphql`)
+are development and agent tools; importing fastmcp and fastapi_voyager and
+building their apps cost a REST worker more than a second of cold start.
+
+- `ENABLE_VOYAGER`, `ENABLE_MCP`, `ENABLE_GRAPHIQL` (1 by default): a disabled
+  subsystem is neither imported nor mounted
+- an enabled one is mounted as a `LazyMount`: its factory (imports included)
+  runs on the first request, or before forking the workers (`preload`, see
+  src.prefork); the lifespan of the app it returns, if any, is entered on the
+  first request and exited at shutdown
+"""
+import asyncio
+import os
+from contextlib import AbstractAsyncContextManager
+from typing import Callable, Optional
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+ENABLE_VOYAGER = os.getenv('ENABLE_VOYAGER', '1') == '1'
+ENABLE_MCP = os.getenv('ENABLE_MCP', '1') == '1'
+ENABLE_GRAPHIQL = os.getenv('ENABLE_GRAPHIQL', '1') == '1'
+
+Lifespan = Callable[[ASGIApp], AbstractAsyncContextManager]
+
+
+class LazyMount:
+    """ASGI app built by factory on its first request, factory returns (app, lifespan or None)."""
+
+    def __init__(self, factory: Callable[[], tuple[ASGIApp, Optional[Lifespan]]]):
+        self.factory = factory
+        self._built: Optional[tuple[ASGIApp, Optional[Lifespan]]] = None
+        self._app: Optional[ASGIApp] = None
+        self._lock = asyncio.Lock()
+        self._stop = asyncio.Event()
+        self._lifespan_task: Optional[asyncio.Task] = None
+
+    @property
+    def built(self) -> bool:
+        return self._app is not None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        app = self._app or await self.build()
+        await app(scope, receive, send)
+
+    def preload(self):
+        """run the factory now, without a running loop (the lifespan waits for the first request)."""
+        if self._built is None:
+            self._built = self.factory()
+
+    async def build(self) -> ASGIApp:
+        async with self._lock:
+            if self._app is None:
+                self.preload()
+                app, lifespan = self._built
+                if lifespan is not None:
+                    await self._start(app, lifespan)
+                self._app = app
+        return self._app
+
+    async def _start(self, app: ASGIApp, lifespan: Lifespan):
+        # the lifespan is entered and exited by one task, which anyio task groups require
+        started = asyncio.get_running_loop().create_future()
+
+        async def serve():
+            try:
+                async with lifespan(app):
+                    started.set_result(None)
+                    await self._stop.wait()
+            except BaseException as e:
+                if not started.done():
+                    started.set_exception(e)
+                raise
+
+        self._lifespan_task = asyncio.create_task(serve())
+        await started
+
+    async def aclose(self):
+        """exit the lifespan of the app, at shutdown; the next request builds a new one."""
+        if self._lifespan_task is not None:
+            self._stop.set()
+            await self._lifespan_task
+        self._built, self._app, self._lifespan_task = None, None, None
+        self._lock, self._stop = asyncio.Lock(), asyncio.Event()
@@ -0,0 +1,64 @@
+"""
+Resolved subtrees of cacheable GraphQL root fields, cached across requests.
+
+`FieldCacheExecutor` keeps the result of every public root field whose policy
+(see src.cache_hints) has a max-age in the response cache for that long, keyed
+by the field, its arguments and its selection: two different documents
+selecting `userGetUsers { id name }` share it, next to fields computed for
+each request. Entries depend on the rows they were built from like whole
+responses, mutations evict them; a response using one depends on them too.
+"""
+import json
+from typing import Hashable
+
+from pydantic_resolve.graphql.executor import QueryExecutor
+from pydantic_resolve.graphql.types import FieldSelection
+
+from src.cache_hints import PRIVATE, CacheHints
+from src.formats import JSON_MEDIA_TYPE
+from src.response_cache import CachePolicy, response_cache
+from src.shared_loaders import sharing
+
+
+def _selection_key(selection: FieldSelection) -> Hashable:
+    return (selection.alias,
+            json.dumps(selection.arguments, sort_keys=True, default=str) if selection.arguments else None,
+            tuple(sorted((name, _selection_key(sub)) for name, sub in (selection.sub_fields or {}).items())))
+
+
+class FieldCacheExecutor(QueryExecutor):
+    """QueryExecutor serving the subtree of cacheable root fields from the response cache, else executor's."""
+
+    def __init__(self, executor: QueryExecutor, cache_hints: CacheHints):
+        super().__init__(parser=executor.parser, builder=executor.builder, resolver_class=executor.resolver_class,
+                         enable_from_attribute_in_type_adapter=executor.enable_from_attribute_in_type_adapter)
+        self.executor = executor
+        self.cache_hints = cache_hints
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict[str, int]:
+        return dict(hits=self.hits, misses=self.misses)
+
+    async def _execute_single_query(self, query_name, entity, query_method, field_selection, response_model):
+        hint = self.cache_hints.policy(entity, field_selection)
+        if hint.max_age <= 0 or hint.scope == PRIVATE:
+            return await self.executor._execute_single_query(
+                query_name, entity, query_method, field_selection, response_model)
+
+        key = ('graphql-field', query_name, _selection_key(field_selection))
+        entry = response_cache.get(key)
+        if entry is not None:
+            self.hits += 1
+            response_cache.record(entry)
+            return json.loads(entry.body), None
+
+        self.misses += 1
+        with response_cache.track_part() as dependencies:
+            data, error = await self.executor._execute_single_query(
+                query_name, entity, query_method, field_selection, response_model)
+        # loaders shared with other operations may have loaded rows outside of this field's set
+        if error is None and not sharing():
+            response_cache.put(key, json.dumps(data, ensure_ascii=False).encode(), JSON_MEDIA_TYPE, dependencies,
+                               CachePolicy(hard_ttl=hint.max_age))
+        return data, error
@@ -0,0 +1,62 @@
+"""
+Response representations negotiated per request.
+
+A response is either the nested tree or its normalized form (see
+src.normalize, `?format=normalized` or its media type), encoded as JSON or,
+for service-to-service consumers, as MessagePack (`Accept: application/msgpack`,
+needs the optional `msgpack` package). Both encodings are produced from the
+same python dump, so fields excluded from serialization stay excluded.
+"""
+import json
+from dataclasses import dataclass
+from typing import Any
+
+from fastapi import Request
+
+from src.normalize import NORMALIZED_MEDIA_TYPE, wants_normalized
+
+try:
+    import msgpack
+except ImportError:  # optional
+    msgpack = None
+
+JSON_MEDIA_TYPE = 'application/json'
+MSGPACK_MEDIA_TYPE = 'application/msgpack'
+
+
+@dataclass(frozen=True)
+class Representation:
+    normalized: bool = False
+    binary: bool = False
+
+    @property
+    def media_type(self) -> str:
+        if self.binary:
+            return MSGPACK_MEDIA_TYPE
+        return NORMALIZED_MEDIA_TYPE if self.normalized else JSON_MEDIA_TYPE
+
+    @property
+    def variant(self) -> str:
+        """tells representations apart in cache keys and ETags."""
+        return f"{'normalized' if self.normalized else 'nested'}+{'msgpack' if self.binary else 'json'}"
+
+    def encode(self, data: Any) -> bytes:
+        if self.binary:
+            return msgpack.packb(data)
+        # same output as fastapi's JSONResponse
+        return json.dumps(data, ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode('utf-8')
+
+    def encode_array(self, items: list[bytes]) -> bytes:
+        """array of already encoded items, eg: the results of a GraphQL batch."""
+        if self.binary:
+            return msgpack.Packer().pack_array_header(len(items)) + b''.join(items)
+        return b'[' + b','.join(items) + b']'
+
+
+DEFAULT = Representation()
+
+
+def negotiate(request: Request) -> Representation:
+    accept = request.headers.get('accept', '')
+    binary = msgpack is not None and (MSGPACK_MEDIA_TYPE in accept or 'application/x-msgpack' in accept)
+    return Representation(normalized=wants_normalized(request), binary=binary)
@@ -0,0 +1,330 @@
+"""
+Parsed and validated GraphQL documents, cached by a sha256 of their text.
+
+Clients send the same few dozen documents over and over, GraphQLHandler would
+parse each one three times per request (operation type, field tree, response
+cache key). `DocumentCache` keeps, per document:
+- the AST and its printed form (the response cache key of query documents)
+- syntax and validation errors against the schema
+- the field tree of each operation built by the handler's parser
+
+so a repeated document costs a hash and a dict lookup before execution.
+Arguments given as `$variables` stay placeholders in the cached field tree and
+are replaced by the coerced variables of each request, so clients can send one
+stable document instead of inlining literals.
+"""
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, NamedTuple, Optional
+
+from graphql import GraphQLSchema, build_schema, get_operation_ast, parse, print_ast, validate
+from graphql.execution.values import get_variable_values
+from graphql.language.ast import DocumentNode, OperationDefinitionNode, OperationType
+from pydantic_resolve.graphql import GraphQLHandler
+from pydantic_resolve.graphql.query_parser import QueryParser
+from pydantic_resolve.graphql.types import FieldSelection, ParsedQuery
+from pydantic_resolve.graphql.exceptions import QueryParseError
+
+from src.incremental import DIRECTIVES
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(eq=False)
+class PreparedDocument:
+    query: str
+    document: Optional[DocumentNode]
+    errors: list[dict[str, Any]]  # syntax errors, then validation errors once validated
+    operation_type: str = 'query'
+    normalized: Optional[str] = None  # printed document
+    validated: bool = False
+    parsed: dict[Optional[str], ParsedQuery] = field(default_factory=dict)  # by operation name
+    costs: dict[Optional[str], Any] = field(default_factory=dict)  # query_cost.Cost by operation name
+    cache_policies: dict[Optional[str], Any] = field(default_factory=dict)  # cache_hints.CacheHint by operation name
+    plans: dict[Optional[str], dict[str, Any]] = field(default_factory=dict)  # execution_plans.Node by operation name, root field
+    incremental_plans: dict[Optional[str], Any] = field(default_factory=dict)  # incremental plans by operation name
+
+    def operation(self, operation_name: Optional[str]) -> Optional[OperationDefinitionNode]:
+        """operation to execute, None when there is no such (or no single unnamed) operation."""
+        return get_operation_ast(self.document, operation_name) if self.document else None
+
+
+def digest(query: str) -> str:
+    """sha256 of the document text, also the hash of automatic persisted queries."""
+    return hashlib.sha256(query.encode()).hexdigest()
+
+
+def prepare(query: str) -> PreparedDocument:
+    try:
+        document = parse(query)
+    except Exception as e:
+        return PreparedDocument(query=query, document=None, validated=True, errors=[
+            {'message': f'GraphQL syntax error: {e}', 'extensions': {'code': 'GRAPHQL_PARSE_ERROR'}}])
+
+    operations = [d.operation for d in document.definitions if isinstance(d, OperationDefinitionNode)]
+    return PreparedDocument(
+        query=query,
+        document=document,
+        errors=[],
+        operation_type='mutation' if OperationType.MUTATION in operations[:1] else 'query',
+        normalized=print_ast(document))
+
+
+class DocumentCache:
+    """
+    LRU of prepared documents keyed by the sha256 of the document text.
+    hits / misses count documents executed (`validate`), a miss parses and validates.
+    Pinned documents (eg: an allow-list of persisted queries) are never evicted.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, PreparedDocument] = OrderedDict()
+        self._pinned: dict[str, PreparedDocument] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return dict(entries=len(self._entries), pinned=len(self._pinned), hits=self.hits, misses=self.misses,
+                    evictions=self.evictions, hit_rate=round(self.hits / lookups, 4) if lookups else None)
+
+    def get(self, query: str) -> PreparedDocument:
+        key = digest(query)
+        prepared = self.find(key)
+        if prepared is not None:
+            return prepared
+
+        prepared = self._entries[key] = prepare(query)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return prepared
+
+    def find(self, key: str) -> Optional[PreparedDocument]:
+        """prepared document by the sha256 of its text, None when it isn't cached."""
+        prepared = self._pinned.get(key)
+        if prepared is None:
+            prepared = self._entries.get(key)
+            if prepared is not None:
+                self._entries.move_to_end(key)
+        return prepared
+
+    def is_pinned(self, key: str) -> bool:
+        return key in self._pinned
+
+    def pinned(self) -> list[PreparedDocument]:
+        return list(self._pinned.values())
+
+    def pin(self, query: str) -> PreparedDocument:
+        key = digest(query)
+        prepared = self._pinned.get(key)
+        if prepared is None:
+            prepared = self._pinned[key] = self._entries.pop(key, None) or prepare(query)
+        return prepared
+
+    def validate(self, query: str, schema: GraphQLSchema) -> PreparedDocument:
+        prepared = self.get(query)
+        if prepared.validated:
+            self.hits += 1
+        else:
+            self.misses += 1
+            prepared.errors = [{**e.formatted, 'extensions': {'code': 'GRAPHQL_VALIDATION_ERROR'}}
+                               for e in validate(schema, prepared.document)]
+            prepared.validated = True
+        return prepared
+
+    def clear(self):
+        self._entries.clear()
+
+
+class Variable(NamedTuple):
+    """argument given as `$name`, replaced per request."""
+    name: str
+
+
+class Operation(NamedTuple):
+    node: OperationDefinitionNode
+    variables: Optional[dict[str, Any]]  # coerced, None when the operation declares none
+    prepared: Optional[PreparedDocument] = None
+
+
+_operation: ContextVar[Optional[Operation]] = ContextVar('graphql_operation', default=None)
+
+
+def current_operation() -> Optional[Operation]:
+    """operation executed by CachedGraphQLHandler in this context."""
+    return _operation.get()
+
+
+def _substitute(value: Any, variables: dict[str, Any]) -> Any:
+    if isinstance(value, Variable):
+        return variables.get(value.name)
+    if isinstance(value, list):
+        return [_substitute(v, variables) for v in value]
+    if isinstance(value, dict):
+        # an argument whose variable is not provided (and has no default) is omitted
+        return {k: _substitute(v, variables) for k, v in value.items()
+                if not (isinstance(v, Variable) and v.name not in variables)}
+    return value
+
+
+def _with_variables(selection: FieldSelection, variables: dict[str, Any]) -> FieldSelection:
+    return FieldSelection(
+        alias=selection.alias,
+        arguments=_substitute(selection.arguments, variables) if selection.arguments else selection.arguments,
+        sub_fields={name: _with_variables(sub, variables) for name, sub in selection.sub_fields.items()}
+        if selection.sub_fields else selection.sub_fields)
+
+
+class CachedQueryParser(QueryParser):
+    """QueryParser building the field tree once per operation of a cached document."""
+
+    def __init__(self, documents: DocumentCache):
+        self.documents = documents
+
+    def parse(self, query: str) -> ParsedQuery:
+        prepared = self.documents.get(query)
+        if prepared.document is None:
+            raise QueryParseError(prepared.errors[0]['message'])
+
+        operation = _operation.get()
+        node = operation.node if operation else self._extract_operation(prepared.document)
+        if not node:
+            raise QueryParseError("No query operation found")
+        name = node.name.value if node.name else None
+        parsed = prepared.parsed.get(name)
+        if parsed is None:
+            parsed = prepared.parsed[name] = self.parse_operation(prepared.document, node)
+
+        if operation is None or operation.variables is None:
+            return parsed
+        variables = operation.variables
+        return ParsedQuery(field_tree={k: _with_variables(v, variables) for k, v in parsed.field_tree.items()},
+                           variables=variables, operation_name=name)
+
+    def parse_operation(self, document: DocumentNode, operation: OperationDefinitionNode) -> ParsedQuery:
+        """QueryParser.parse, from the parsed document and the operation to execute."""
+        fragments = self._extract_fragments(document)
+        root_fields = self._extract_root_fields(operation, fragments)
+        if not root_fields:
+            raise QueryParseError("Query is empty")
+
+        field_tree = {}
+        for root_field in root_fields:
+            name = root_field.name.value
+            parsed_field = self._build_field_tree(root_field, fragments)
+            if name in field_tree:
+                field_tree[name] = self._merge_field_selections(field_tree[name], parsed_field)
+            else:
+                field_tree[name] = parsed_field
+        return ParsedQuery(field_tree=field_tree, variables={},
+                           operation_name=operation.name.value if operation.name else None)
+
+    def _get_argument_value(self, value_node) -> Any:
+        if getattr(value_node, 'kind', '') == 'variable':
+            return Variable(value_node.name.value)
+        return super()._get_argument_value(value_node)
+
+
+class Checked(NamedTuple):
+    rejected: Optional[dict[str, Any]]  # the result of an operation that may not run
+    prepared: Optional[PreparedDocument] = None
+    node: Optional[OperationDefinitionNode] = None
+    variables: Optional[dict[str, Any]] = None  # coerced
+    cost: Any = None  # query_cost.Cost
+
+
+class CachedGraphQLHandler(GraphQLHandler):
+    """
+    GraphQLHandler validating documents against the schema and reusing their
+    parsed form from a DocumentCache, with variables and operationName.
+    With a `cost_analyzer` (query_cost.CostAnalyzer), operations over budget are
+    rejected before execution and the estimate is reported in `extensions.cost`.
+    The schema declares `@defer` / `@stream` (see src.incremental).
+    """
+
+    def __init__(self, *args, documents: DocumentCache, cost_analyzer=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.documents = documents
+        self.cost_analyzer = cost_analyzer
+        self.schema = build_schema(self.schema_builder.build_schema() + DIRECTIVES)
+        self.parser = self.executor.parser = CachedQueryParser(documents)
+
+    def check(self, query: str, variables: Optional[dict[str, Any]] = None,
+              operation_name: Optional[str] = None) -> 'Checked':
+        """validate the document, select the operation and coerce its variables, within budget."""
+        prepared = self.documents.validate(query, self.schema)
+        if prepared.errors:
+            logger.warning(f"GraphQL document rejected: {prepared.errors[0]['message']}")
+            return Checked({'data': None, 'errors': prepared.errors})
+
+        node = prepared.operation(operation_name)
+        if node is None:
+            message = (f"Unknown operation named '{operation_name}'." if operation_name
+                       else "Must provide operation name if query contains multiple operations.")
+            return Checked({'data': None, 'errors': [
+                {'message': message, 'extensions': {'code': 'GRAPHQL_VALIDATION_ERROR'}}]})
+
+        coerced = None
+        if node.variable_definitions:
+            coerced = get_variable_values(self.schema, node.variable_definitions, variables or {})
+            if isinstance(coerced, list):
+                return Checked({'data': None, 'errors': [{**e.formatted, 'extensions': {'code': 'BAD_USER_INPUT'}}
+                                                         for e in coerced]})
+            coerced = coerced.coerced
+
+        if self.cost_analyzer is None:
+            return Checked(None, prepared, node, coerced)
+
+        name = node.name.value if node.name else None
+        cost = prepared.costs.get(name)
+        if cost is None:
+            cost = prepared.costs[name] = self.cost_analyzer.analyze(prepared.document, node)
+        error = self.cost_analyzer.check(cost)
+        if error is not None:
+            logger.warning(f"GraphQL operation rejected: {error['message']}")
+            return Checked({'data': None, 'errors': [error], 'extensions': {'cost': cost.as_dict(self.cost_analyzer)}})
+        return Checked(None, prepared, node, coerced, cost)
+
+    def extensions(self, checked: 'Checked') -> dict[str, Any]:
+        return {'cost': checked.cost.as_dict(self.cost_analyzer)} if checked.cost else {}
+
+    async def execute(self, query: str, variables: Optional[dict[str, Any]] = None,
+                      operation_name: Optional[str] = None, checked: Optional[Checked] = None) -> dict[str, Any]:
+        """checked: the result of `check` when the caller already ran it."""
+        if checked is None:
+            checked = self.check(query, variables, operation_name)
+        if checked.rejected is not None:
+            return checked.rejected
+        if checked.cost is None:
+            return await self._execute(query, checked)
+
+        async with self.cost_analyzer.throttle(checked.cost):
+            result = await self._execute(query, checked)
+        result.setdefault('extensions', {}).update(self.extensions(checked))
+        return result
+
+    async def _execute(self, query: str, checked: Checked) -> dict[str, Any]:
+        token = _operation.set(Operation(checked.node, checked.variables, checked.prepared))
+        try:
+            return await super().execute(query)
+        finally:
+            _operation.reset(token)
+
+    def _detect_operation_type(self, query: str) -> str:
+        operation = _operation.get()
+        if operation is not None:
+            return 'mutation' if operation.node.operation == OperationType.MUTATION else 'query'
+        return self.documents.get(query).operation_type
+
+
+graphql_documents = DocumentCache(max_entries=int(os.getenv('GRAPHQL_DOCUMENT_CACHE_SIZE', '256')))
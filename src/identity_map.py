@@ -0,0 +1,113 @@
+"""
+Identity map for a single Resolver run.
+
+In deep trees the same row is loaded under many parents, eg: user 2 owns most
+tasks, so `Sample1TaskDetail.user` validates a new `User` for every task. With
+`IdentityMapResolver` (or a resolver class wrapped by `with_identity_map`) the
+objects returned by loaders are built once per (response class, id) and the
+same instance is shared by every parent of the tree.
+
+Only classes whose subtree needs no traversal (no resolve/post methods, no
+expose/collect below them, eg: `User`) are shared: their instances never
+depend on where they are placed in the tree. Everything else is converted by
+pydantic-resolve as usual.
+
+pydantic-resolve has no public hook between a resolve method and the
+conversion of its value, so `IdentityMap` overrides the private
+`Resolver._execute_resolve_method_field`. The version is pinned in
+requirement.txt, and test_identity_map checks the signatures of the private
+members this module relies on, so an upgrade that changes them fails there.
+"""
+import asyncio
+from functools import lru_cache
+from inspect import iscoroutine
+from types import NoneType, UnionType
+from typing import Any, Optional, Union, get_args, get_origin
+
+from pydantic import BaseModel
+from pydantic_resolve import Resolver
+import pydantic_resolve.constant as const
+from pydantic_resolve.exceptions import MissingAnnotationError
+from pydantic_resolve.utils import conversion as conversion_util
+from pydantic_resolve.utils.class_util import safe_issubclass
+
+
+@lru_cache
+def _shared_field(kls: type, field: str) -> Optional[tuple[type, bool]]:
+    """(element class, is list) for fields like `Optional[User]` or `list[User]`, None otherwise."""
+    annotation = kls.model_fields[field].annotation
+    if get_origin(annotation) in (Union, UnionType):
+        args = [a for a in get_args(annotation) if a is not NoneType]
+        if len(args) != 1:
+            return None
+        annotation = args[0]
+
+    many = get_origin(annotation) is list
+    if many:
+        annotation = get_args(annotation)[0]
+    if not safe_issubclass(annotation, BaseModel) or 'id' not in annotation.model_fields:
+        return None
+    return annotation, many
+
+
+class IdentityMap:
+    """Resolver mixin, see module docstring."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.identities: dict[tuple[type, Any], BaseModel] = {}
+        self.shared = 0  # references served from the map instead of a new instance
+
+    def _is_shareable(self, kls: type) -> bool:
+        meta = self.metadata.get(kls)
+        return meta is None or not meta['should_traverse']
+
+    def _identity(self, kls: type, data: Any) -> BaseModel:
+        pk = data.get('id') if isinstance(data, dict) else getattr(data, 'id', None)
+        key = (kls, pk)
+        instance = self.identities.get(key) if pk is not None else None
+        if instance is not None:
+            self.shared += 1
+            return instance
+
+        from_attributes = True if self.enable_from_attribute_in_type_adapter else None
+        instance = conversion_util.TypeAdapterManager.get(kls).validate_python(data, from_attributes=from_attributes)
+        if pk is not None:
+            self.identities[key] = instance
+        return instance
+
+    async def _execute_resolve_method_field(self, node, kls, field, trim_field, method):
+        spec = _shared_field(kls, trim_field) if isinstance(node, BaseModel) else None
+        if (spec is None
+                or not self._is_shareable(spec[0])
+                or getattr(method, const.HAS_MAPPER_FUNCTION, False)):
+            return await super()._execute_resolve_method_field(node, kls, field, trim_field, method)
+
+        if self.ensure_type and not method.__annotations__:
+            raise MissingAnnotationError(f'{field}: return annotation is required')
+
+        val = self._execute_resolve_method(kls, field, method)
+        while iscoroutine(val) or asyncio.isfuture(val):
+            val = await val
+
+        element, many = spec
+        if val is None or (many and not isinstance(val, (list, tuple))):
+            # let pydantic-resolve validate (and reject) unexpected shapes
+            val = conversion_util.try_parse_data_to_target_field_type(
+                node, trim_field, val, self.enable_from_attribute_in_type_adapter)
+        elif many:
+            val = [self._identity(element, v) for v in val]
+        else:
+            val = self._identity(element, val)
+
+        # shareable subtrees have nothing to resolve, no need to traverse them
+        setattr(node, trim_field, val)
+
+
+class IdentityMapResolver(IdentityMap, Resolver):
+    pass
+
+
+def with_identity_map(resolver_class: type[Resolver]) -> type[Resolver]:
+    """eg: a diagram specific resolver class created by `config_resolver`."""
+    return type(resolver_class.__name__, (IdentityMap, resolver_class), {})
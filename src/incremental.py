@@ -0,0 +1,433 @@
+"""
+Incremental delivery of GraphQL results (`@defer` / `@stream`) as multipart/mixed.
+
+`teamGetTeams { id name ... @defer { sprints { stories { tasks { id } } } } }`
+sends `teamGetTeams { id name }` as soon as the root query returns, the
+sprints tree follows in a later part. `@defer` applies to fragments and, as a
+shorthand, to relationship fields (`sprints @defer { ... }`); `@stream` sends the
+first `initialCount` items of a list with the initial part and the rest after it.
+
+The executor resolves a whole operation at once, so an operation is planned into
+documents: the initial one without any deferred selection, and one per `@defer`
+with its selections (and those of enclosing `@defer`). The initial document runs
+and is sent first, the deferred ones then run concurrently inside
+`shared_loaders()` and `shared_roots()`: the rows of the root query methods and
+everything already loaded come from the initial execution. Every deferred part
+is sent as soon as its document resolves, after the parts of the `@defer`
+enclosing it, at the path of the objects with the same ids in what was sent
+before (`id` is selected along the path of every `@defer`), not by position:
+the initial part may come from the field cache (see src.field_cache) and the
+rows may change in between. Plans are kept with the prepared document, by
+operation name and the values of the variables the directives use.
+
+The format is the one of Apollo clients (`Accept: multipart/mixed; deferSpec=20220824`):
+an initial `{data, hasNext}` part, then `{incremental: [{data | items, path, label}], hasNext}`.
+Only queries are delivered incrementally, the directives of other operations
+(and of clients not accepting multipart/mixed) are ignored.
+"""
+import asyncio
+import copy
+import json
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Iterator, Optional
+
+from graphql import (GraphQLBoolean, GraphQLInt, GraphQLObjectType, GraphQLSchema, GraphQLString, Visitor,
+                     get_named_type, is_leaf_type, print_ast, value_from_ast, visit)
+from graphql.language.ast import (DirectiveNode, DocumentNode, FieldNode, FragmentDefinitionNode,
+                                  FragmentSpreadNode, InlineFragmentNode, NameNode, OperationDefinitionNode,
+                                  OperationType, SelectionSetNode, VariableNode)
+from graphql.pyutils import Undefined
+
+from src.shared_loaders import shared_loaders
+
+logger = logging.getLogger(__name__)
+
+DIRECTIVES = '''
+directive @defer(if: Boolean! = true, label: String) on FIELD | FRAGMENT_SPREAD | INLINE_FRAGMENT
+directive @stream(if: Boolean! = true, label: String, initialCount: Int! = 0) on FIELD
+'''
+
+MULTIPART_MEDIA_TYPE = 'multipart/mixed; boundary="-"; deferSpec=20220824'
+PART = b'\r\n---\r\nContent-Type: application/json; charset=utf-8\r\n\r\n'
+END = b'\r\n-----\r\n'
+STREAM_CHUNK_SIZE = 100  # items per part of a streamed list
+
+Path = tuple[str, ...]  # response keys from the root, list indices left out
+
+
+def accepts(accept: Optional[str]) -> bool:
+    return 'multipart/mixed' in (accept or '')
+
+
+@dataclass
+class Deferred:
+    label: Optional[str]
+    path: Path  # objects holding the deferred selections
+    keys: list[str]  # response keys it delivers
+    enclosing: list[int]  # indices of the enclosing @defer
+    query: str = ''
+    fillers: list[tuple[Path, str]] = field(default_factory=list)
+
+
+@dataclass
+class Stream:
+    label: Optional[str]
+    path: Path  # the list field
+    initial_count: int
+
+
+@dataclass
+class Plan:
+    query: str  # initial document
+    fillers: list[tuple[Path, str]]  # fields selected only to keep a selection set valid
+    deferred: list[Deferred]
+    streams: list[Stream]
+
+
+class _Planner:
+    def __init__(self, schema: GraphQLSchema, document: DocumentNode, variables: Optional[dict[str, Any]]):
+        self.schema = schema
+        self.fragments = {d.name.value: d for d in document.definitions if isinstance(d, FragmentDefinitionNode)}
+        self.variables = variables or {}
+        self.deferred: list[Deferred] = []
+        self.streams: list[Stream] = []
+        self.anchored: set[Path] = set()  # objects on the path of a @defer, their id is selected
+        self._defer_index: dict[tuple[int, Path], int] = {}
+
+    def _directive(self, node, name: str) -> Optional[DirectiveNode]:
+        """the directive when present and enabled (`if`)."""
+        directive = next((d for d in node.directives or () if d.name.value == name), None)
+        if directive is None:
+            return None
+        enabled = self._argument(directive, 'if', GraphQLBoolean)
+        return None if enabled is False else directive
+
+    def _argument(self, directive: DirectiveNode, name: str, type_=GraphQLString) -> Any:
+        node = next((a for a in directive.arguments or () if a.name.value == name), None)
+        value = value_from_ast(node.value, type_, self.variables) if node else Undefined
+        return None if value is Undefined else value
+
+    def _fragment(self, selection) -> tuple[SelectionSetNode, Any]:
+        if isinstance(selection, FragmentSpreadNode):
+            fragment = self.fragments[selection.name.value]
+            return fragment.selection_set, fragment.type_condition
+        return selection.selection_set, selection.type_condition
+
+    def _type(self, type_condition, parent_type: GraphQLObjectType) -> GraphQLObjectType:
+        return self.schema.get_type(type_condition.name.value) if type_condition else parent_type
+
+    def _keys(self, selection_set: SelectionSetNode) -> list[str]:
+        """response keys selected (not deferred again) by a selection set."""
+        keys = []
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                if not self._directive(selection, 'defer'):
+                    keys.append((selection.alias or selection.name).value)
+            elif not self._directive(selection, 'defer'):
+                keys.extend(self._keys(self._fragment(selection)[0]))
+        return keys
+
+    def collect(self, selection_set: SelectionSetNode, parent_type: GraphQLObjectType, path: Path,
+                enclosing: list[int]):
+        for selection in selection_set.selections:
+            defer = self._directive(selection, 'defer')
+            inner = enclosing
+            if defer is not None:
+                inner = [*enclosing, len(self.deferred)]
+                self._defer_index[(id(selection), path)] = len(self.deferred)
+                keys = ([(selection.alias or selection.name).value] if isinstance(selection, FieldNode)
+                        else self._keys(self._fragment(selection)[0]))
+                self.deferred.append(Deferred(label=self._argument(defer, 'label'), path=path, keys=keys,
+                                              enclosing=enclosing))
+
+            if isinstance(selection, FieldNode):
+                key = (selection.alias or selection.name).value
+                stream = self._directive(selection, 'stream')
+                if stream is not None:
+                    self.streams.append(Stream(label=self._argument(stream, 'label'), path=(*path, key),
+                                               initial_count=self._argument(stream, 'initialCount', GraphQLInt) or 0))
+                field_def = parent_type.fields.get(selection.name.value)
+                if selection.selection_set and field_def is not None:
+                    self.collect(selection.selection_set, get_named_type(field_def.type), (*path, key), inner)
+            else:
+                selection_set_, type_condition = self._fragment(selection)
+                self.collect(selection_set_, self._type(type_condition, parent_type), path, inner)
+
+    def render(self, operation: OperationDefinitionNode, keep: set[int]) -> tuple[str, list[tuple[Path, str]]]:
+        """the operation without the @defer not in keep, fragments inlined, and the fillers it selects."""
+        fillers: list[tuple[Path, str]] = []
+        root_type = self.schema.get_root_type(operation.operation)
+        selections = self._selections(operation.selection_set, root_type, (), keep, fillers)
+        if not selections:
+            return '', fillers
+        selection_set = SelectionSetNode(selections=tuple(selections))
+        used = _variables(selection_set) | _variables(tuple(operation.directives or ()))
+        node = OperationDefinitionNode(operation=operation.operation, name=operation.name,
+                                       directives=operation.directives, selection_set=selection_set,
+                                       variable_definitions=tuple(v for v in operation.variable_definitions or ()
+                                                                  if v.variable.name.value in used))
+        return print_ast(DocumentNode(definitions=(node,))), fillers
+
+    def _selections(self, selection_set: SelectionSetNode, parent_type: GraphQLObjectType, path: Path,
+                    keep: set[int], fillers: list[tuple[Path, str]]) -> list:
+        selections = []
+        for selection in selection_set.selections:
+            index = self._defer_index.get((id(selection), path))
+            if index is not None and index not in keep:
+                continue
+            directives = tuple(d for d in selection.directives or () if d.name.value not in ('defer', 'stream'))
+
+            if isinstance(selection, FieldNode):
+                key = (selection.alias or selection.name).value
+                field_def = parent_type.fields.get(selection.name.value)
+                child = selection.selection_set
+                if child is not None and field_def is not None:
+                    child_type = get_named_type(field_def.type)
+                    inner = self._selections(child, child_type, (*path, key), keep, fillers)
+                    if not inner or ((*path, key) in self.anchored and 'id' in child_type.fields
+                                     and not _selects(inner, 'id')):
+                        inner.append(self._filler(child_type, (*path, key), fillers))
+                    child = SelectionSetNode(selections=tuple(inner))
+                selections.append(FieldNode(alias=selection.alias, name=selection.name, arguments=selection.arguments,
+                                            directives=directives, selection_set=child))
+            else:
+                selection_set_, type_condition = self._fragment(selection)
+                inner = self._selections(selection_set_, self._type(type_condition, parent_type), path, keep, fillers)
+                if inner:
+                    selections.append(InlineFragmentNode(type_condition=type_condition, directives=directives,
+                                                         selection_set=SelectionSetNode(selections=tuple(inner))))
+        return selections
+
+    @staticmethod
+    def _filler(object_type: GraphQLObjectType, path: Path, fillers: list[tuple[Path, str]]) -> FieldNode:
+        name = 'id' if 'id' in object_type.fields else next(
+            n for n, f in object_type.fields.items() if is_leaf_type(get_named_type(f.type)) and not f.args)
+        fillers.append((path, name))
+        return FieldNode(name=NameNode(value=name), arguments=(), directives=())
+
+
+def _selects(selections, name: str) -> bool:
+    """whether selections (or their inline fragments) hold the field name, unaliased."""
+    for selection in selections:
+        if isinstance(selection, FieldNode):
+            if selection.name.value == name and selection.alias is None:
+                return True
+        elif _selects(selection.selection_set.selections, name):
+            return True
+    return False
+
+
+def _variables(nodes) -> set[str]:
+    used = set()
+
+    class Collect(Visitor):
+        def enter_variable(self, variable: VariableNode, *_):
+            used.add(variable.name.value)
+
+    for node in nodes if isinstance(nodes, tuple) else (nodes,):
+        visit(node, Collect())
+    return used
+
+
+def plan(schema: GraphQLSchema, document: DocumentNode, operation: OperationDefinitionNode,
+         variables: Optional[dict[str, Any]] = None) -> Optional[Plan]:
+    """documents delivering the operation incrementally, None when nothing is deferred or streamed."""
+    if operation.operation != OperationType.QUERY:
+        return None
+    planner = _Planner(schema, document, variables)
+    planner.collect(operation.selection_set, schema.query_type, (), [])
+    if not planner.deferred and not planner.streams:
+        return None
+    planner.anchored = {d.path[:i] for d in planner.deferred for i in range(1, len(d.path) + 1)}
+
+    query, fillers = planner.render(operation, keep=set())
+    for index, deferred in enumerate(planner.deferred):
+        deferred.query, deferred.fillers = planner.render(operation, keep={index, *deferred.enclosing})
+    return Plan(query=query, fillers=fillers, deferred=planner.deferred, streams=planner.streams)
+
+
+def _directive_variables(document: DocumentNode, operation: OperationDefinitionNode) -> tuple[str, ...]:
+    """variables used by the arguments of the @defer / @stream of an operation and of the fragments."""
+    directives = []
+
+    class Collect(Visitor):
+        def enter_directive(self, directive: DirectiveNode, *_):
+            if directive.name.value in ('defer', 'stream'):
+                directives.append(directive)
+
+    for node in (operation, *(d for d in document.definitions if isinstance(d, FragmentDefinitionNode))):
+        visit(node, Collect())
+    return tuple(sorted(_variables(tuple(directives)))) if directives else ()
+
+
+def cached_plan(schema: GraphQLSchema, prepared, operation: OperationDefinitionNode,
+                variables: Optional[dict[str, Any]] = None) -> Optional[Plan]:
+    """plan of an operation of a prepared document (see src.graphql_documents), made once."""
+    name = operation.name.value if operation.name else None
+    entry = prepared.incremental_plans.get(name)
+    if entry is None:
+        entry = prepared.incremental_plans[name] = (_directive_variables(prepared.document, operation), {})
+    used, plans = entry
+    key = tuple(json.dumps((variables or {}).get(v), sort_keys=True, default=str) for v in used)
+    if key not in plans:
+        plans[key] = plan(schema, prepared.document, operation, variables)
+    return plans[key]
+
+
+_roots: ContextVar[Optional[dict]] = ContextVar('incremental_roots', default=None)
+
+
+@contextmanager
+def shared_roots() -> Iterator[dict]:
+    """the documents of an incremental execution share the rows of their root query methods."""
+    token = _roots.set({})
+    try:
+        yield _roots.get()
+    finally:
+        _roots.reset(token)
+
+
+class SharedRoots:
+    """QueryExecutor mixin running a root query method once inside shared_roots()."""
+
+    async def _execute_method(self, method, arguments, operation_type='query', entity=None):
+        roots = _roots.get()
+        if roots is None or operation_type != 'query':
+            return await super()._execute_method(method, arguments, operation_type, entity)
+        key = (entity, getattr(method, '__name__', repr(method)), json.dumps(arguments, sort_keys=True, default=str))
+        if key not in roots:
+            roots[key] = asyncio.ensure_future(super()._execute_method(method, arguments, operation_type, entity))
+        return await asyncio.shield(roots[key])
+
+
+def with_shared_roots(executor_class: type) -> type:
+    return type(executor_class.__name__, (SharedRoots, executor_class), {})
+
+
+def _identities(value: Any, path: Path, concrete: tuple = (), ids: tuple = ()) -> Iterator[tuple[list, tuple, dict]]:
+    """(path with list indices, ids of the objects on the way, object) of every object at path."""
+    if isinstance(value, list):
+        for i, item in enumerate(value):
+            yield from _identities(item, path, (*concrete, i), ids)
+    elif isinstance(value, dict):
+        ids = (*ids, value['id'] if 'id' in value else concrete)  # position when there is no id
+        if not path:
+            yield list(concrete), ids, value
+        else:
+            yield from _identities(value.get(path[0]), path[1:], (*concrete, path[0]), ids)
+
+
+def _objects(value: Any, path: Path, concrete: tuple = ()) -> Iterator[tuple[list, Any]]:
+    """(path with list indices, value) of everything at path, lists expanded."""
+    if isinstance(value, list):
+        for i, item in enumerate(value):
+            yield from _objects(item, path, (*concrete, i))
+    elif value is not None:
+        if not path:
+            yield list(concrete), value
+        elif isinstance(value, dict):
+            yield from _objects(value.get(path[0]), path[1:], (*concrete, path[0]))
+
+
+def _drop_fillers(data: Any, fillers: list[tuple[Path, str]]):
+    for path, name in fillers:
+        for _, obj in _objects(data, path):
+            obj.pop(name, None)
+
+
+def _split_streams(data: Any, base: Path, concrete: list, streams: list[Stream]) -> list[dict]:
+    """truncate the streamed lists inside data (found at base) to their initial count, parts sending the rest."""
+    parts = []
+    for stream in streams:
+        if stream.path[:len(base)] != base or len(stream.path) == len(base):
+            continue
+        *parent, key = stream.path[len(base):]
+        for path, obj in _objects(data, tuple(parent), tuple(concrete)):
+            items = obj.get(key) if isinstance(obj, dict) else None
+            if not isinstance(items, list) or len(items) <= stream.initial_count:
+                continue
+            rest, obj[key] = items[stream.initial_count:], items[:stream.initial_count]
+            for start in range(0, len(rest), STREAM_CHUNK_SIZE):
+                item = {'items': rest[start:start + STREAM_CHUNK_SIZE],
+                        'path': [*path, key, stream.initial_count + start]}
+                if stream.label is not None:
+                    item['label'] = stream.label
+                parts.append({'incremental': [item]})
+    return parts
+
+
+async def execute(handler, plan: Plan, variables: Optional[dict[str, Any]], operation_name: Optional[str],
+                  extensions: Optional[dict[str, Any]] = None) -> AsyncIterator[bytes]:
+    """multipart/mixed body of the planned operation."""
+    remaining = 1 + len(plan.deferred)  # groups of parts still to send: the initial one, one per @defer
+
+    def encode(parts: list[dict]) -> bytes:
+        nonlocal remaining
+        remaining -= 1
+        for i, part in enumerate(parts):
+            part['hasNext'] = bool(remaining) or i < len(parts) - 1
+        return b''.join(PART + json.dumps(p, ensure_ascii=False, separators=(',', ':')).encode() for p in parts)
+
+    with shared_loaders(), shared_roots():
+        if plan.query:
+            result = await handler.execute(plan.query, variables, operation_name)
+        else:  # every root field is deferred
+            result = {'data': {}}
+        data = result.get('data')
+        sent_tree = copy.deepcopy(data)  # what the client has, ids and whole lists included
+        _drop_fillers(data, plan.fillers)
+        initial = {'data': data}
+        if result.get('errors'):
+            initial['errors'] = result['errors']
+        if extensions:
+            initial['extensions'] = extensions
+        yield encode([initial, *_split_streams(data, (), [], plan.streams)])
+        if data is None:  # the initial part failed, nothing to complete
+            yield END
+            return
+
+        sent = [asyncio.Event() for _ in plan.deferred]
+        queue: asyncio.Queue[bytes] = asyncio.Queue()
+
+        async def deliver(index: int, deferred: Deferred):
+            try:
+                result = await handler.execute(deferred.query, variables, operation_name)
+            except Exception as e:
+                logger.exception('deferred GraphQL selection failed')
+                result = {'data': None, 'errors': [{'message': str(e), 'extensions': {'code': type(e).__name__}}]}
+            for enclosing in deferred.enclosing:
+                await sent[enclosing].wait()
+            data = result.get('data')
+            targets = {ids: (path, obj) for path, ids, obj in _identities(sent_tree, deferred.path)}
+            found = []
+            for _, ids, obj in _identities(data, deferred.path):
+                if ids in targets:  # else the object wasn't sent: inserted since
+                    path, sent_obj = targets[ids]
+                    values = {k: obj[k] for k in deferred.keys if k in obj}
+                    sent_obj.update(copy.deepcopy(values))
+                    found.append((path, values))
+            _drop_fillers(data, deferred.fillers)
+            items, streamed = [], []
+            for path, values in found:
+                item = {'data': values, 'path': path}
+                if deferred.label is not None:
+                    item['label'] = deferred.label
+                items.append(item)
+                streamed.extend(_split_streams(item['data'], deferred.path, path, plan.streams))
+            if result.get('errors'):
+                items = items or [{'data': None, 'path': list(deferred.path)}]
+                items[0]['errors'] = result['errors']
+            await queue.put(encode([{'incremental': items}, *streamed]))
+            sent[index].set()
+
+        tasks = [asyncio.create_task(deliver(i, d)) for i, d in enumerate(plan.deferred)]
+        try:
+            for _ in tasks:
+                yield await queue.get()
+        finally:
+            for task in tasks:
+                task.cancel()
+    yield END
@@ -1,11 +1,33 @@
+import asyncio
+import json
+import os
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.routing import APIRoute
-from fastapi.responses import PlainTextResponse, HTMLResponse
+from fastapi.responses import PlainTextResponse, HTMLResponse, JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Optional, Dict, Any, List
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Optional, Dict, Any, List, Union
 import src.db as db
+import src.seed as seed
+import src.dataset as dataset
+import src.snapshot as snapshot
+from src.compression import CompressionMiddleware
+from src.response_cache import response_cache, graphql_cache_key
+from src.graphql_documents import CachedGraphQLHandler, Checked, graphql_documents
+from src.identity_map import with_identity_map
+from src.shared_loaders import shared_loaders, with_shared_loaders
+from src.formats import DEFAULT as DEFAULT_REPRESENTATION, Representation, negotiate
+from src.normalize import normalize_graphql
+from src.persisted_queries import PersistedQueryError, persisted_queries
+from src.query_cost import CostAnalyzer
+from src.cache_hints import CacheHints
+from src.field_cache import FieldCacheExecutor
+from src.execution_plans import CompiledExecutor, PlanCompiler
+import src.incremental as incremental
+from src.schema_cache import cached_response, schema_cache
+from src.features import ENABLE_GRAPHIQL, ENABLE_MCP, ENABLE_VOYAGER, LazyMount
+from src.warmup import warmup
 import src.router.sample_1.router as s1_router
 import src.router.sample_2.router as s2_router
 import src.router.sample_3.router as s3_router
@@ -15,42 +37,112 @@ import src.router.sample_6.router as s6_router
 import src.router.sample_7.router as s7_router
 import src.router.demo.router as demo_router
 from src.services.er_diagram import BaseEntity
+from graphql.language.ast import OperationType
 from pydantic_resolve import config_global_resolver
-from pydantic_resolve.graphql import GraphQLHandler, SchemaBuilder
-from pydantic_resolve.graphql.mcp import create_mcp_server, AppConfig
-from fastmcp.utilities.lifespan import combine_lifespans
-from fastapi_voyager import create_voyager
 
 diagram = BaseEntity.get_diagram()
 
 config_global_resolver(diagram)
 
 # GraphQL handler and schema builder
-graphql_handler = GraphQLHandler(diagram, enable_from_attribute_in_type_adapter=True)
-graphql_schema_builder = SchemaBuilder(diagram)
+graphql_handler = CachedGraphQLHandler(diagram, enable_from_attribute_in_type_adapter=True,
+                                       documents=graphql_documents)
+if os.getenv('GRAPHQL_IDENTITY_MAP', '0') == '1':
+    graphql_handler.executor.resolver_class = with_identity_map(graphql_handler.resolver_class)
+# operations of a batch share their loaders
+graphql_handler.executor.resolver_class = with_shared_loaders(graphql_handler.executor.resolver_class)
+graphql_core_schema = graphql_handler.schema  # types of the normalized format
+
+plan_compiler = PlanCompiler(diagram, graphql_handler.executor.builder)
+# the documents of a @defer run the root queries once
+graphql_handler.executor = incremental.with_shared_roots(CompiledExecutor)(graphql_handler.executor)
+
+cache_hints = CacheHints(diagram)
+graphql_handler.executor = FieldCacheExecutor(graphql_handler.executor, cache_hints)
+
+graphql_handler.cost_analyzer = CostAnalyzer(
+    diagram, graphql_handler.schema,
+    list_size=int(os.getenv('GRAPHQL_COST_LIST_SIZE', '10')),
+    list_sizes=json.loads(os.getenv('GRAPHQL_COST_LIST_SIZES', '{}')),  # eg: {"Team.sprints": 5}
+    weights=json.loads(os.getenv('GRAPHQL_COST_WEIGHTS', '{}')),  # eg: {"Task.owner": 2}
+    max_cost=int(os.getenv('GRAPHQL_MAX_COST', '100000')) or None,
+    max_depth=int(os.getenv('GRAPHQL_MAX_DEPTH', '10')) or None,
+    throttle_cost=int(os.getenv('GRAPHQL_THROTTLE_COST', '0')) or None,
+    throttle_concurrency=int(os.getenv('GRAPHQL_THROTTLE_CONCURRENCY', '2')),
+)
+
+# allow-list of persisted queries, compiled ahead of time
+if os.getenv('GRAPHQL_PERSISTED_QUERIES_FILE'):
+    persisted_queries.load(os.environ['GRAPHQL_PERSISTED_QUERIES_FILE'], graphql_handler.schema)
+    if os.getenv('GRAPHQL_COMPILED_PLANS', '1') == '1':
+        for prepared in graphql_documents.pinned():
+            plan_compiler.compile(graphql_handler, prepared.query)
+GRAPHQL_MAX_BATCH = int(os.getenv('GRAPHQL_MAX_BATCH', '20'))  # operations per batched request
 
 # MCP Server configuration
-mcp_apps: List[AppConfig] = [
-    AppConfig(
-        name="task_management",
-        er_diagram=diagram,
-        description="Task management system with users, teams, sprints, stories and tasks. "
-                    "Supports GraphQL queries and mutations for all entities.",
-        enable_from_attribute_in_type_adapter=True,
+def create_mcp():
+    from src.mcp_budget import BudgetedAppConfig, ToolBudget, create_budgeted_mcp_server
+
+    mcp_budget = ToolBudget(
+        max_rows=int(os.getenv('MCP_MAX_ROWS', '200')),
+        max_bytes=int(os.getenv('MCP_MAX_BYTES', str(64 * 1024))),
+        projection={'Team': ('id', 'name'), 'Sprint': ('id', 'name', 'status'), 'Story': ('id', 'name'),
+                    'Task': ('id', 'name', 'estimate'), 'User': ('id', 'name')},
     )
-]
+    mcp_apps: List[BudgetedAppConfig] = [
+        BudgetedAppConfig(
+            name="task_management",
+            er_diagram=diagram,
+            description="Task management system with users, teams, sprints, stories and tasks. "
+                        "Supports GraphQL queries and mutations for all entities.",
+            enable_from_attribute_in_type_adapter=True,
+            budgets={'graphql_query': mcp_budget, 'graphql_mutation': mcp_budget},
+        )
+    ]
+    return create_budgeted_mcp_server(apps=mcp_apps, name="Task Management GraphQL MCP Server")
+
+
+def create_mcp_app():
+    mcp_app = create_mcp().http_app(path='/')
+    return mcp_app, mcp_app.lifespan
 
-mcp = create_mcp_server(apps=mcp_apps, name="Task Management GraphQL MCP Server")
-mcp_app = mcp.http_app(path='/')
+
+mcp_mount = LazyMount(create_mcp_app) if ENABLE_MCP else None
+
+async def populate():
+    await db.init()
+    if seed.SEED_PATH:
+        print(await seed.load_path(db.engine, seed.SEED_PATH))
+    elif dataset.SEED_DATASET:
+        print(await dataset.load(db.engine, dataset.DatasetSpec.parse(dataset.SEED_DATASET)))
+    else:
+        await db.prepare()
+
+def data_source() -> str:
+    """what populate() loads, part of the version of the snapshot"""
+    if seed.SEED_PATH:
+        return snapshot.files_source([seed.SEED_PATH])
+    if dataset.SEED_DATASET:
+        return repr(dataset.DatasetSpec.parse(dataset.SEED_DATASET))
+    return snapshot.files_source([m.__file__ for m in (db.sm, db.stm, db.tm, db.tem, db.um)])
 
 async def startup():
     print('start')
-    await db.init()
-    await db.prepare()
+    if snapshot.SNAPSHOT_PATH:
+        print(await snapshot.restore_or_build(
+            db.engine, snapshot.SNAPSHOT_PATH, snapshot.version(data_source()), populate))
+    else:
+        await populate()
+    schema_cache.current()  # SDL and introspection, built before the first request
+    warmup.start(app, graphql_handler, graphql_documents, persisted_queries)
     print('done')
 
 async def shutdown():
     print('end start')
+    await warmup.stop()
+    for mount in (mcp_mount, voyager_mount):
+        if mount is not None:
+            await mount.aclose()
     await db.engine.dispose()
     print('end done')
 
@@ -60,9 +152,7 @@ async def db_lifespan(app: FastAPI):
     yield
     await shutdown()
 
-combined_lifespan = combine_lifespans(db_lifespan, mcp_app.lifespan)
-
-app = FastAPI(debug=True, lifespan=combined_lifespan)
+app = FastAPI(debug=True, lifespan=db_lifespan)
 
 # 添加 CORS 中间件
 app.add_middleware(
@@ -73,6 +163,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.getenv('COMPRESSION_MIN_SIZE', '1024')),
+    offload_size=int(os.getenv('COMPRESSION_OFFLOAD_SIZE', str(256 * 1024))),
+)
+
 app.include_router(s1_router.route)
 app.include_router(s2_router.route)
 app.include_router(s3_router.route)
@@ -85,9 +181,12 @@ app.include_router(demo_router.route)
 
 # GraphQL request model
 class GraphQLRequest(BaseModel):
-    query: str
+    model_config = ConfigDict(populate_by_name=True)
+
+    query: Optional[str] = None  # None: a persisted query sent by its hash in extensions
     variables: Optional[Dict[str, Any]] = None
-    operation_name: Optional[str] = None
+    operation_name: Optional[str] = Field(default=None, alias='operationName')
+    extensions: Optional[Dict[str, Any]] = None
 
 
 # GraphQL endpoints
@@ -160,42 +259,191 @@ GRAPHIQL_HTML = """
 
 
 @app.get("/graphql", response_class=HTMLResponse)
-async def graphiql_playground():
-    """GraphiQL interactive playground"""
-    return GRAPHIQL_HTML
+async def graphiql_playground(request: Request):
+    """GraphiQL interactive playground, or a query sent as url parameters (eg: a persisted query hash)"""
+    params = request.query_params
+    if 'query' not in params and 'extensions' not in params:
+        if not ENABLE_GRAPHIQL:
+            return JSONResponse({'data': None, 'errors': [{'message': 'Must provide query string.'}]},
+                                status_code=400)
+        return GRAPHIQL_HTML
+
+    try:
+        req = GraphQLRequest(query=params.get('query'), operation_name=params.get('operationName'),
+                             variables=json.loads(params['variables']) if 'variables' in params else None,
+                             extensions=json.loads(params['extensions']) if 'extensions' in params else None)
+    except ValueError as e:
+        return JSONResponse({'data': None, 'errors': [{'message': f'Invalid request parameters: {e}'}]},
+                            status_code=400)
+
+    return await execute_graphql(req, request)
 
 
 @app.post("/graphql")
-async def graphql_endpoint(req: GraphQLRequest):
-    """GraphQL query endpoint"""
-    return await graphql_handler.execute(
-        query=req.query,
-    )
+async def graphql_endpoint(req: Union[GraphQLRequest, List[GraphQLRequest]], request: Request):
+    """GraphQL query endpoint, query results are served from the response cache"""
+    if isinstance(req, GraphQLRequest):
+        return await execute_graphql(req, request)
+    return await execute_graphql_batch(req, request)
+
+
+async def execute_graphql_batch(reqs: List[GraphQLRequest], request: Request) -> Response:
+    """
+    a JSON array of operations, executed concurrently with one set of loaders,
+    answered by the array of their results.
+    """
+    if not 0 < len(reqs) <= GRAPHQL_MAX_BATCH:
+        return JSONResponse({'data': None, 'errors': [
+            {'message': f'A batch must hold 1 to {GRAPHQL_MAX_BATCH} operations.'}]}, status_code=400)
+
+    # each operation is resolved and checked once, here: the cost budget holds for the batch, it runs at once
+    representation = negotiate(request)
+    responses: list[Optional[Response]] = [None] * len(reqs)
+    checks: dict[int, Optional[Checked]] = {}
+    for i, req in enumerate(reqs):
+        try:
+            req.query = persisted_queries.resolve(req.query, req.extensions)
+        except PersistedQueryError as e:
+            responses[i] = graphql_response(req, {'data': None, 'errors': [e.to_dict()]}, representation)
+            continue
+        checks[i] = None if schema_cache.is_introspection(req.query, req.operation_name) \
+            else graphql_handler.check(req.query, req.variables, req.operation_name)
+    error = graphql_handler.cost_analyzer.check_batch(
+        [c.cost for c in checks.values() if c is not None and c.cost is not None])
+    if error is not None:
+        return JSONResponse({'data': None, 'errors': [error]}, status_code=400)
+
+    # one dependency set: a row loaded for one operation may be served to the others
+    with response_cache.track(), shared_loaders():
+        executed = await asyncio.gather(*[execute_resolved_graphql(reqs[i], request, representation, False, checked)
+                                          for i, checked in checks.items()])
+    for i, response in zip(checks, executed):
+        responses[i] = response
+    return Response(representation.encode_array([r.body for r in responses]), media_type=representation.media_type)
+
+
+async def execute_graphql(req: GraphQLRequest, request: Request, stream: bool = True) -> Response:
+    representation = negotiate(request)
+    try:
+        req.query = persisted_queries.resolve(req.query, req.extensions)
+    except PersistedQueryError as e:
+        return graphql_response(req, {'data': None, 'errors': [e.to_dict()]}, representation)
+
+    if request.method == 'GET':
+        operation = graphql_documents.get(req.query).operation(req.operation_name)
+        if operation is not None and operation.operation != OperationType.QUERY:
+            return JSONResponse({'data': None, 'errors': [{'message': 'Only queries can be sent with GET.'}]},
+                                status_code=405, headers={'allow': 'POST'})
+    return await execute_resolved_graphql(req, request, representation, stream)
+
+
+async def execute_resolved_graphql(req: GraphQLRequest, request: Request, representation: Representation,
+                                   stream: bool = True, checked: Optional[Checked] = None) -> Response:
+    """execute an operation whose document is resolved, checked: graphql_handler.check() when already run."""
+    # introspection: answered from the schema cache, encoded once
+    if schema_cache.is_introspection(req.query, req.operation_name):
+        encoded = schema_cache.current().introspect(req.query, req.variables, req.operation_name)
+        return encoded.response(request, representation)
+
+    # @defer / @stream: multipart/mixed, never cached
+    if stream and incremental.accepts(request.headers.get('accept')):
+        if checked is None:
+            checked = graphql_handler.check(req.query, req.variables, req.operation_name)
+        if checked.rejected is not None:
+            return graphql_response(req, checked.rejected, representation)
+        plan = incremental.cached_plan(graphql_handler.schema, checked.prepared, checked.node, req.variables)
+        if plan is not None:
+            return StreamingResponse(
+                incremental.execute(graphql_handler, plan, req.variables, req.operation_name,
+                                    graphql_handler.extensions(checked)),
+                media_type=incremental.MULTIPART_MEDIA_TYPE)
+
+    key = graphql_cache_key(req.query, req.variables, req.operation_name)
+    if key is None:
+        result = await graphql_handler.execute(
+            query=req.query,
+            variables=req.variables,
+            operation_name=req.operation_name,
+            checked=checked,
+        )
+        return graphql_response(req, result, representation,
+                                headers=None if result.get('errors') else cache_control(req))
+
+    if representation != DEFAULT_REPRESENTATION:
+        key = (*key, representation.variant)
+    entry = response_cache.get(key)
+    if entry is not None:
+        return Response(entry.body, media_type=entry.media_type, headers={'x-cache': 'hit', **cache_control(req)})
+
+    with response_cache.track() as dependencies:
+        result = await graphql_handler.execute(
+            query=req.query,
+            variables=req.variables,
+            operation_name=req.operation_name,
+            checked=checked,
+        )
+    if result.get('errors'):
+        return graphql_response(req, result, representation, headers={'x-cache': 'miss'})
+    response = graphql_response(req, result, representation, headers={'x-cache': 'miss', **cache_control(req)})
+    response_cache.put(key, response.body, response.media_type, dependencies)
+    return response
+
+
+def cache_control(req: GraphQLRequest) -> dict:
+    """Cache-Control of a successful result: the lowest max-age of the selected fields (see src.cache_hints)."""
+    header = cache_hints.operation_policy(graphql_handler, req.query, req.operation_name).header()
+    return {'cache-control': header} if header else {}
+
+
+def graphql_response(req: GraphQLRequest, result: dict, representation: Representation,
+                     headers: Optional[dict] = None) -> Response:
+    if representation.normalized:
+        if result.get('data') is not None:
+            result = normalize_graphql(result, graphql_documents.get(req.query).document, graphql_core_schema,
+                                       req.operation_name)
+        else:
+            representation = Representation(binary=representation.binary)  # errors only, nothing to normalize
+    return Response(representation.encode(result), media_type=representation.media_type, headers=headers)
+
+
+@app.get("/ready", include_in_schema=False)
+async def ready():
+    """readiness probe: 503 until the warmup of the worker is done"""
+    if not warmup.ready:
+        return JSONResponse({'ready': False}, status_code=503)
+    return {'ready': True, 'warmup': warmup.report}
 
 
 @app.get("/schema", response_class=PlainTextResponse)
-async def graphql_schema():
-    """GraphQL Schema SDL endpoint"""
-    return graphql_schema_builder.build_schema()
+async def graphql_schema(request: Request):
+    """GraphQL Schema SDL endpoint, built once per ER diagram (see src.schema_cache)"""
+    return cached_response(request, schema_cache.current().sdl, 'text/plain; charset=utf-8')
 
 
-# TODO: re-enable after fastapi-voyager is updated for pydantic-resolve v4
-app.mount('/voyager',
-          create_voyager(
-            app,
-            er_diagram=diagram,
-            module_color={'src.services': 'purple'},
-            module_prefix='src.services',
-            swagger_url="/docs",
-            ga_id="G-R64S7Q49VL",
-            initial_page_policy='first',
-            online_repo_url='https://github.com/allmonday/composition-oriented-development-pattern/blob/master',
-            enable_pydantic_resolve_meta=True))
+def create_voyager_app():
+    from fastapi_voyager import create_voyager
+
+    # TODO: re-enable after fastapi-voyager is updated for pydantic-resolve v4
+    return create_voyager(
+        app,
+        er_diagram=diagram,
+        module_color={'src.services': 'purple'},
+        module_prefix='src.services',
+        swagger_url="/docs",
+        ga_id="G-R64S7Q49VL",
+        initial_page_policy='first',
+        online_repo_url='https://github.com/allmonday/composition-oriented-development-pattern/blob/master',
+        enable_pydantic_resolve_meta=True), None
+
 
+voyager_mount = LazyMount(create_voyager_app) if ENABLE_VOYAGER else None
+if voyager_mount is not None:
+    app.mount('/voyager', voyager_mount)
 
 # Mount MCP server (Streamable HTTP)
 # MCP endpoint: http://localhost:8000/mcp/
-app.mount('/mcp', mcp_app)
+if mcp_mount is not None:
+    app.mount('/mcp', mcp_mount)
 
 
 def use_route_names_as_operation_ids(app: FastAPI) -> None:
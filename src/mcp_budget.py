@@ -0,0 +1,317 @@
+"""
+Result-size budgets, cursor pagination and projection defaults of MCP tools.
+
+Agents ask the MCP server for "all tasks" or the full team tree; the plain
+tools build and return the whole result. With `create_budgeted_mcp_server`,
+each app declares a `ToolBudget` per execution tool (`graphql_query`,
+`graphql_mutation`):
+
+- `max_rows`: objects in a response, the root lists are windowed to it before
+  their relationships are resolved, so the work of a call is bounded too
+- `max_bytes`: JSON size of a response
+- `projection`: fields selected for an object field given without a selection
+  set (`{ taskGetTasks }`), by type name; the scalar fields of the type when it
+  isn't listed
+
+A response keeps the longest prefix of whole root items within the budget (at
+least one, whose nested lists are cut to fit when it is alone over budget) and
+reports `page.cursor`, a continuation token holding the query and the offsets
+of the root lists: `graphql_query(cursor=...)` returns the next page. Tokens
+are self-contained, any worker can serve them.
+"""
+import base64
+import json
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from fastmcp import FastMCP
+from graphql import (GraphQLError, GraphQLSchema, build_schema, get_named_type, is_leaf_type, is_object_type,
+                     parse, print_ast)
+from graphql.language.ast import FieldNode, NameNode, SelectionSetNode
+from pydantic_resolve.graphql.executor import QueryExecutor
+from pydantic_resolve.graphql.mcp import AppConfig
+from pydantic_resolve.graphql.mcp.managers.multi_app_manager import MultiAppManager
+from pydantic_resolve.graphql.mcp.tools.multi_app_tools import register_multi_app_tools
+from pydantic_resolve.graphql.mcp.types.errors import MCPErrors, create_error_response, create_success_response
+
+
+@dataclass(frozen=True)
+class ToolBudget:
+    max_rows: int = 100
+    max_bytes: int = 64 * 1024
+    projection: dict[str, tuple[str, ...]] = field(default_factory=dict)  # by type name
+
+
+class BudgetedAppConfig(AppConfig):
+    budgets: dict[str, ToolBudget] = {}  # by tool name, ToolBudget() when missing
+
+    def budget(self, tool: str) -> ToolBudget:
+        return self.budgets.get(tool) or ToolBudget()
+
+
+class CursorError(ValueError):
+    pass
+
+
+def encode_cursor(query: str, offsets: dict[str, int]) -> str:
+    payload = json.dumps({'query': query, 'offsets': offsets}, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(payload).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[str, dict[str, int]]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return payload['query'], {k: int(v) for k, v in payload['offsets'].items()}
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise CursorError('invalid cursor')
+
+
+@dataclass
+class Window:
+    """root lists to execute: from offsets, limit rows each; their sizes are reported in totals."""
+    offsets: dict[str, int]
+    limit: int
+    totals: dict[str, int] = field(default_factory=dict)
+
+
+_window: ContextVar[Optional[Window]] = ContextVar('mcp_window', default=None)
+_root: ContextVar[Optional[str]] = ContextVar('mcp_root', default=None)
+
+
+class WindowedExecutor(QueryExecutor):
+    """QueryExecutor resolving only the window of root lists of the current MCP call."""
+
+    def __init__(self, executor: QueryExecutor):
+        super().__init__(parser=executor.parser, builder=executor.builder, resolver_class=executor.resolver_class,
+                         enable_from_attribute_in_type_adapter=executor.enable_from_attribute_in_type_adapter)
+
+    async def _execute_single_query(self, query_name, entity, query_method, field_selection, response_model):
+        _root.set(query_name)  # each root field runs in its own task
+        return await super()._execute_single_query(query_name, entity, query_method, field_selection, response_model)
+
+    async def _execute_method(self, method, arguments, operation_type='query', entity=None):
+        result = await super()._execute_method(method, arguments, operation_type, entity)
+        window, root = _window.get(), _root.get()
+        if window is None or root is None or operation_type != 'query' or not isinstance(result, list):
+            return result
+        window.totals[root] = len(result)
+        offset = window.offsets.get(root, 0)
+        return result[offset:offset + window.limit]
+
+
+def _rows(value: Any) -> int:
+    if isinstance(value, dict):
+        return 1 + sum(_rows(v) for v in value.values())
+    if isinstance(value, list):
+        return sum(_rows(v) for v in value)
+    return 0
+
+
+def _size(value: Any) -> int:
+    return len(json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode())
+
+
+def _cut(value: Any, rows: int, path: str, truncated: list[str]) -> tuple[Any, int]:
+    """value with at most rows objects, depth first; paths of the cut lists go to truncated."""
+    if isinstance(value, dict):
+        result, used = {}, 1
+        for key, item in value.items():
+            result[key], n = _cut(item, max(rows - used, 0), f'{path}.{key}', truncated)
+            used += n
+        return result, used
+    if isinstance(value, list):
+        result, used = [], 0
+        for i, item in enumerate(value):
+            if used >= rows and isinstance(item, (dict, list)):
+                truncated.append(path)
+                break
+            kept, n = _cut(item, rows - used, f'{path}.{i}', truncated)
+            result.append(kept)
+            used += n
+        return result, used
+    return value, 0
+
+
+def trim(data: Optional[dict[str, Any]], budget: ToolBudget) -> tuple[Optional[dict], dict[str, int], list[str]]:
+    """data within budget, items kept by root list, paths of the nested lists cut."""
+    if not data:
+        return data, {}, []
+    result, kept, truncated = {}, {}, []
+    rows, size = 0, 2
+    for root, value in data.items():
+        items = value if isinstance(value, list) else [value]
+        taken = []
+        for item in items:
+            item_rows, item_size = _rows(item), _size(item) + 1
+            if rows + item_rows <= budget.max_rows and size + item_size <= budget.max_bytes:
+                taken.append(item)
+                rows, size = rows + item_rows, size + item_size
+                continue
+            if rows == 0:  # alone over budget: its nested lists are cut until it fits
+                limit = budget.max_rows
+                while True:
+                    cut_paths = []
+                    item_cut, item_rows = _cut(item, limit, f'{root}.{len(taken)}', cut_paths)
+                    if _size(item_cut) < budget.max_bytes or limit <= 1:
+                        break
+                    limit //= 2
+                truncated.extend(cut_paths)
+                taken.append(item_cut)
+                rows, size = rows + item_rows, size + _size(item_cut)
+            break
+        result[root] = taken if isinstance(value, list) else (taken[0] if taken else None)
+        kept[root] = len(taken)
+    return result, kept, truncated
+
+
+def _replace(node, **changes):
+    return type(node)(**{**{key: getattr(node, key) for key in node.keys if key != 'loc'}, **changes})
+
+
+class Projection:
+    """fills the selection set of object fields given without one."""
+
+    def __init__(self, schema: GraphQLSchema):
+        self.schema = schema
+
+    def expand(self, query: str, projection: dict[str, tuple[str, ...]]) -> str:
+        try:
+            document = parse(query)
+        except GraphQLError:
+            return query  # reported by the handler
+        definitions = []
+        for definition in document.definitions:
+            operation = getattr(definition, 'operation', None)
+            root = self.schema.get_root_type(operation) if operation is not None else None
+            if root is not None:
+                definition = _replace(definition,
+                                      selection_set=self._expand(definition.selection_set, root, projection))
+            definitions.append(definition)
+        expanded = print_ast(_replace(document, definitions=tuple(definitions)))
+        return expanded if expanded != print_ast(document) else query
+
+    def _expand(self, selection_set: SelectionSetNode, parent, projection) -> SelectionSetNode:
+        selections = []
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode) and selection.name.value in parent.fields:
+                named = get_named_type(parent.fields[selection.name.value].type)
+                if is_object_type(named) and selection.selection_set is None:
+                    names = projection.get(named.name) or [n for n, f in named.fields.items()
+                                                           if is_leaf_type(get_named_type(f.type))]
+                    selection = _replace(selection, selection_set=SelectionSetNode(selections=tuple(
+                        FieldNode(name=NameNode(value=n), arguments=(), directives=()) for n in names)))
+                elif is_object_type(named):
+                    selection = _replace(selection,
+                                         selection_set=self._expand(selection.selection_set, named, projection))
+            selections.append(selection)
+        return _replace(selection_set, selections=tuple(selections))
+
+
+def create_budgeted_mcp_server(apps: list[AppConfig], name: str = "Pydantic-Resolve GraphQL API") -> FastMCP:
+    """create_mcp_server, with the execution tools bounded by the ToolBudget of each app."""
+    if not apps:
+        raise ValueError("apps list cannot be empty")
+    manager = MultiAppManager(apps)
+    mcp = FastMCP(name)
+    register_multi_app_tools(mcp, manager)
+
+    configs, projections = {}, {}
+    for config in apps:
+        handler = manager.get_app(config.name).handler
+        handler.executor = WindowedExecutor(handler.executor)
+        configs[config.name] = config
+        projections[config.name] = Projection(build_schema(handler.schema_builder.build_schema()))
+
+    def budget_of(app_name: str, tool: str) -> ToolBudget:
+        config = configs[manager.get_app(app_name).name]
+        return config.budget(tool) if isinstance(config, BudgetedAppConfig) else ToolBudget()
+
+    async def execute(app_name: str, query: str, tool: str, offsets: dict[str, int], error_type: MCPErrors):
+        app = manager.get_app(app_name)
+        budget = budget_of(app_name, tool)
+        query = projections[app.name].expand(query, budget.projection)
+        window = Window(offsets, budget.max_rows)
+        token = _window.set(window)
+        try:
+            result = await app.handler.execute(query)
+        finally:
+            _window.reset(token)
+        if result.get('errors'):
+            return create_error_response("; ".join(e.get("message", "Unknown error") for e in result["errors"]),
+                                         error_type, hint=f"Error occurred on app '{app_name}'.")
+
+        data, kept, truncated = trim(result.get('data'), budget)
+        following = {root: offsets.get(root, 0) + n for root, n in kept.items() if root in window.totals}
+        more = any(window.totals[root] > offset for root, offset in following.items())
+        response = create_success_response(data)
+        response['page'] = {'rows': _rows(list((data or {}).values())), 'bytes': _size(data), 'truncated': truncated,
+                            'cursor': encode_cursor(query, following) if more else None}
+        if more:
+            response['hint'] = (f"The result was cut to the budget of '{tool}' ({budget.max_rows} rows, "
+                                f"{budget.max_bytes} bytes). Call {tool}(cursor=page.cursor, app_name='{app_name}') "
+                                f"for the next page, or select fewer fields.")
+        elif truncated:
+            response['hint'] = "Nested lists listed in page.truncated were cut, query them separately."
+        return response
+
+    mcp.local_provider.remove_tool('graphql_query')
+    mcp.local_provider.remove_tool('graphql_mutation')
+
+    @mcp.tool()
+    async def graphql_query(app_name: str, query: str = '', cursor: Optional[str] = None) -> dict[str, Any]:
+        """Execute a GraphQL query on a specific application, one page at a time.
+
+        The response is bounded in rows and bytes: when `page.cursor` is set, call
+        graphql_query again with that cursor (and no query) for the next page.
+        An object field without sub-selection returns its default fields.
+
+        Args:
+            app_name: Name of the application (required)
+            query: A GraphQL query string
+            cursor: Continuation token of a previous page
+
+        Examples:
+            graphql_query(query="{ taskGetTasks { id name owner { name } } }", app_name="task_management")
+            graphql_query(query="{ taskGetTasks }", app_name="task_management")
+            graphql_query(cursor="eyJxdWVyeSI6...", app_name="task_management")
+        """
+        offsets = {}
+        if cursor:
+            try:
+                cursor_query, offsets = decode_cursor(cursor)
+            except CursorError as e:
+                return create_error_response(str(e), MCPErrors.QUERY_EXECUTION_ERROR)
+            if query.strip() and query != cursor_query:
+                return create_error_response("the cursor belongs to another query",
+                                             MCPErrors.QUERY_EXECUTION_ERROR)
+            query = cursor_query
+        if not query.strip():
+            return create_error_response("query is required and cannot be empty", MCPErrors.MISSING_REQUIRED_FIELD)
+        try:
+            return await execute(app_name, query, 'graphql_query', offsets, MCPErrors.QUERY_EXECUTION_ERROR)
+        except ValueError as e:
+            return create_error_response(str(e), MCPErrors.APP_NOT_FOUND)
+        except Exception as e:
+            return create_error_response(str(e), MCPErrors.INTERNAL_ERROR)
+
+    @mcp.tool()
+    async def graphql_mutation(mutation: str, app_name: str) -> dict[str, Any]:
+        """Execute a GraphQL mutation on a specific application.
+
+        The returned data is bounded in rows and bytes, see `page` in the response.
+
+        Args:
+            mutation: A GraphQL mutation string
+            app_name: Name of the application (required)
+        """
+        if not mutation or not mutation.strip():
+            return create_error_response("mutation is required and cannot be empty", MCPErrors.MISSING_REQUIRED_FIELD)
+        try:
+            return await execute(app_name, mutation, 'graphql_mutation', {}, MCPErrors.MUTATION_EXECUTION_ERROR)
+        except ValueError as e:
+            return create_error_response(str(e), MCPErrors.APP_NOT_FOUND)
+        except Exception as e:
+            return create_error_response(str(e), MCPErrors.INTERNAL_ERROR)
+
+    return mcp
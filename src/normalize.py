@@ -0,0 +1,158 @@
+"""
+Normalized response format.
+
+Nested responses repeat the same rows over and over (eg: the owner of every
+task), the normalized format emits every entity (an object with an `id`) once
+in a table per type and replaces its occurrences by the id:
+
+    {
+        "root": "Sample1TeamDetail",
+        "data": [1, 2],
+        "entities": {
+            "Sample1TeamDetail": {"1": {"id": 1, "name": "team-A", "sprints": [1, 2], ...}, ...},
+            "User": {"2": {"id": 2, "name": "Eric"}, ...},
+        },
+        "types": {"Sample1TeamDetail": {"sprints": "Sample1SprintDetail", "members": "User"}, ...}
+    }
+
+`types` tells, for every type, the type of the fields holding objects, so
+clients can rebuild the tree (see fe-demo/src/normalized.ts). Objects without
+`id` stay inline, and so do the occurrences of an entity which differ from the
+one in the table: the values of post methods, collectors and exposed fields
+depend on where the object is in the tree. REST responses are typed by response classes, GraphQL ones
+by the types of the schema (entities selected differently are merged).
+
+Clients opt in with `Accept: application/vnd.normalized+json` or `?format=normalized`.
+"""
+from collections import defaultdict
+from functools import lru_cache
+from typing import Any, Optional
+
+from fastapi import Request
+from graphql import (DocumentNode, FieldNode, FragmentDefinitionNode, FragmentSpreadNode, GraphQLObjectType,
+                     GraphQLSchema, InlineFragmentNode, OperationDefinitionNode, SelectionSetNode, get_named_type)
+from pydantic import BaseModel
+from pydantic_resolve.utils.class_util import safe_issubclass
+from pydantic_resolve.utils.types import get_core_types
+
+NORMALIZED_MEDIA_TYPE = 'application/vnd.normalized+json'
+
+
+def wants_normalized(request: Request) -> bool:
+    return (request.query_params.get('format') == 'normalized'
+            or NORMALIZED_MEDIA_TYPE in request.headers.get('accept', ''))
+
+
+@lru_cache
+def _object_fields(kls: type[BaseModel]) -> tuple[tuple[str, str], ...]:
+    """(field name, serialized name) of the fields which may hold objects, excluded fields are skipped."""
+    fields = []
+    for name, field in kls.model_fields.items():
+        if field.exclude:
+            continue
+        if any(safe_issubclass(t, BaseModel) for t in get_core_types(field.annotation)):
+            fields.append((name, field.serialization_alias or field.alias or name))
+    return tuple(fields)
+
+
+class Normalizer:
+    def __init__(self):
+        self.entities: defaultdict[str, dict[str, dict]] = defaultdict(dict)
+        self.types: defaultdict[str, dict[str, str]] = defaultdict(dict)
+
+    def document(self, root: Optional[str], data: Any) -> dict:
+        return dict(root=root, data=data, entities=self.entities, types=self.types)
+
+    # pydantic instances (REST), walked together with their dump which is done once, by pydantic
+
+    def model(self, obj: BaseModel, data: dict) -> Any:
+        kls = type(obj)
+        type_name = kls.__name__
+        pk = data.get('id') if 'id' in kls.model_fields else None
+        for name, key in _object_fields(kls):
+            if data.get(key) is not None:
+                data[key] = self.value(getattr(obj, name), data[key], type_name, key)
+
+        if pk is None:
+            return data
+        stored = self.entities[type_name].setdefault(str(pk), data)
+        if stored is not data and stored != data:
+            return data  # same row, other values (eg: post_ fields computed from other children)
+        return pk  # eg: a User shared by many tasks
+
+    def value(self, value: Any, data: Any, parent: str, key: str) -> Any:
+        if isinstance(value, BaseModel):
+            self.types[parent][key] = type(value).__name__
+            return self.model(value, data)
+        if isinstance(value, (list, tuple)):
+            return [self.value(v, d, parent, key) for v, d in zip(value, data)]
+        return data
+
+    # results of GraphQL (dicts, typed by the schema)
+
+    def graphql(self, value: Any, gtype: GraphQLObjectType, fields: dict[str, FieldNode],
+                fragments: dict[str, FragmentDefinitionNode], is_root: bool = False) -> Any:
+        if isinstance(value, list):
+            return [self.graphql(v, gtype, fields, fragments) for v in value]
+        if not isinstance(value, dict):
+            return value
+
+        data = dict(value)
+        for key, node in fields.items():
+            field_def = gtype.fields.get(node.name.value)
+            child = get_named_type(field_def.type) if field_def else None
+            if not isinstance(child, GraphQLObjectType) or data.get(key) is None:
+                continue
+            self.types[gtype.name][key] = child.name
+            data[key] = self.graphql(data[key], child, _collect_fields(node.selection_set, fragments), fragments)
+
+        pk = data.get('id')
+        if is_root or pk is None:
+            return data
+        self.entities[gtype.name].setdefault(str(pk), {}).update(data)
+        return pk
+
+
+def _collect_fields(selection_set: Optional[SelectionSetNode],
+                    fragments: dict[str, FragmentDefinitionNode]) -> dict[str, FieldNode]:
+    """response key -> field, flattening fragments (the schema has no unions nor interfaces)."""
+    fields: dict[str, FieldNode] = {}
+    for selection in selection_set.selections if selection_set else ():
+        if isinstance(selection, FieldNode):
+            fields.setdefault((selection.alias or selection.name).value, selection)
+        elif isinstance(selection, InlineFragmentNode):
+            fields.update(_collect_fields(selection.selection_set, fragments))
+        elif isinstance(selection, FragmentSpreadNode) and selection.name.value in fragments:
+            fields.update(_collect_fields(fragments[selection.name.value].selection_set, fragments))
+    return fields
+
+
+def normalize_models(value: Any, data: Any) -> dict:
+    """normalize a validated response (a model or a list of models) given its json dump."""
+    normalizer = Normalizer()
+    items = value if isinstance(value, (list, tuple)) else [value]
+    root = next((type(v).__name__ for v in items if isinstance(v, BaseModel)), None)
+    data = normalizer.value(value, data, '', '')
+    normalizer.types.pop('', None)
+    return normalizer.document(root, data)
+
+
+def normalize_graphql(result: dict, document: DocumentNode, schema: GraphQLSchema,
+                      operation_name: Optional[str] = None) -> dict:
+    """normalize the result of a query or mutation, `errors` and `extensions` are kept as they are."""
+    fragments = {d.name.value: d for d in document.definitions if isinstance(d, FragmentDefinitionNode)}
+    operations = [d for d in document.definitions if isinstance(d, OperationDefinitionNode)]
+    operation = next((o for o in operations if o.name and o.name.value == operation_name), operations[0])
+    root_type = schema.get_root_type(operation.operation)
+
+    normalizer = Normalizer()
+    data = result.get('data')
+    if data is not None:
+        data = normalizer.graphql(data, root_type, _collect_fields(operation.selection_set, fragments),
+                                  fragments, is_root=True)
+    normalized = normalizer.document(root_type.name, data)
+    if result.get('errors'):
+        normalized['errors'] = result['errors']
+    if result.get('extensions'):
+        normalized['extensions'] = result['extensions']
+    return normalized
@@ -0,0 +1,100 @@
+"""
+Automatic persisted queries (the protocol of Apollo clients).
+
+A client sends `extensions: {"persistedQuery": {"version": 1, "sha256Hash": ...}}`
+without the query text; the document is looked up in the DocumentCache, which
+is keyed by the same sha256, already parsed and validated. On a miss the client
+gets `PERSISTED_QUERY_NOT_FOUND` and sends the text along with the hash once,
+which registers it.
+
+In allow-list mode (`GRAPHQL_PERSISTED_QUERIES=allowlist`) only documents loaded
+from a manifest (`GRAPHQL_PERSISTED_QUERIES_FILE`) execute, everything else is
+rejected. Either a json object {hash: query} or an Apollo persisted query
+manifest ({"operations": [{"id": hash, "body": query}, ...]}).
+"""
+import json
+import logging
+import os
+from typing import Any, Optional
+
+from graphql import GraphQLSchema
+
+from src.graphql_documents import DocumentCache, digest, graphql_documents
+
+logger = logging.getLogger(__name__)
+
+
+class PersistedQueryError(Exception):
+    def __init__(self, message: str, code: str):
+        self.message = message
+        self.code = code
+        super().__init__(message)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {'message': self.message, 'extensions': {'code': self.code}}
+
+
+class PersistedQueries:
+    def __init__(self, documents: DocumentCache, allow_list: bool = False):
+        self.documents = documents
+        self.allow_list = allow_list
+        self.hits = 0
+        self.misses = 0
+        self.registered = 0
+
+    def stats(self) -> dict[str, Any]:
+        return dict(allow_list=self.allow_list, hits=self.hits, misses=self.misses, registered=self.registered)
+
+    def load(self, path: str, schema: Optional[GraphQLSchema] = None) -> int:
+        """pin the documents of a manifest, validated against schema when given."""
+        with open(path) as f:
+            manifest = json.load(f)
+        if 'operations' in manifest:
+            manifest = {op['id']: op['body'] for op in manifest['operations']}
+
+        for sha256_hash, query in manifest.items():
+            if digest(query) != sha256_hash:
+                raise ValueError(f'persisted query {sha256_hash}: hash does not match the document')
+            self.documents.pin(query)
+            if schema is not None:
+                prepared = self.documents.validate(query, schema)
+                if prepared.errors:
+                    raise ValueError(f'persisted query {sha256_hash}: {prepared.errors[0]["message"]}')
+        logger.info(f'{len(manifest)} persisted queries loaded from {path}')
+        return len(manifest)
+
+    def resolve(self, query: Optional[str], extensions: Optional[dict[str, Any]]) -> str:
+        """the document text to execute, raise PersistedQueryError when there is none to run."""
+        persisted = (extensions or {}).get('persistedQuery')
+        if persisted is None:
+            if query is None:
+                raise PersistedQueryError('Must provide query string.', 'BAD_REQUEST')
+            if self.allow_list and not self.documents.is_pinned(digest(query)):
+                raise PersistedQueryError('Only persisted queries are allowed.', 'PERSISTED_QUERY_NOT_ALLOWED')
+            return query
+
+        if persisted.get('version') != 1:
+            raise PersistedQueryError('Unsupported persisted query version.', 'PERSISTED_QUERY_NOT_SUPPORTED')
+        sha256_hash = persisted.get('sha256Hash')
+
+        if query is None:
+            prepared = self.documents.find(sha256_hash)
+            if prepared is None or (self.allow_list and not self.documents.is_pinned(sha256_hash)):
+                self.misses += 1
+                raise PersistedQueryError('PersistedQueryNotFound', 'PERSISTED_QUERY_NOT_FOUND')
+            self.hits += 1
+            return prepared.query
+
+        if digest(query) != sha256_hash:
+            raise PersistedQueryError('provided sha does not match query', 'BAD_REQUEST')
+        if self.allow_list:
+            if not self.documents.is_pinned(sha256_hash):
+                raise PersistedQueryError('Only persisted queries are allowed.', 'PERSISTED_QUERY_NOT_ALLOWED')
+        elif self.documents.find(sha256_hash) is None:
+            self.documents.get(query)
+            self.registered += 1
+        return query
+
+
+persisted_queries = PersistedQueries(graphql_documents,
+                                     allow_list=os.getenv('GRAPHQL_PERSISTED_QUERIES', 'auto') == 'allowlist')
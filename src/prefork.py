@@ -0,0 +1,179 @@
+"""
+Pre-fork server: the app is imported and warmed once, then the workers are forked.
+
+`uvicorn --workers N` spawns N interpreters which each import every module and
+build the ER diagram, the GraphQL schema, the MCP server and the response
+models again. Here the master process:
+
+1. imports `src.main` and `preload`s what it would build on first use, without
+   I/O (the in-memory database is created by each worker's lifespan):
+   SDL and introspection, the response models of the persisted operations
+   (their execution plans are compiled on import), the analysis of the
+   response models by the resolver classes of the routes and of the GraphQL
+   executor, the Voyager and MCP apps
+2. collects, then `gc.freeze()`s the heap: those objects are never touched by
+   the collector of a worker, their pages stay shared copy-on-write
+3. binds the socket and forks the workers, restarting the ones that die
+
+    python -m src.prefork --workers 4 --host 0.0.0.0 --port 8000
+
+POSIX only (os.fork).
+"""
+import argparse
+import asyncio
+import gc
+import inspect
+import logging
+import os
+import signal
+import time
+from typing import Any, Optional, get_args
+
+import uvicorn
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+from pydantic_resolve import Resolver
+from pydantic_resolve.utils.class_util import safe_issubclass
+
+logger = logging.getLogger(__name__)
+
+
+def _models(annotation: Any) -> list[type]:
+    if safe_issubclass(annotation, BaseModel):
+        return [annotation]
+    return [m for arg in get_args(annotation) for m in _models(arg)]
+
+
+def _resolver_classes(endpoint) -> set[type]:
+    """Resolver classes an endpoint instantiates, by the global names its code uses."""
+    endpoint = inspect.unwrap(endpoint)
+    code = getattr(endpoint, '__code__', None)
+    if code is None:
+        return set()
+    return {kls for name in code.co_names
+            if safe_issubclass(kls := endpoint.__globals__.get(name), Resolver)}
+
+
+def _executor_resolver_classes(executor) -> set[type]:
+    """resolver classes of a GraphQL executor and of the executors it wraps."""
+    classes = set()
+    while executor is not None:
+        classes.add(executor.resolver_class)
+        executor = getattr(executor, 'executor', None)
+    return classes
+
+
+async def _analyze(resolver_class: type, root_class: type) -> Optional[str]:
+    """the analysis resolver_class runs on the first resolve of root_class, on nothing to traverse;
+    the error when the analysis itself fails."""
+    resolver = resolver_class(annotation=root_class, context={})
+    try:
+        await resolver.resolve(())
+    except Exception as e:
+        if not resolver.metadata:  # a broken model, its first request fails in every worker
+            logger.warning(f'preload of {resolver_class.__name__}({root_class.__name__}) failed: {e!r}')
+            return f'{resolver_class.__name__}({root_class.__name__}): {e!r}'
+        # else analyzed and cached, then what a request gives was missing: loader params, context
+    return None
+
+
+def preload(main) -> dict[str, Any]:
+    """build what src.main would build on first use, nothing doing I/O."""
+    stats = dict(response_models=0, resolver_metadata=0, mounts=0, failed=[])
+    main.schema_cache.current()
+    analyses: set[tuple[type, type]] = set()
+
+    handler = main.graphql_handler
+    graphql_resolvers = _executor_resolver_classes(handler.executor)
+    for prepared in main.graphql_documents.pinned():
+        for node in prepared.document.definitions:
+            if getattr(node, 'operation', None) is None:
+                continue
+            name = node.name.value if node.name else None
+            parsed = prepared.parsed.get(name)
+            if parsed is None:
+                parsed = prepared.parsed[name] = handler.parser.parse_operation(prepared.document, node)
+            for root, selection in parsed.field_tree.items():
+                entity, _ = {**handler.query_map, **handler.mutation_map}.get(root, (None, None))
+                if entity is not None:
+                    model = handler.executor.builder.build_response_model(entity, selection)
+                    analyses.update((kls, model) for kls in graphql_resolvers)
+                    stats['response_models'] += 1
+
+    for route in main.app.routes:
+        if isinstance(route, APIRoute) and route.response_model is not None:
+            for kls in _resolver_classes(route.endpoint):
+                analyses.update((kls, model) for model in _models(route.response_model))
+
+    loop = asyncio.new_event_loop()  # not set as the current one, preload may run next to another loop
+    try:
+        for resolver_class, model in analyses:
+            error = loop.run_until_complete(_analyze(resolver_class, model))
+            if error is not None:
+                stats['failed'].append(error)
+    finally:
+        loop.close()
+    stats['resolver_metadata'] = len(analyses) - len(stats['failed'])
+
+    for mount in (main.voyager_mount, main.mcp_mount):
+        if mount is not None:
+            mount.preload()
+            stats['mounts'] += 1
+    return stats
+
+
+def serve(host: str, port: int, workers: int, **uvicorn_options):
+    start = time.perf_counter()
+    import src.main as main
+    stats = preload(main)
+    gc.collect()
+    gc.freeze()
+    logger.warning(f'preloaded in {time.perf_counter() - start:.2f}s {stats}, {gc.get_freeze_count()} objects frozen')
+
+    config = uvicorn.Config(main.app, host=host, port=port, **uvicorn_options)
+    sock = config.bind_socket()
+    children: set[int] = set()
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:  # worker
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            try:
+                uvicorn.Server(config).run(sockets=[sock])
+            finally:
+                os._exit(0)
+        children.add(pid)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        spawn()
+    while children:
+        pid, status = os.wait()
+        children.discard(pid)
+        if not stopping:
+            logger.warning(f'worker {pid} exited ({status}), restarting')
+            spawn()
+    sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-fork server of src.main:app")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers, log_level=args.log_level)
+
+
+if __name__ == "__main__":
+    main()
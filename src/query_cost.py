@@ -0,0 +1,135 @@
+"""
+Static cost and depth of GraphQL operations, computed before they execute.
+
+The ER diagram allows arbitrarily deep and wide queries (teams → sprints →
+stories → tasks → owner), one of them can hold the event loop for everyone.
+`CostAnalyzer` estimates how many objects an operation resolves:
+
+- a relationship whose target is a list (eg: `Team.sprints`) multiplies what
+  it selects by `list_size` (10 by default, per field in `list_sizes`), a
+  single target (eg: `Task.owner`) by 1, root queries by their return type
+- every object costs its field weight (1 by default, per field in `weights`,
+  eg: {"Task.owner": 2}); scalar fields cost nothing unless weighted
+
+Operations over `max_cost` or `max_depth` are rejected, and so are batches
+whose operations together cost more than `max_cost`; operations of
+`throttle_cost` or more run at most `throttle_concurrency` at a time. The
+estimate is reported in the `extensions.cost` of the response.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Optional, get_origin
+
+from graphql import GraphQLObjectType, GraphQLSchema, get_named_type, get_nullable_type, is_list_type
+from graphql.language.ast import (DocumentNode, FieldNode, FragmentDefinitionNode, FragmentSpreadNode,
+                                  InlineFragmentNode, OperationDefinitionNode, SelectionSetNode)
+from pydantic_resolve.utils.er_diagram import ErDiagram
+
+
+@dataclass(frozen=True)
+class Cost:
+    cost: int
+    depth: int
+
+    def as_dict(self, analyzer: 'CostAnalyzer') -> dict[str, Any]:
+        return dict(estimated=self.cost, depth=self.depth, max_cost=analyzer.max_cost, max_depth=analyzer.max_depth)
+
+
+def _fields(selection_set: SelectionSetNode, fragments: dict[str, FragmentDefinitionNode]) -> list[FieldNode]:
+    fields = []
+    for selection in selection_set.selections:
+        if isinstance(selection, FieldNode):
+            fields.append(selection)
+        elif isinstance(selection, FragmentSpreadNode):
+            fields.extend(_fields(fragments[selection.name.value].selection_set, fragments))
+        elif isinstance(selection, InlineFragmentNode):
+            fields.extend(_fields(selection.selection_set, fragments))
+    return fields
+
+
+class CostAnalyzer:
+    def __init__(self, diagram: ErDiagram, schema: GraphQLSchema, *, list_size: int = 10,
+                 list_sizes: Optional[dict[str, int]] = None, weights: Optional[dict[str, float]] = None,
+                 max_cost: Optional[int] = None, max_depth: Optional[int] = None,
+                 throttle_cost: Optional[int] = None, throttle_concurrency: int = 2):
+        self.schema = schema
+        self.list_size = list_size
+        self.list_sizes = list_sizes or {}
+        self.weights = weights or {}
+        self.max_cost = max_cost
+        self.max_depth = max_depth
+        self.throttle_cost = throttle_cost
+        self._throttle = asyncio.Semaphore(throttle_concurrency)
+        self.rejected = 0
+        self.throttled = 0
+
+        # (type, relationship) -> whether it loads a list
+        self.many = {(cfg.kls.__name__, rel.name): get_origin(rel.target) is list or rel.load_many
+                     for cfg in diagram.configs for rel in cfg.relationships}
+
+    def stats(self) -> dict[str, int]:
+        return dict(rejected=self.rejected, throttled=self.throttled)
+
+    def analyze(self, document: DocumentNode, operation: OperationDefinitionNode) -> Cost:
+        fragments = {d.name.value: d for d in document.definitions if isinstance(d, FragmentDefinitionNode)}
+        root_type = self.schema.get_root_type(operation.operation)
+        cost, depth = self._selection(operation.selection_set, root_type, fragments, 1, 0)
+        return Cost(cost=round(cost), depth=depth)
+
+    def _selection(self, selection_set: SelectionSetNode, parent_type: GraphQLObjectType,
+                   fragments: dict[str, FragmentDefinitionNode], multiplier: float, depth: int) -> tuple[float, int]:
+        total, deepest = 0.0, depth
+        for field_node in _fields(selection_set, fragments):
+            name = field_node.name.value
+            field_def = parent_type.fields.get(name)
+            if field_def is None:  # __typename and introspection
+                continue
+
+            key = f'{parent_type.name}.{name}'
+            if field_node.selection_set is None:
+                total += multiplier * self.weights.get(key, 0)
+                continue
+
+            count = multiplier * (self.list_sizes.get(key, self.list_size)
+                                  if self._is_many(parent_type.name, name, field_def.type) else 1)
+            cost, child_depth = self._selection(field_node.selection_set, get_named_type(field_def.type),
+                                                fragments, count, depth + 1)
+            total += count * self.weights.get(key, 1) + cost
+            deepest = max(deepest, child_depth)
+        return total, deepest
+
+    def _is_many(self, type_name: str, field: str, field_type) -> bool:
+        many = self.many.get((type_name, field))
+        if many is None:  # root queries, fields outside of the diagram
+            return is_list_type(get_nullable_type(field_type))
+        return many
+
+    def check(self, cost: Cost) -> Optional[dict[str, Any]]:
+        """the error rejecting an operation over budget, None when it may run."""
+        if self.max_depth is not None and cost.depth > self.max_depth:
+            message = f'Query depth {cost.depth} exceeds the maximum depth of {self.max_depth}.'
+        elif self.max_cost is not None and cost.cost > self.max_cost:
+            message = f'Query cost {cost.cost} exceeds the maximum cost of {self.max_cost}.'
+        else:
+            return None
+        self.rejected += 1
+        return {'message': message, 'extensions': {'code': 'QUERY_TOO_EXPENSIVE'}}
+
+    def check_batch(self, costs: list[Cost]) -> Optional[dict[str, Any]]:
+        """the error rejecting a batch whose operations together are over budget, None when it may run."""
+        total = sum(cost.cost for cost in costs)
+        if self.max_cost is None or total <= self.max_cost:
+            return None
+        self.rejected += 1
+        return {'message': f'Batch cost {total} exceeds the maximum cost of {self.max_cost}.',
+                'extensions': {'code': 'QUERY_TOO_EXPENSIVE'}}
+
+    @asynccontextmanager
+    async def throttle(self, cost: Cost) -> AsyncIterator[None]:
+        if self.throttle_cost is None or cost.cost < self.throttle_cost:
+            yield
+            return
+        self.throttled += 1
+        async with self._throttle:
+            yield
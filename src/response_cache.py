@@ -0,0 +1,497 @@
+"""
+Full-response cache for read endpoints.
+
+Entries hold the serialized response bytes, keyed by route + params for REST
+routes or by normalized document + variables for GraphQL.
+
+While a response is computed, every ORM row loaded (by the route itself or by
+any loader the Resolver runs) is recorded as a dependency, and so is every
+table that was scanned without a key filter. Mutations report their writes
+through `src.changes`, and entries built from those rows/tables are evicted.
+
+Endpoints can opt into stale-while-revalidate with a `CachePolicy`: once an
+entry is older than `soft_ttl`, or was invalidated less than `max_stale`
+seconds ago, the last response is served immediately and at most one
+background recomputation per key refreshes it. Entries older than `hard_ttl`
+are never served.
+
+REST usage:
+
+    route = APIRouter(prefix="/sample_1", route_class=CachedRoute)
+
+    @route.get('/teams-with-detail', response_model=List[Sample1TeamDetail])
+    @response_cache.cached
+    async def get_teams_with_detail(...): ...
+
+    @route.get('/page-info/{team_id}', response_model=Sample5Root)
+    @response_cache.cached(soft_ttl=10, hard_ttl=300, max_stale=30)
+    async def get_page_info(team_id: int): ...
+"""
+import asyncio
+import functools
+import json
+import logging
+import os
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Hashable, Iterator, Optional
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.routing import APIRoute
+from pydantic import TypeAdapter
+from graphql.language.ast import OperationType
+from sqlalchemy import Column, event, inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import visitors
+from sqlalchemy.sql.util import find_tables
+
+import src.changes as changes
+from src.etag import compute_etag, if_none_match, response_tables
+from src.formats import DEFAULT as DEFAULT_REPRESENTATION, JSON_MEDIA_TYPE, Representation, negotiate
+from src.graphql_documents import graphql_documents
+from src.model import Base
+from src.normalize import normalize_models
+
+logger = logging.getLogger(__name__)
+
+ANY_ROW = None  # dependency on a whole table, eg: `select * from user`
+
+
+@dataclass(eq=False)
+class Dependencies:
+    """rows and tables a response was built from, collected while it is computed."""
+    rows: set[tuple[str, Any]] = field(default_factory=set)
+    changed: bool = False  # one of the rows changed before the response was stored
+    parent: Optional['Dependencies'] = None  # the response this part (eg: a GraphQL field) belongs to
+
+    def add(self, row: tuple[str, Any]) -> None:
+        dependencies = self
+        while dependencies is not None:
+            dependencies.rows.add(row)
+            dependencies = dependencies.parent
+
+    def touches(self, table: str, ids: tuple) -> bool:
+        if not ids or (table, ANY_ROW) in self.rows:
+            return any(t == table for t, _ in self.rows)
+        return any((table, row_id) in self.rows for row_id in ids)
+
+
+@dataclass(frozen=True)
+class CachePolicy:
+    """
+    soft_ttl: seconds after which a hit also triggers a background refresh
+    hard_ttl: seconds after which the entry is never served
+    max_stale: seconds an entry invalidated by a mutation may still be served while it refreshes,
+        0 evicts it immediately
+    """
+    soft_ttl: Optional[float] = None
+    hard_ttl: Optional[float] = None
+    max_stale: float = 0
+
+
+DEFAULT_POLICY = CachePolicy()
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    media_type: str
+    dependencies: frozenset[tuple[str, Any]] = frozenset()
+    policy: CachePolicy = DEFAULT_POLICY
+    created_at: float = field(default_factory=time.monotonic)
+    invalidated_at: Optional[float] = None
+
+    def age(self, now: float) -> float:
+        return now - self.created_at
+
+    def is_expired(self, now: float) -> bool:
+        if self.policy.hard_ttl is not None and self.age(now) > self.policy.hard_ttl:
+            return True
+        return self.invalidated_at is not None and now - self.invalidated_at > self.policy.max_stale
+
+    def is_stale(self, now: float) -> bool:
+        if self.invalidated_at is not None:
+            return True
+        return self.policy.soft_ttl is not None and self.age(now) > self.policy.soft_ttl
+
+
+_recording: ContextVar[Optional[Dependencies]] = ContextVar('response_cache_recording', default=None)
+
+
+def _is_key_column(column: Column) -> bool:
+    return column.primary_key or column.name.endswith('_id')
+
+
+def scanned_tables(statement) -> set[str]:
+    """
+    tables whose result set depends on rows we won't see as loaded instances:
+    - no where clause: the whole table is read
+    - filtered by a non key column (eg: User.level == 'senior'): a row may join the result later
+    """
+    whereclause = statement.whereclause
+    if whereclause is None:
+        return {t.name for f in statement.get_final_froms() for t in find_tables(f, include_joins=True)}
+    return {
+        c.table.name for c in visitors.iterate(whereclause)
+        if isinstance(c, Column) and not _is_key_column(c)}
+
+
+@event.listens_for(Base, 'load', propagate=True)
+def _record_loaded_row(instance, context):
+    dependencies = _recording.get()
+    if dependencies is not None:
+        state = inspect(instance)
+        dependencies.add((state.mapper.local_table.name, state.identity[0]))
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _record_scanned_tables(orm_execute_state):
+    dependencies = _recording.get()
+    if dependencies is not None and orm_execute_state.is_select:
+        for table in scanned_tables(orm_execute_state.statement):
+            dependencies.add((table, ANY_ROW))
+
+
+class ResponseCache:
+    """LRU of serialized responses, bounded by entry count and total body bytes."""
+
+    def __init__(self, max_entries: int = 512, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._entries: OrderedDict[Hashable, CachedResponse] = OrderedDict()
+        self._index: dict[str, dict[Any, set[Hashable]]] = defaultdict(lambda: defaultdict(set))
+        self._size = 0
+        self._tracking: set[Dependencies] = set()  # responses being computed right now
+        self._refreshing: dict[Hashable, asyncio.Task] = {}
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.refreshes = 0
+
+        changes.subscribe(self.invalidate)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict[str, int]:
+        return dict(entries=len(self._entries), bytes=self._size,
+                    hits=self.hits, stale_hits=self.stale_hits, misses=self.misses,
+                    evictions=self.evictions, refreshes=self.refreshes)
+
+    @contextmanager
+    def track(self) -> Iterator[Dependencies]:
+        """
+        record dependencies of the response computed inside the block.
+        a nested block records into the enclosing one: responses computed together
+        (eg: a batch of GraphQL operations sharing loaders) depend on every row loaded.
+        """
+        outer = _recording.get()
+        if outer is not None:
+            yield outer
+            return
+
+        dependencies = Dependencies()
+        token = _recording.set(dependencies)
+        self._tracking.add(dependencies)
+        try:
+            yield dependencies
+        finally:
+            _recording.reset(token)
+            self._tracking.discard(dependencies)
+
+    @contextmanager
+    def track_part(self) -> Iterator[Dependencies]:
+        """
+        record dependencies of a part of a response (eg: the subtree of a GraphQL field)
+        into their own set, the enclosing block records them as well.
+        """
+        dependencies = Dependencies(parent=_recording.get())
+        token = _recording.set(dependencies)
+        self._tracking.add(dependencies)
+        try:
+            yield dependencies
+        finally:
+            _recording.reset(token)
+            self._tracking.discard(dependencies)
+
+    @staticmethod
+    def record(entry: CachedResponse) -> None:
+        """a cached part served in the response computed right now: depend on what it was built from."""
+        dependencies = _recording.get()
+        if dependencies is not None:
+            for row in entry.dependencies:
+                dependencies.add(row)
+
+    def get(self, key: Hashable) -> Optional[CachedResponse]:
+        """servable entry for key, check `is_stale` to decide whether to `revalidate` it."""
+        entry = self._entries.get(key)
+        if entry is not None and entry.is_expired(time.monotonic()):
+            self._discard(key)
+            entry = None
+
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def is_stale(self, entry: CachedResponse) -> bool:
+        stale = entry.is_stale(time.monotonic())
+        if stale:
+            self.stale_hits += 1
+        return stale
+
+    def revalidate(self, key: Hashable, refresh: Callable[[], Awaitable[Any]]) -> None:
+        """run refresh() in background, at most one at a time per key."""
+        if key in self._refreshing:
+            return
+
+        async def run():
+            try:
+                await refresh()
+                self.refreshes += 1
+            except Exception:
+                logger.exception('background refresh of %s failed', key)
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.create_task(run())
+
+    def put(self, key: Hashable, body: bytes, media_type: str, dependencies: Dependencies,
+            policy: CachePolicy = DEFAULT_POLICY) -> bool:
+        """store a response, skipped if a row it was built from changed meanwhile or it can't fit."""
+        if dependencies.changed or len(body) > self.max_bytes:
+            return False
+
+        self._discard(key)
+        entry = CachedResponse(body=body, media_type=media_type,
+                               dependencies=frozenset(dependencies.rows), policy=policy)
+        self._entries[key] = entry
+        self._size += len(body)
+        for table, row_id in entry.dependencies:
+            self._index[table][row_id].add(key)
+
+        while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._discard(oldest)
+            self.evictions += 1
+        return True
+
+    def invalidate(self, table: str, ids: tuple = ()) -> None:
+        for dependencies in self._tracking:
+            if dependencies.touches(table, ids):
+                dependencies.changed = True
+
+        by_row = self._index.get(table)
+        if not by_row:
+            return
+
+        if ids:
+            keys = set(by_row.get(ANY_ROW, ()))
+            for row_id in ids:
+                keys.update(by_row.get(row_id, ()))
+        else:
+            keys = set().union(*by_row.values())
+
+        now = time.monotonic()
+        for key in keys:
+            entry = self._entries[key]
+            if entry.policy.max_stale:
+                entry.invalidated_at = entry.invalidated_at or now  # served stale until refreshed
+            else:
+                self._discard(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._index.clear()
+        self._size = 0
+        for dependencies in self._tracking:
+            dependencies.changed = True
+
+    def _discard(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._size -= len(entry.body)
+        for table, row_id in entry.dependencies:
+            keys = self._index[table][row_id]
+            keys.discard(key)
+            if not keys:
+                del self._index[table][row_id]
+
+    def cached(self, endpoint: Optional[Callable] = None, *,
+               soft_ttl: Optional[float] = None,
+               hard_ttl: Optional[float] = None,
+               max_stale: float = 0) -> Callable:
+        """
+        opt a GET endpoint into this cache, its router must use `CachedRoute`.
+        used either bare (`@response_cache.cached`) or with a stale-while-revalidate policy.
+        """
+        policy = CachePolicy(soft_ttl=soft_ttl, hard_ttl=hard_ttl, max_stale=max_stale)
+
+        def mark(endpoint: Callable) -> Callable:
+            endpoint.__response_cache__ = (self, policy)
+            return endpoint
+
+        return mark(endpoint) if endpoint is not None else mark
+
+
+class CachedRoute(APIRoute):
+    """
+    APIRoute adding HTTP caching to GET endpoints:
+    - a weak ETag from the versions of the tables the response model touches,
+      `304 Not Modified` is answered before the endpoint (and any query) runs
+    - endpoints marked by `ResponseCache.cached` are served from that cache
+    - endpoints marked by `RequestCoalescer.coalesced` share one handler run
+      between identical concurrent requests (on a cache miss, when cached)
+    - async endpoints are serialized in one pass by pydantic-core, in the negotiated
+      representation (normalized and/or MessagePack, see src.formats)
+    """
+
+    def get_route_handler(self) -> Callable:
+        cache, policy = getattr(self.endpoint, '__response_cache__', (None, DEFAULT_POLICY))
+        coalescer, vary = getattr(self.endpoint, '__coalesce__', (None, ()))
+        if 'GET' in self.methods and self.response_model is not None \
+                and asyncio.iscoroutinefunction(self.dependant.call) \
+                and self.response_class in (JSONResponse, DefaultPlaceholder(JSONResponse)):
+            self.dependant.call = _serialized(self.dependant.call, self)
+
+        handler = super().get_route_handler()
+        if cache is None and coalescer is None and ('GET' not in self.methods or self.response_model is None):
+            return handler
+
+        def coalesced(compute: Callable) -> Callable:
+            if coalescer is None:
+                return compute
+
+            async def run(request: Request) -> Response:
+                key = coalescer.request_key(self.path, request, vary)
+                return await coalescer.run(key, lambda: compute(request))
+            return run
+
+        async def cached_handler(request: Request) -> Response:
+            if request.method != 'GET':
+                return await handler(request)
+
+            representation = negotiate(request)
+            token = _representation.set(representation)
+            try:
+                # resolved on first request, once every entity and ORM model is imported
+                tables = response_tables(self.response_model) if self.response_model else frozenset()
+                etag = compute_etag(tables, representation.variant) if tables else None
+                if etag and if_none_match(request.headers.get('if-none-match'), etag):
+                    return Response(status_code=304, headers={'etag': etag, 'vary': 'Accept'})
+
+                if cache is not None:
+                    response = await self._handle_with_cache(cache, policy, handler, coalesced, request,
+                                                              representation)
+                else:
+                    response = await coalesced(handler)(request)
+            finally:
+                _representation.reset(token)
+
+            response.headers['vary'] = 'Accept'
+            # a body invalidated by a mutation must not be tagged with the current versions
+            if etag and response.status_code == 200 and response.headers.get('x-cache') != 'stale':
+                response.headers['etag'] = etag
+            return response
+
+        return cached_handler
+
+    async def _handle_with_cache(self, cache: ResponseCache, policy: CachePolicy, handler: Callable,
+                                 coalesced: Callable, request: Request,
+                                 representation: Representation) -> Response:
+        key = (self.path,
+               tuple(sorted(request.path_params.items())),
+               tuple(sorted(request.query_params.multi_items())),
+               representation.variant)
+
+        async def compute(request: Request) -> Response:
+            with cache.track() as dependencies:
+                response = await handler(request)
+            if response.status_code == 200 and hasattr(response, 'body'):
+                cache.put(key, response.body, response.media_type, dependencies, policy)
+            return response
+
+        entry = cache.get(key)
+        if entry is None:
+            # coalesced as a whole: only the request that ran the handler stores what it recorded
+            response = await coalesced(compute)(request)
+            response.headers['x-cache'] = 'miss'
+            return response
+
+        if cache.is_stale(entry):
+            # replay on a copy of the scope, the original request is finished by then
+            cache.revalidate(key, lambda: compute(Request(dict(request.scope), receive=_no_body)))
+            status = 'stale' if entry.invalidated_at is not None else 'hit'
+        else:
+            status = 'hit'
+        return Response(entry.body, media_type=entry.media_type, headers={'x-cache': status})
+
+
+_representation: ContextVar[Representation] = ContextVar('representation', default=DEFAULT_REPRESENTATION)
+
+
+def _serialized(endpoint: Callable, route: APIRoute) -> Callable:
+    """
+    wrap an endpoint to serialize its result in one pass by pydantic-core, in the negotiated format.
+    FastAPI would dump the result to python, validate it again and encode it with `json`,
+    which costs about twice as much on large trees (repeated owners included).
+    """
+    options = dict(include=route.response_model_include,
+                   exclude=route.response_model_exclude,
+                   by_alias=route.response_model_by_alias,
+                   exclude_unset=route.response_model_exclude_unset,
+                   exclude_defaults=route.response_model_exclude_defaults,
+                   exclude_none=route.response_model_exclude_none)
+    status_code = route.status_code or 200
+
+    @functools.wraps(endpoint)
+    async def call(**values):
+        result = await endpoint(**values)
+        if isinstance(result, Response):
+            return result
+        adapter = _adapter(route.response_model)
+        value = adapter.validate_python(result, from_attributes=True)
+        representation = _representation.get()
+        if representation == DEFAULT_REPRESENTATION:
+            return Response(adapter.dump_json(value, **options), status_code=status_code, media_type=JSON_MEDIA_TYPE)
+
+        # msgpack is encoded from the same json-mode dump, exclusions included
+        data = adapter.dump_python(value, mode='json', **options)
+        if representation.normalized:
+            data = normalize_models(value, data)
+        return Response(representation.encode(data), status_code=status_code, media_type=representation.media_type)
+    return call
+
+
+@functools.lru_cache
+def _adapter(response_model: Any) -> TypeAdapter:
+    return TypeAdapter(response_model)
+
+
+async def _no_body():
+    return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+
+def graphql_cache_key(query: str, variables: Optional[dict], operation_name: Optional[str]) -> Optional[tuple]:
+    """normalized document + variables, None for operations which must not be cached (mutations, syntax errors)."""
+    prepared = graphql_documents.get(query)
+    operation = prepared.operation(operation_name)
+    if operation is None or operation.operation != OperationType.QUERY:
+        return None
+    return ('graphql', prepared.normalized, json.dumps(variables or {}, sort_keys=True), operation_name)
+
+
+response_cache = ResponseCache(
+    max_entries=int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '512')),
+    max_bytes=int(os.getenv('RESPONSE_CACHE_MAX_BYTES', str(64 * 1024 * 1024))))
@@ -4,6 +4,7 @@ from typing import List
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import  Depends
 from pydantic_resolve import Resolver
+from src.response_cache import CachedRoute
 import src.db as db
 
 import src.services.story.query as sq
@@ -17,7 +18,7 @@ class Payload(BaseModel):
     message: str = '123'
     name: str
 
-route = APIRouter(tags=['demo'], prefix="/demo")
+route = APIRouter(tags=['demo'], prefix="/demo", route_class=CachedRoute)
 
 @route.post('/stories', response_model=List[Story0])
 async def get_stories_with_detail(payload: Payload):
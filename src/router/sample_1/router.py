@@ -3,6 +3,9 @@ from typing import List
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import  Depends
 from pydantic_resolve import Resolver
+from src.coalesce import request_coalescer
+from src.identity_map import IdentityMapResolver
+from src.response_cache import CachedRoute, response_cache
 import src.db as db
 
 import src.services.task.schema as ts
@@ -21,53 +24,62 @@ from .schema import (
     Sample1TeamDetail,
     Sample1TeamDetail2)
 
-route = APIRouter(tags=['sample_1'], prefix="/sample_1")
+route = APIRouter(tags=['sample_1'], prefix="/sample_1", route_class=CachedRoute)
 
 @route.get('/users', response_model=List[us.User])
+@response_cache.cached
 async def get_users(session: AsyncSession = Depends(db.get_session)):
     """ 1.1 return list of user """
     return await uq.get_users(session)
 
 
 @route.get('/tasks', response_model=List[ts.Task])
+@response_cache.cached
 async def get_tasks(session: AsyncSession = Depends(db.get_session)):
     """ 1.2 return list of tasks """
     return await tq.get_tasks(session)
 
 
 @route.get('/tasks-with-detail', response_model=List[Sample1TaskDetail])
+@response_cache.cached
 async def get_tasks_with_detail(session: AsyncSession = Depends(db.get_session)):
     """ 1.3 return list of tasks(user) """
     tasks = await tq.get_tasks(session)
     tasks = [Sample1TaskDetail.model_validate(t) for t in tasks]
-    tasks = await Resolver().resolve(tasks)
+    tasks = await IdentityMapResolver().resolve(tasks)
     return tasks
 
 
 @route.get('/stories-with-detail', response_model=List[Sample1StoryDetail])
+@response_cache.cached
+@request_coalescer.coalesced
 async def get_stories_with_detail(session: AsyncSession = Depends(db.get_session)):
     """ 1.4 return list of story(task(user)) """
     stories = await sq.get_stories(session)
     stories = [Sample1StoryDetail.model_validate(t) for t in stories]
-    stories = await Resolver().resolve(stories)
+    stories = await IdentityMapResolver().resolve(stories)
     return stories
 
 
 @route.get('/sprints-with-detail', response_model=List[Sample1SprintDetail])
+@response_cache.cached
+@request_coalescer.coalesced
 async def get_sprints_with_detail(session: AsyncSession = Depends(db.get_session)):
     """ 1.5 return list of sprint(story(task(user))) """
     sprints = await spq.get_sprints(session)
     sprints = [Sample1SprintDetail.model_validate(t) for t in sprints]
-    sprints = await Resolver().resolve(sprints)
+    sprints = await IdentityMapResolver().resolve(sprints)
     return sprints
 
 
 @route.get('/teams-with-detail', response_model=List[Sample1TeamDetail])
+@response_cache.cached
+@request_coalescer.coalesced
 async def get_teams_with_detail(session: AsyncSession = Depends(db.get_session)):
     """ 1.6 return list of team(sprint(story(task(user)))) """
     teams = await tmq.get_teams(session)
     teams = [Sample1TeamDetail.model_validate(t) for t in teams]
-    teams = await Resolver().resolve(teams)
+    teams = await IdentityMapResolver().resolve(teams)
     return teams
 
 
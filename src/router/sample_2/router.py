@@ -3,12 +3,13 @@ from typing import List
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import  Depends
 from pydantic_resolve import Resolver
+from src.response_cache import CachedRoute
 import src.db as db
 from .schema import Sample2TeamDetail, Sample2TeamDetailMultipleLevel, SeniorMemberLoader, JuniorMemberLoader
 import src.services.team.query as tmq
 import src.services.user.loader as ul
 
-route = APIRouter(tags=['sample_2'], prefix="/sample_2")
+route = APIRouter(tags=['sample_2'], prefix="/sample_2", route_class=CachedRoute)
 
 @route.get('/teams-with-detail', response_model=List[Sample2TeamDetail])
 async def get_teams_with_detail(session: AsyncSession = Depends(db.get_session)):
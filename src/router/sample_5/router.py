@@ -1,10 +1,14 @@
 from fastapi import APIRouter
 from pydantic_resolve import Resolver
+from src.coalesce import request_coalescer
+from src.response_cache import CachedRoute, response_cache
 from .schema import Sample5Root
 
-route = APIRouter(tags=['sample_5'], prefix="/sample_5")
+route = APIRouter(tags=['sample_5'], prefix="/sample_5", route_class=CachedRoute)
 
 @route.get('/page-info/{team_id}', response_model=Sample5Root)
+@response_cache.cached(soft_ttl=10, hard_ttl=300, max_stale=30)
+@request_coalescer.coalesced
 async def get_page_info(team_id: int):
     page = Sample5Root(summary="hello world")
     page = await Resolver(context={'team_id': team_id}).resolve(page)
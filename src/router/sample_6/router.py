@@ -1,10 +1,14 @@
 from fastapi import APIRouter
 from pydantic_resolve import Resolver
+from src.coalesce import request_coalescer
+from src.response_cache import CachedRoute, response_cache
 from .schema import Sample6Root
 
-route = APIRouter(tags=['sample_6'], prefix="/sample_6")
+route = APIRouter(tags=['sample_6'], prefix="/sample_6", route_class=CachedRoute)
 
 @route.get('/page-info', response_model=Sample6Root)
+@response_cache.cached(soft_ttl=10, hard_ttl=300, max_stale=30)
+@request_coalescer.coalesced
 async def get_page_info_6():
     page = Sample6Root(summary="hello world")
     page = await Resolver().resolve(page)
@@ -3,6 +3,7 @@ from fastapi import APIRouter
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import  Depends
 from pydantic_resolve import Resolver
+from src.response_cache import CachedRoute
 import src.db as db
 import src.services.user.query as uq
 import src.services.story.query as sq
@@ -16,7 +17,7 @@ from .schema import (
     Sample7TeamDetail,
     Sample7TaskDetail)
 
-route = APIRouter(tags=['sample_7'], prefix="/sample_7")
+route = APIRouter(tags=['sample_7'], prefix="/sample_7", route_class=CachedRoute)
 
 def add_to_loader(loader, items, get_key):
     _map = defaultdict(list)
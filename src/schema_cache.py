@@ -0,0 +1,125 @@
+"""
+SDL and introspection of the GraphQL schema, computed once per ER diagram.
+
+`/schema` rebuilt the SDL from the diagram on every request, and introspection
+queries (GraphiQL, codegen tools) regenerated the whole `__schema` each time.
+`SchemaCache` builds, from `BaseEntity.get_diagram()`:
+- the SDL (with the `@defer` / `@stream` directives the server accepts)
+- the result of the standard introspection query, and of any other
+  introspection document on first use (selections, aliases, `__type(name:)`)
+
+Each one is encoded once and served with a strong ETag (a digest of its
+content, so it is the same in every worker and across restarts) and answered
+with `304 Not Modified` when it matches. Everything is rebuilt when the
+entities registered on the diagram change.
+"""
+import hashlib
+import json
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from graphql import GraphQLSchema, build_schema, get_introspection_query, validate
+from graphql.execution import ExecutionResult, experimental_execute_incrementally
+from graphql.language.ast import FieldNode, OperationDefinitionNode
+from pydantic_resolve.graphql import SchemaBuilder
+from starlette.requests import Request
+from starlette.responses import Response
+
+from src.etag import if_none_match
+from src.formats import Representation
+from src.graphql_documents import digest, graphql_documents
+from src.incremental import DIRECTIVES
+from src.services.er_diagram import BaseEntity
+
+INTROSPECTION_QUERY = get_introspection_query(descriptions=True)
+
+
+@dataclass
+class Encoded:
+    """a result encoded once per representation."""
+    data: Any
+    bodies: dict[str, bytes] = field(default_factory=dict)  # by representation variant
+
+    def body(self, representation: Representation) -> bytes:
+        body = self.bodies.get(representation.variant)
+        if body is None:
+            body = self.bodies[representation.variant] = representation.encode(self.data)
+        return body
+
+    def response(self, request: Request, representation: Representation) -> Response:
+        representation = Representation(binary=representation.binary)  # nothing to normalize
+        return cached_response(request, self.body(representation), representation.media_type, vary='Accept')
+
+
+def cached_response(request: Request, body: bytes, media_type: str, vary: Optional[str] = None) -> Response:
+    """body with a strong ETag of its content, 304 when the client has it."""
+    headers = {'etag': f'"{hashlib.sha1(body).hexdigest()[:16]}"'}
+    if vary:
+        headers['vary'] = vary
+    if if_none_match(request.headers.get('if-none-match'), headers['etag']):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type=media_type, headers=headers)
+
+
+class SchemaArtifacts:
+    def __init__(self, sdl: str, max_entries: int = 64):
+        self.sdl = sdl.encode()
+        self.schema: GraphQLSchema = build_schema(sdl)
+        self.max_entries = max_entries
+        self._introspections: OrderedDict[tuple, Encoded] = OrderedDict()
+        self.introspect(INTROSPECTION_QUERY)
+
+    def introspect(self, query: str, variables: Optional[dict[str, Any]] = None,
+                   operation_name: Optional[str] = None) -> Encoded:
+        key = (digest(query), json.dumps(variables or {}, sort_keys=True), operation_name)
+        encoded = self._introspections.get(key)
+        if encoded is not None:
+            self._introspections.move_to_end(key)
+            return encoded
+
+        document = graphql_documents.get(query).document
+        errors = validate(self.schema, document)
+        if errors:
+            result = ExecutionResult(None, errors)
+        else:  # the schema declares @defer / @stream, which only the incremental executor accepts
+            result = experimental_execute_incrementally(self.schema, document, variable_values=variables,
+                                                        operation_name=operation_name)
+        encoded = self._introspections[key] = Encoded(result.formatted)
+        while len(self._introspections) > self.max_entries:
+            self._introspections.popitem(last=False)
+        return encoded
+
+
+class SchemaCache:
+    def __init__(self, base_entity):
+        self.base_entity = base_entity
+        self.builds = 0
+        self._entities: Optional[tuple] = None
+        self._artifacts: Optional[SchemaArtifacts] = None
+
+    def stats(self) -> dict[str, Any]:
+        return dict(builds=self.builds, introspections=len(self.current()._introspections))
+
+    def current(self) -> SchemaArtifacts:
+        """artifacts of the diagram, rebuilt when its entities changed."""
+        entities = tuple(self.base_entity.entities)
+        if entities != self._entities:
+            sdl = SchemaBuilder(self.base_entity.get_diagram()).build_schema() + DIRECTIVES
+            self._artifacts = SchemaArtifacts(sdl)
+            self._entities = entities
+            self.builds += 1
+        return self._artifacts
+
+    def is_introspection(self, query: str, operation_name: Optional[str] = None) -> bool:
+        """whether the operation selects nothing but `__schema` / `__type` / `__typename`."""
+        operation = graphql_documents.get(query).operation(operation_name)
+        return operation is not None and _introspection_only(operation)
+
+
+def _introspection_only(operation: OperationDefinitionNode) -> bool:
+    selections = operation.selection_set.selections
+    return all(isinstance(s, FieldNode) and s.name.value.startswith('__') for s in selections)
+
+
+schema_cache = SchemaCache(BaseEntity)
@@ -0,0 +1,153 @@
+"""
+Bulk loading of datasets into the database.
+
+`db.prepare()` adds the mock ORM instances one by one, fine for a dozen rows.
+`bulk_load` takes rows by table (dicts, from files or generated) and in one
+transaction:
+1. creates the missing tables and drops their secondary indexes (and with
+   `replace` deletes their rows)
+2. inserts the rows with Core `insert()` in executemany batches of
+   `batch_size`, no ORM instance is built
+3. creates the indexes again, once, over the loaded data
+
+A dataset directory holds one `<table>.ndjson` or `<table>.csv` file per table
+(`team.csv`, `task.ndjson`...), CSV values are converted to the column types.
+
+At startup `SEED_PATH` loads a dataset directory instead of the mock data, and
+from the command line (`--database` defaults to `DATABASE_URL`, in memory):
+
+    python -m src.seed data/ --database sqlite+aiosqlite:///app.db --batch-size 50000
+"""
+import argparse
+import asyncio
+import csv
+import itertools
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Mapping, Union
+
+from sqlalchemy import Table, insert
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from src.model import Base
+
+logger = logging.getLogger(__name__)
+
+SEED_PATH = os.getenv('SEED_PATH')
+SEED_BATCH_SIZE = int(os.getenv('SEED_BATCH_SIZE', '10000'))
+FORMATS = ('.ndjson', '.csv')
+
+
+@dataclass
+class LoadReport:
+    rows: dict[str, int] = field(default_factory=dict)  # by table
+    load_seconds: float = 0.0
+    index_seconds: float = 0.0
+
+    @property
+    def total(self) -> int:
+        return sum(self.rows.values())
+
+    @property
+    def rows_per_second(self) -> float:
+        seconds = self.load_seconds + self.index_seconds
+        return self.total / seconds if seconds else 0.0
+
+    def __str__(self) -> str:
+        return (f'{self.total} rows in {self.load_seconds + self.index_seconds:.2f}s '
+                f'(indexes {self.index_seconds:.2f}s), {self.rows_per_second:,.0f} rows/s {self.rows}')
+
+
+def read_ndjson(path: Path) -> Iterator[dict[str, Any]]:
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_csv(path: Path, table: Table) -> Iterator[dict[str, Any]]:
+    types = {c.name: c.type.python_type for c in table.columns}
+    with open(path, encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            yield {k: (types[k](v) if v != '' else None) for k, v in row.items()}
+
+
+def read_dataset(path: Union[str, Path]) -> dict[Table, Iterator[dict[str, Any]]]:
+    """rows by table of a dataset directory, read lazily."""
+    path = Path(path)
+    tables = Base.metadata.tables
+    dataset = {}
+    for file in sorted(path.iterdir()):
+        if file.suffix not in FORMATS:
+            continue
+        if file.stem not in tables:
+            raise ValueError(f'{file}: no table {file.stem!r}')
+        table = tables[file.stem]
+        dataset[table] = read_ndjson(file) if file.suffix == '.ndjson' else read_csv(file, table)
+    return dataset
+
+
+def _batches(rows: Iterable[dict], size: int) -> Iterator[list[dict]]:
+    rows = iter(rows)
+    while batch := list(itertools.islice(rows, size)):
+        yield batch
+
+
+async def bulk_load(engine: AsyncEngine, dataset: Mapping[Union[Table, str], Iterable[dict[str, Any]]],
+                    batch_size: int = SEED_BATCH_SIZE, replace: bool = False) -> LoadReport:
+    """insert the rows of dataset by table in one transaction, the indexes are built after."""
+    tables = [Base.metadata.tables[t] if isinstance(t, str) else t for t in dataset]
+    report = LoadReport()
+    start = time.perf_counter()
+    async with engine.begin() as conn:
+        for table in tables:
+            await conn.run_sync(lambda sync, t=table: t.create(sync, checkfirst=True))
+            if replace:
+                await conn.execute(table.delete())
+            for index in table.indexes:
+                await conn.run_sync(lambda sync, i=index: i.drop(sync, checkfirst=True))
+
+        for table, rows in zip(tables, dataset.values()):
+            report.rows[table.name] = 0
+            statement = insert(table)
+            for batch in _batches(rows, batch_size):
+                await conn.execute(statement, batch)
+                report.rows[table.name] += len(batch)
+        report.load_seconds = time.perf_counter() - start
+
+        for table in tables:
+            for index in table.indexes:
+                await conn.run_sync(lambda sync, i=index: i.create(sync))
+        report.index_seconds = time.perf_counter() - start - report.load_seconds
+    return report
+
+
+async def load_path(engine: AsyncEngine, path: Union[str, Path], batch_size: int = SEED_BATCH_SIZE) -> LoadReport:
+    report = await bulk_load(engine, read_dataset(path), batch_size)
+    logger.info(f'seeded {path}: {report}')
+    return report
+
+
+async def _main(args):
+    import src.db  # noqa: F401, imports every ORM model
+    engine = create_async_engine(args.database)
+    try:
+        print(await load_path(engine, args.path, args.batch_size))
+    finally:
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk load a dataset directory (<table>.ndjson / <table>.csv)")
+    parser.add_argument("path")
+    parser.add_argument("--database", default=os.getenv('DATABASE_URL', 'sqlite+aiosqlite://'))
+    parser.add_argument("--batch-size", type=int, default=SEED_BATCH_SIZE)
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
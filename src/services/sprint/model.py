@@ -9,4 +9,4 @@ class Sprint(db.Base):
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str]
     status: Mapped[str] = mapped_column(String(100))
-    team_id: Mapped[int]
\ No newline at end of file
+    team_id: Mapped[int] = mapped_column(index=True)
\ No newline at end of file
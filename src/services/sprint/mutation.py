@@ -3,6 +3,7 @@ from sqlalchemy import select, delete
 from typing import Optional
 from .model import Sprint
 from ..story.model import Story
+import src.changes as changes
 
 
 # Sprint 自身负责更新
@@ -23,6 +24,7 @@ async def update_sprint(
             sprint.status = status
         await session.commit()
         await session.refresh(sprint)
+        changes.notify(Sprint.__tablename__, sprint.id)
 
     return sprint
 
@@ -34,6 +36,8 @@ async def create_story(session: AsyncSession, sprint_id: int, name: str, owner_i
     session.add(story)
     await session.commit()
     await session.refresh(story)
+    changes.notify(Story.__tablename__, story.id)
+    changes.notify(Sprint.__tablename__, sprint_id)
     return story
 
 
@@ -41,4 +45,6 @@ async def delete_story(session: AsyncSession, id: int) -> bool:
     """删除 Story"""
     result = await session.execute(delete(Story).where(Story.id == id))
     await session.commit()
+    if result.rowcount:
+        changes.notify(Story.__tablename__, id)
     return result.rowcount > 0
@@ -8,4 +8,4 @@ class Story(db.Base):
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str]
     owner_id: Mapped[int]
-    sprint_id: Mapped[int]
\ No newline at end of file
+    sprint_id: Mapped[int] = mapped_column(index=True)
\ No newline at end of file
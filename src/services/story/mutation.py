@@ -3,6 +3,7 @@ from sqlalchemy import select, delete
 from typing import Optional
 from .model import Story
 from ..task.model import Task
+import src.changes as changes
 
 
 # Story 自身负责更新
@@ -23,6 +24,7 @@ async def update_story(
             story.owner_id = owner_id
         await session.commit()
         await session.refresh(story)
+        changes.notify(Story.__tablename__, story.id)
 
     return story
 
@@ -40,6 +42,8 @@ async def create_task(
     session.add(task)
     await session.commit()
     await session.refresh(task)
+    changes.notify(Task.__tablename__, task.id)
+    changes.notify(Story.__tablename__, story_id)
     return task
 
 
@@ -47,4 +51,6 @@ async def delete_task(session: AsyncSession, id: int) -> bool:
     """删除 Task"""
     result = await session.execute(delete(Task).where(Task.id == id))
     await session.commit()
+    if result.rowcount:
+        changes.notify(Task.__tablename__, id)
     return result.rowcount > 0
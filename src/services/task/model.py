@@ -8,5 +8,5 @@ class Task(db.Base):
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str]
     owner_id: Mapped[int]
-    story_id: Mapped[int]
+    story_id: Mapped[int] = mapped_column(index=True)
     estimate: Mapped[int]
\ No newline at end of file
@@ -2,6 +2,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from typing import Optional
 from .model import Task
+import src.changes as changes
 
 
 # Task 自身负责更新
@@ -25,5 +26,6 @@ async def update_task(
             task.estimate = estimate
         await session.commit()
         await session.refresh(task)
+        changes.notify(Task.__tablename__, task.id)
 
     return task
@@ -13,4 +13,4 @@ class TeamUser(db.Base):
 
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int]
-    team_id: Mapped[int]
\ No newline at end of file
+    team_id: Mapped[int] = mapped_column(index=True)
\ No newline at end of file
@@ -3,6 +3,7 @@ from sqlalchemy import select, delete
 from typing import Optional
 from .model import Team, TeamUser
 from ..sprint.model import Sprint
+import src.changes as changes
 
 
 # Team 自身的 CRUD
@@ -12,6 +13,7 @@ async def create_team(session: AsyncSession, name: str) -> Team:
     session.add(team)
     await session.commit()
     await session.refresh(team)
+    changes.notify(Team.__tablename__, team.id)
     return team
 
 
@@ -25,6 +27,7 @@ async def update_team(session: AsyncSession, id: int, name: Optional[str] = None
             team.name = name
         await session.commit()
         await session.refresh(team)
+        changes.notify(Team.__tablename__, team.id)
 
     return team
 
@@ -33,6 +36,8 @@ async def delete_team(session: AsyncSession, id: int) -> bool:
     """删除团队"""
     result = await session.execute(delete(Team).where(Team.id == id))
     await session.commit()
+    if result.rowcount:
+        changes.notify(Team.__tablename__, id)
     return result.rowcount > 0
 
 
@@ -43,6 +48,8 @@ async def create_sprint(session: AsyncSession, team_id: int, name: str, status:
     session.add(sprint)
     await session.commit()
     await session.refresh(sprint)
+    changes.notify(Sprint.__tablename__, sprint.id)
+    changes.notify(Team.__tablename__, team_id)
     return sprint
 
 
@@ -50,6 +57,8 @@ async def delete_sprint(session: AsyncSession, id: int) -> bool:
     """删除 Sprint"""
     result = await session.execute(delete(Sprint).where(Sprint.id == id))
     await session.commit()
+    if result.rowcount:
+        changes.notify(Sprint.__tablename__, id)
     return result.rowcount > 0
 
 
@@ -59,6 +68,8 @@ async def add_team_member(session: AsyncSession, team_id: int, user_id: int) ->
     team_user = TeamUser(team_id=team_id, user_id=user_id)
     session.add(team_user)
     await session.commit()
+    changes.notify(TeamUser.__tablename__, team_user.id)
+    changes.notify(Team.__tablename__, team_id)
     return True
 
 
@@ -68,4 +79,7 @@ async def remove_team_member(session: AsyncSession, team_id: int, user_id: int)
         delete(TeamUser).where(TeamUser.team_id == team_id, TeamUser.user_id == user_id)
     )
     await session.commit()
+    if result.rowcount:
+        changes.notify(TeamUser.__tablename__)
+        changes.notify(Team.__tablename__, team_id)
     return result.rowcount > 0
@@ -6,6 +6,7 @@ import src.services.sprint.loader as sprint_loader
 import src.services.user.schema as user_schema
 import src.services.user.loader as user_loader
 from src.services.er_diagram import BaseEntity
+from src.cache_hints import CacheHint
 from src.db import async_session
 from .query import get_teams as get_teams_query
 from . import mutation as team_mutation
@@ -15,6 +16,7 @@ class Team(BaseModel, BaseEntity):
         Relationship( fk='id', target=list[sprint_schema.Sprint], loader=sprint_loader.team_to_sprint_loader, name='sprints'),
         Relationship( fk='id', target=list[user_schema.User], loader=user_loader.team_to_user_loader, name='users'),
     ]
+    __cache_control__ = CacheHint(max_age=300, fields={'sprints': CacheHint(max_age=60)})
 
     id: int
     name: str
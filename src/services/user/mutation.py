@@ -2,6 +2,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, delete
 from typing import Optional
 from .model import User
+import src.changes as changes
 
 
 async def create_user(session: AsyncSession, name: str, level: str = 'user') -> User:
@@ -10,6 +11,7 @@ async def create_user(session: AsyncSession, name: str, level: str = 'user') ->
     session.add(user)
     await session.commit()
     await session.refresh(user)
+    changes.notify(User.__tablename__, user.id)
     return user
 
 
@@ -30,6 +32,7 @@ async def update_user(
             user.level = level
         await session.commit()
         await session.refresh(user)
+        changes.notify(User.__tablename__, user.id)
 
     return user
 
@@ -38,4 +41,6 @@ async def delete_user(session: AsyncSession, id: int) -> bool:
     """删除用户"""
     result = await session.execute(delete(User).where(User.id == id))
     await session.commit()
+    if result.rowcount:
+        changes.notify(User.__tablename__, id)
     return result.rowcount > 0
@@ -1,5 +1,6 @@
 from pydantic import BaseModel, ConfigDict
 from src.services.er_diagram import BaseEntity
+from src.cache_hints import CacheHint
 from pydantic_resolve import query, mutation
 from typing import Optional
 from src.db import async_session
@@ -8,6 +9,7 @@ from . import mutation as user_mutation
 
 class User(BaseModel, BaseEntity):
     __relationships__ = []
+    __cache_control__ = CacheHint(max_age=300)  # users rarely change
     id: int
     name: str
     level: str
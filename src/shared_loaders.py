@@ -0,0 +1,45 @@
+"""
+DataLoader instances shared by every Resolver run inside a block.
+
+A Resolver creates its own loaders, so two GraphQL operations of the same
+request (eg: `teamGetTeams` and `userGetUsers`, each resolving owners) fetch
+overlapping keys twice. Within `shared_loaders()`, resolvers of a class wrapped
+by `with_shared_loaders` use the first instance created for each loader, keys
+loaded by one operation are served to the others from its cache, and loads of
+concurrent operations are batched together.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional
+
+from pydantic_resolve import Resolver
+
+_loaders: ContextVar[Optional[dict[str, Any]]] = ContextVar('shared_loaders', default=None)
+
+
+@contextmanager
+def shared_loaders() -> Iterator[dict[str, Any]]:
+    loaders: dict[str, Any] = {}
+    token = _loaders.set(loaders)
+    try:
+        yield loaders
+    finally:
+        _loaders.reset(token)
+
+
+def sharing() -> bool:
+    """whether loaders are shared right now."""
+    return _loaders.get() is not None
+
+
+class SharedLoaders:
+    def _get_loader_instance(self, cache_key: str):
+        loader = super()._get_loader_instance(cache_key)
+        shared = _loaders.get()
+        if shared is not None:
+            loader = self.loader_instance_cache[cache_key] = shared.setdefault(cache_key, loader)
+        return loader
+
+
+def with_shared_loaders(resolver_class: type[Resolver]) -> type[Resolver]:
+    return type(resolver_class.__name__, (SharedLoaders, resolver_class), {})
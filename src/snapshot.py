@@ -0,0 +1,100 @@
+"""
+Snapshot of the seeded database, restored at startup instead of seeding again.
+
+Every worker start creates the schema and loads the data (mock objects, a
+dataset directory or a synthetic dataset), minutes at realistic sizes. With
+`SNAPSHOT_PATH` the first start saves the populated database to that file
+with the SQLite backup API, the next ones copy it back, page by page, into
+the database of the engine, the in-memory one included.
+
+The snapshot carries a version (`PRAGMA user_version`): a digest of the DDL of
+the ORM models and of the data source. A snapshot of other models or data is
+not restored, the database is populated and the snapshot saved again. Saving
+writes a temporary file then renames it, workers starting together never read
+a partial snapshot.
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+from contextlib import closing
+from typing import Awaitable, Callable, Iterable, Optional
+
+import aiosqlite
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from src.model import Base
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_PATH = os.getenv('SNAPSHOT_PATH')
+
+
+def version(source: str) -> int:
+    """31 bit digest of the schema of the ORM models and of the data source."""
+    dialect = sqlite.dialect()
+    ddl = []
+    for table in Base.metadata.sorted_tables:
+        ddl.append(str(CreateTable(table).compile(dialect=dialect)))
+        ddl.extend(str(CreateIndex(i).compile(dialect=dialect)) for i in sorted(table.indexes, key=lambda i: i.name))
+    digest = hashlib.sha256('\n'.join(ddl + [source]).encode()).digest()
+    return int.from_bytes(digest[:4], 'big') & 0x7fffffff
+
+
+def files_source(paths: Iterable[str]) -> str:
+    """data source of files (or of the files of directories), by name, size and modification time."""
+    files = []
+    for path in paths:
+        names = sorted(os.path.join(path, n) for n in os.listdir(path)) if os.path.isdir(path) else [path]
+        files.extend(f'{n}:{os.stat(n).st_size}:{os.stat(n).st_mtime_ns}' for n in names if os.path.isfile(n))
+    return '\n'.join(files)
+
+
+def snapshot_version(path: str) -> Optional[int]:
+    if not os.path.exists(path):
+        return None
+    with closing(sqlite3.connect(f'file:{path}?mode=ro', uri=True)) as conn:
+        return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+async def _driver(conn: AsyncConnection) -> aiosqlite.Connection:
+    return (await conn.get_raw_connection()).driver_connection
+
+
+async def save(engine: AsyncEngine, path: str, version: int):
+    """copy the database of engine to path, tagged with version."""
+    tmp = f'{path}.{os.getpid()}.tmp'
+    async with engine.connect() as conn:
+        async with aiosqlite.connect(tmp) as target:
+            await (await _driver(conn)).backup(target)
+            await target.execute(f'PRAGMA user_version = {int(version)}')
+            await target.commit()
+    os.replace(tmp, path)
+
+
+async def restore(engine: AsyncEngine, path: str, version: int) -> bool:
+    """copy the snapshot at path into the database of engine if it has version, whether it did."""
+    found = snapshot_version(path)
+    if found != version:
+        logger.info(f'snapshot {path}: version {found}, expected {version}')
+        return False
+    async with engine.connect() as conn:
+        async with aiosqlite.connect(path) as source:
+            await source.backup(await _driver(conn))
+    return True
+
+
+async def restore_or_build(engine: AsyncEngine, path: str, version: int,
+                           build: Callable[[], Awaitable[None]]) -> str:
+    """restore the snapshot, or build the database and save it; what was done."""
+    start = time.perf_counter()
+    if await restore(engine, path, version):
+        done = 'restored'
+    else:
+        await build()
+        await save(engine, path, version)
+        done = 'built and saved'
+    return f'snapshot {path} {done} in {time.perf_counter() - start:.2f}s ({os.path.getsize(path) / 2**20:.1f} MB)'
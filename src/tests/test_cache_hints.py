@@ -0,0 +1,31 @@
+from pydantic_resolve.graphql.types import FieldSelection
+
+from src.cache_hints import NO_CACHE, PRIVATE, CacheHint, CacheHints
+from src.services.er_diagram import BaseEntity
+import src.db  # noqa: F401, imports the models before the entities
+import src.services.team.schema, src.services.sprint.schema, src.services.story.schema  # noqa: F401
+import src.services.task.schema, src.services.user.schema  # noqa: F401
+from src.services.team.schema import Team
+from src.services.user.schema import User
+
+hints = CacheHints(BaseEntity.get_diagram())
+
+
+def _selection(**sub_fields):
+    return FieldSelection(sub_fields={name: sub or FieldSelection() for name, sub in sub_fields.items()})
+
+
+def test_policy():
+    assert hints.policy(User, _selection(id=None, name=None)) == CacheHint(max_age=300)
+    assert hints.policy(Team, _selection(id=None, users=_selection(id=None))) == CacheHint(max_age=300)
+    # the hint of the relationship overrides the one of Sprint (which has none)
+    assert hints.policy(Team, _selection(id=None, sprints=_selection(id=None))) == CacheHint(max_age=60)
+    # Story has no hint
+    assert hints.policy(Team, _selection(sprints=_selection(stories=_selection(id=None)))) == NO_CACHE
+
+
+def test_hint():
+    hint = CacheHint(max_age=300).restrict(CacheHint(max_age=60, scope=PRIVATE))
+    assert hint == CacheHint(max_age=60, scope=PRIVATE)
+    assert hint.header() == 'private, max-age=60'
+    assert NO_CACHE.header() is None
@@ -0,0 +1,52 @@
+import asyncio
+
+from fastapi import Response
+
+from src.coalesce import RequestCoalescer
+
+
+async def test_identical_requests_share_one_run():
+    coalescer = RequestCoalescer()
+    calls = []
+
+    async def compute(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return Response(b'{"k": "%s"}' % key.encode(), media_type='application/json', headers={'x-cache': 'miss'})
+
+    responses = await asyncio.gather(
+        *[coalescer.run('a', lambda: compute('a')) for _ in range(5)],
+        coalescer.run('b', lambda: compute('b')))
+
+    assert calls == ['a', 'b']
+    assert [r.body for r in responses] == [b'{"k": "a"}'] * 5 + [b'{"k": "b"}']
+    assert len({id(r) for r in responses}) == 6  # every waiter gets its own response
+    assert responses[0].headers['x-cache'] == 'miss'
+    assert coalescer.stats() == dict(inflight=0, leaders=2, followers=4)
+
+
+async def test_errors_reach_every_waiter():
+    coalescer = RequestCoalescer()
+
+    async def compute():
+        await asyncio.sleep(0.01)
+        raise ValueError('boom')
+
+    results = await asyncio.gather(*[coalescer.run('a', compute) for _ in range(3)], return_exceptions=True)
+    assert all(isinstance(r, ValueError) for r in results)
+    assert coalescer.stats()['inflight'] == 0
+
+
+def test_auth_context_is_part_of_key():
+    from starlette.requests import Request
+
+    def request(headers):
+        scope = {'type': 'http', 'method': 'GET', 'path': '/x', 'query_string': b'a=1',
+                 'headers': [(k.encode(), v.encode()) for k, v in headers.items()], 'path_params': {}}
+        return Request(scope)
+
+    vary = ('accept', 'authorization', 'cookie')
+    key = RequestCoalescer.request_key
+    assert key('/x', request({'authorization': 'Bearer 1'}), vary) == key('/x', request({'authorization': 'Bearer 1'}), vary)
+    assert key('/x', request({'authorization': 'Bearer 1'}), vary) != key('/x', request({'authorization': 'Bearer 2'}), vary)
+    assert key('/x', request({'cookie': 's=1'}), vary) != key('/x', request({}), vary)
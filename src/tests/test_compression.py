@@ -0,0 +1,110 @@
+import asyncio
+import gzip
+import zlib
+
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from src.compression import CompressionMiddleware, compression_stats, negotiate
+
+BIG = b'{"id": 2, "name": "Eric"},' * 200
+
+
+def _app(**options):
+    async def big(request):
+        return Response(BIG, media_type='application/json')
+
+    async def small(request):
+        return PlainTextResponse('tiny')
+
+    async def stream(request):
+        async def chunks():
+            for _ in range(3):
+                yield BIG
+        return StreamingResponse(chunks(), media_type='application/json')
+
+    async def events(request):
+        async def chunks():
+            yield b'data: 1\n\n' * 200
+        return StreamingResponse(chunks(), media_type='text/event-stream')
+
+    app = Starlette(routes=[Route('/big', big), Route('/small', small),
+                            Route('/stream', stream), Route('/events', events)])
+    app.add_middleware(CompressionMiddleware, **options)
+    return app
+
+
+def test_negotiate():
+    assert negotiate('gzip, deflate, br') == 'gzip'
+    assert negotiate('gzip;q=0') is None
+    assert negotiate('*') == negotiate('zstd, gzip')
+    assert negotiate(None) is None
+    assert negotiate('br') is None
+
+
+def test_compress_above_threshold():
+    client = TestClient(_app(minimum_size=1024))
+    before = compression_stats.bytes_in
+
+    response = client.get('/big', headers={'accept-encoding': 'gzip'})
+    assert response.headers['content-encoding'] == 'gzip'
+    assert 'accept-encoding' in response.headers['vary'].lower()
+    assert response.content == BIG
+    assert compression_stats.bytes_in - before == len(BIG)
+
+    response = client.get('/small', headers={'accept-encoding': 'gzip'})
+    assert 'content-encoding' not in response.headers
+
+    response = client.get('/big', headers={'accept-encoding': 'identity'})
+    assert 'content-encoding' not in response.headers
+
+
+def test_offloaded_body_is_identical():
+    client = TestClient(_app(minimum_size=10, offload_size=100))
+    offloaded = compression_stats.offloaded
+    with client.stream('GET', '/big', headers={'accept-encoding': 'gzip'}) as response:
+        raw = b''.join(response.iter_raw())
+    assert gzip.decompress(raw) == BIG
+    assert compression_stats.offloaded == offloaded + 1
+
+
+async def test_streaming_chunks_are_flushed():
+    messages = []
+
+    async def receive():
+        await asyncio.Event().wait()  # the client never disconnects
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {'type': 'http', 'method': 'GET', 'path': '/stream', 'query_string': b'', 'root_path': '',
+             'headers': [(b'accept-encoding', b'gzip')]}
+    await _app()(scope, receive, send)
+
+    start, *bodies = messages
+    headers = dict(start['headers'])
+    assert headers[b'content-encoding'] == b'gzip'
+    assert b'content-length' not in headers
+    decompressor = zlib.decompressobj(31)
+    received = [decompressor.decompress(m['body']) for m in bodies]
+    assert received[:3] == [BIG] * 3  # every chunk is readable as soon as it is sent
+    assert decompressor.eof
+
+    client = TestClient(_app())
+    response = client.get('/events', headers={'accept-encoding': 'gzip'})
+    assert 'content-encoding' not in response.headers
+
+
+def test_strong_etag_is_weakened():
+    import src.main as main
+    client = TestClient(main.app)
+    plain = client.get('/schema', headers={'accept-encoding': 'identity'})
+    compressed = client.get('/schema', headers={'accept-encoding': 'gzip'})
+    assert compressed.headers['content-encoding'] == 'gzip'
+    assert compressed.headers['etag'] == f"W/{plain.headers['etag']}" and not plain.headers['etag'].startswith('W/')
+    assert compressed.text == plain.text
+
+    revalidated = client.get('/schema', headers={'accept-encoding': 'gzip', 'if-none-match': compressed.headers['etag']})
+    assert revalidated.status_code == 304
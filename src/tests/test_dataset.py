@@ -0,0 +1,44 @@
+from collections import Counter
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.dataset import DatasetSpec, generate, load
+
+
+def test_generate_is_deterministic():
+    spec = DatasetSpec(teams=3, sprints=2, stories=4, tasks=5, users=20, members=4)
+    first = {table: list(rows) for table, rows in generate(spec).items()}
+    tasks_first = list(generate(spec)['task'])  # whatever the order the tables are read in
+    assert tasks_first == first['task']
+    assert {table: len(rows) for table, rows in first.items()} == spec.rows
+    assert first != {table: list(rows) for table, rows in generate(DatasetSpec(**{**vars(spec), 'seed': 7})).items()}
+
+    stories = {s['id']: s for s in first['story']}
+    assert all(t['story_id'] in stories for t in first['task'])
+    assert Counter(s['sprint_id'] for s in first['story']) == {i: 4 for i in range(1, 7)}
+
+
+def test_owner_skew():
+    owners = Counter(t['owner_id'] for t in generate(DatasetSpec(teams=20, users=50, skew=2.0))['task'])
+    assert owners.most_common(1)[0][0] == 1
+    assert sum(owners[i] for i in (1, 2, 3)) / sum(owners.values()) > 0.75
+    uniform = Counter(t['owner_id'] for t in generate(DatasetSpec(teams=20, users=50, skew=0))['task'])
+    assert max(uniform.values()) < 2 * min(uniform.values())
+
+
+def test_spec_of_size_and_parse():
+    for rows in (1_000, 100_000, 10_000_000):
+        assert abs(sum(DatasetSpec.of_size(rows).rows.values()) - rows) / rows < 0.5
+    assert DatasetSpec.parse('teams=3, skew=0.5') == DatasetSpec(teams=3, skew=0.5)
+
+
+async def test_load_replaces_data():
+    engine = create_async_engine('sqlite+aiosqlite://')
+    await load(engine, DatasetSpec(teams=4))
+    spec = DatasetSpec(teams=2, sprints=3)
+    report = await load(engine, spec)
+    assert report.rows == spec.rows
+    async with engine.connect() as conn:
+        assert (await conn.execute(text('select count(*) from sprint'))).scalar() == 6
+    await engine.dispose()
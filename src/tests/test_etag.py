@@ -0,0 +1,34 @@
+from typing import List, Optional
+import src.db  # noqa: F401, imports the models before the entities
+import src.changes as changes
+from src.etag import compute_etag, if_none_match, response_tables
+from src.router.sample_1.schema import Sample1TeamDetail
+from src.router.sample_6.schema import Sample6Root
+import src.services.user.schema as us
+
+
+def test_response_tables():
+    assert response_tables(List[us.User]) == {'user'}
+    assert response_tables(Optional[Sample1TeamDetail]) == {'team', 'sprint', 'story', 'task', 'user'}
+    assert response_tables(Sample6Root) == {'team', 'sprint', 'story', 'task', 'user'}  # subsets
+
+
+def test_etag_follows_versions():
+    etag = compute_etag(frozenset({'user', 'team'}))
+    assert compute_etag(frozenset({'team', 'user'})) == etag
+
+    changes.notify('task', 1)
+    assert compute_etag(frozenset({'user', 'team'})) == etag
+
+    changes.notify('user', 1)
+    assert compute_etag(frozenset({'user', 'team'})) != etag
+
+
+def test_if_none_match():
+    etag = 'W/"abc-123"'
+    assert if_none_match('W/"abc-123"', etag)
+    assert if_none_match('"abc-123"', etag)
+    assert if_none_match('W/"x", W/"abc-123"', etag)
+    assert if_none_match('*', etag)
+    assert not if_none_match('W/"abc-124"', etag)
+    assert not if_none_match(None, etag)
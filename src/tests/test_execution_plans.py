@@ -0,0 +1,30 @@
+import src.db as db
+from src.main import graphql_documents, graphql_handler, plan_compiler
+
+QUERY = '''
+query Teams {
+  teamGetTeams {
+    id
+    label: name
+    sprints { name stories { name owner { name } tasks { id owner { id name } } } }
+    users { id }
+  }
+  taskGetTasks { name owner { level } }
+}
+'''
+
+
+async def test_compiled_as_interpreted():
+    await db.init()
+    await db.prepare()
+    executor = graphql_handler.executor.executor
+    graphql_documents.pin(QUERY)
+    interpreted = await graphql_handler.execute(QUERY)
+    assert interpreted['errors'] is None
+
+    assert plan_compiler.compile(graphql_handler, QUERY) == 2
+    before = executor.compiled
+    compiled = await graphql_handler.execute(QUERY)
+    assert executor.compiled == before + 2
+    assert compiled['data'] == interpreted['data']
+    assert 'label' in compiled['data']['teamGetTeams'][0]
@@ -0,0 +1,48 @@
+import pytest
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+from pydantic import BaseModel, Field
+
+from src.response_cache import CachedRoute
+
+msgpack = pytest.importorskip('msgpack')
+
+
+class User(BaseModel):
+    id: int
+    name: str
+    password: str = Field(default='secret', exclude=True)
+
+
+class Task(BaseModel):
+    id: int
+    owner: User
+
+
+def _client():
+    route = APIRouter(route_class=CachedRoute)
+
+    @route.get('/tasks', response_model=list[Task])
+    async def tasks():
+        eric = User(id=2, name='Eric')
+        return [Task(id=1, owner=eric), Task(id=2, owner=eric)]
+
+    app = FastAPI()
+    app.include_router(route)
+    return TestClient(app)
+
+
+def test_msgpack_is_the_json_tree():
+    client = _client()
+    as_json = client.get('/tasks')
+    as_msgpack = client.get('/tasks', headers={'accept': 'application/msgpack'})
+
+    assert as_msgpack.headers['content-type'] == 'application/msgpack'
+    assert msgpack.unpackb(as_msgpack.content) == as_json.json()
+    assert 'password' not in msgpack.unpackb(as_msgpack.content)[0]['owner']
+    assert as_msgpack.headers['vary'] == 'Accept'
+
+    normalized = client.get('/tasks?format=normalized', headers={'accept': 'application/msgpack'})
+    doc = msgpack.unpackb(normalized.content)
+    assert doc['data'] == [1, 2]
+    assert doc['entities']['User'] == {'2': {'id': 2, 'name': 'Eric'}}
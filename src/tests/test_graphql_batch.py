@@ -0,0 +1,37 @@
+from fastapi.testclient import TestClient
+
+import src.main as main
+import src.warmup
+from src.graphql_documents import digest
+
+TEAMS = '{ teamGetTeams { id name } }'
+SPRINTS = '{ teamGetTeams { id sprints { id } } }'  # cost 110, depth 2
+
+
+def test_batch_over_budget(monkeypatch):
+    analyzer = main.graphql_handler.cost_analyzer
+    monkeypatch.setattr(analyzer, 'max_cost', 150)
+    rejected = analyzer.rejected
+    response = TestClient(main.app).post('/graphql', json=[{'query': SPRINTS}] * 2)
+    assert response.status_code == 400
+    assert response.json()['errors'] == [{'message': 'Batch cost 220 exceeds the maximum cost of 150.',
+                                          'extensions': {'code': 'QUERY_TOO_EXPENSIVE'}}]
+    assert analyzer.rejected == rejected + 1
+
+
+def test_batch_checks_each_operation_once(monkeypatch):
+    monkeypatch.setattr(src.warmup, 'WARMUP', False)
+    monkeypatch.setattr(main.graphql_handler.cost_analyzer, 'max_depth', 1)
+    persisted = {'persistedQuery': {'version': 1, 'sha256Hash': digest(TEAMS)}}
+    with TestClient(main.app) as client:
+        assert client.post('/graphql', json={'query': TEAMS, 'extensions': persisted}).status_code == 200
+        hits, rejected = main.persisted_queries.hits, main.graphql_handler.cost_analyzer.rejected
+        lookups = main.graphql_documents.hits + main.graphql_documents.misses
+
+        response = client.post('/graphql', json=[{'extensions': persisted}, {'query': SPRINTS}])
+        teams, sprints = response.json()
+        assert [t['name'] for t in teams['data']['teamGetTeams']] == ['team-A', 'team-B']
+        assert sprints['errors'][0]['extensions'] == {'code': 'QUERY_TOO_EXPENSIVE'}
+        assert main.persisted_queries.hits == hits + 1
+        assert main.graphql_handler.cost_analyzer.rejected == rejected + 1
+        assert main.graphql_documents.hits + main.graphql_documents.misses == lookups + 2
@@ -0,0 +1,73 @@
+from graphql import build_schema
+
+from src.graphql_documents import CachedQueryParser, DocumentCache, Operation, _operation
+from src.response_cache import graphql_cache_key
+
+SCHEMA = build_schema('''
+    type User { id: Int! name: String! }
+    type Query { users: [User!]! }
+    type Mutation { deleteUser(id: Int!): Boolean }
+''')
+
+
+def test_lru_and_hit_rate():
+    documents = DocumentCache(max_entries=2)
+    query = '{ users { id } }'
+    first = documents.validate(query, SCHEMA)
+    assert documents.validate(query, SCHEMA) is first
+    assert documents.stats()['hit_rate'] == 0.5
+
+    documents.get('{ users { name } }')
+    documents.get('{ users { id name } }')
+    assert len(documents) == 2
+    assert documents.evictions == 1
+    assert documents.get(query) is not first  # evicted, parsed again
+
+
+def test_prepared_document():
+    documents = DocumentCache()
+    prepared = documents.get('query {\n  users { id }\n}')
+    assert prepared.normalized == documents.get('{ users { id } }').normalized
+    assert prepared.operation_type == 'query'
+
+    assert documents.get('mutation { deleteUser(id: 1) }').operation_type == 'mutation'
+
+    invalid = documents.validate('{ users { nope } }', SCHEMA)
+    assert invalid.errors[0]['extensions']['code'] == 'GRAPHQL_VALIDATION_ERROR'
+    assert documents.validate('{ users {', SCHEMA).errors[0]['extensions']['code'] == 'GRAPHQL_PARSE_ERROR'
+
+
+def test_field_tree_built_once():
+    documents = DocumentCache()
+    parser = CachedQueryParser(documents)
+    parsed = parser.parse('{ users { id name } }')
+    assert parser.parse('{ users { id name } }') is parsed
+    assert set(parsed.field_tree['users'].sub_fields) == {'id', 'name'}
+
+
+def test_variables_replace_placeholders():
+    documents = DocumentCache()
+    parser = CachedQueryParser(documents)
+    query = '''
+        query Users { users { id } }
+        mutation Delete($id: Int!, $reason: String) { deleteUser(id: $id, reason: $reason, input: {ids: [$id]}) }
+    '''
+    node = documents.get(query).document.definitions[1]
+
+    for variables in ({'id': 1}, {'id': 2, 'reason': 'spam'}):
+        token = _operation.set(Operation(node, variables))
+        try:
+            parsed = parser.parse(query)
+        finally:
+            _operation.reset(token)
+        assert parsed.operation_name == 'Delete'
+        assert parsed.field_tree['deleteUser'].arguments == {**variables, 'input': {'ids': [variables['id']]}}
+
+    assert set(documents.get(query).parsed) == {'Delete'}  # the field tree is built once
+
+
+def test_cache_key_of_selected_operation():
+    query = 'query Users { userGetUsers { id } } mutation Delete { userDeleteUser(id: 1) }'
+    assert graphql_cache_key(query, None, 'Users') is not None
+    assert graphql_cache_key(query, None, 'Delete') is None
+    assert graphql_cache_key(query, None, None) is None  # ambiguous
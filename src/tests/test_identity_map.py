@@ -0,0 +1,77 @@
+import inspect
+from typing import Optional
+
+from pydantic import BaseModel
+from pydantic_resolve import Loader, Resolver, build_object
+import pydantic_resolve.constant as const
+from pydantic_resolve.utils import conversion as conversion_util
+
+from src.identity_map import IdentityMapResolver
+
+USERS = {1: dict(id=1, name='John'), 2: dict(id=2, name='Eric')}
+
+
+async def user_loader(keys):
+    return build_object([USERS[k] for k in keys if k in USERS], keys, lambda u: u['id'])
+
+
+class User(BaseModel):
+    id: int
+    name: str
+
+
+class Task(BaseModel):
+    id: int
+    owner_id: int
+    owner: Optional[User] = None
+
+    def resolve_owner(self, loader=Loader(user_loader)):
+        return loader.load(self.owner_id)
+
+
+class Story(BaseModel):
+    id: int
+    owner_id: int
+    tasks: list[Task] = []
+    owner: Optional[User] = None
+
+    def resolve_owner(self, loader=Loader(user_loader)):
+        return loader.load(self.owner_id)
+
+
+def _stories():
+    return [Story(id=i, owner_id=1, tasks=[Task(id=i * 10 + j, owner_id=2) for j in range(3)]) for i in range(2)]
+
+
+async def test_instances_are_shared_per_class_and_id():
+    resolver = IdentityMapResolver()
+    stories = await resolver.resolve(_stories())
+
+    owners = {id(t.owner) for s in stories for t in s.tasks}
+    assert len(owners) == 1
+    assert stories[0].owner is stories[1].owner
+    assert resolver.shared == 6  # 8 references, 2 instances
+
+    plain = await Resolver().resolve(_stories())
+    assert [s.model_dump() for s in stories] == [s.model_dump() for s in plain]
+
+
+async def test_unknown_rows_stay_none():
+    stories = await IdentityMapResolver().resolve([Story(id=1, owner_id=3)])
+    assert stories[0].owner is None
+
+
+def _parameters(function) -> list[str]:
+    return list(inspect.signature(function).parameters)
+
+
+def test_private_resolver_api():
+    # IdentityMap overrides and calls these, an upgrade of pydantic-resolve changing them must fail here
+    assert _parameters(Resolver._execute_resolve_method_field) == ['self', 'node', 'kls', 'field', 'trim_field',
+                                                                   'method']
+    assert _parameters(Resolver._execute_resolve_method) == ['self', 'kls', 'field', 'method']
+    assert _parameters(conversion_util.try_parse_data_to_target_field_type) == ['target', 'field_name', 'data',
+                                                                                'enable_from_attribute']
+    assert hasattr(const, 'HAS_MAPPER_FUNCTION')
+    resolver = Resolver()
+    assert hasattr(resolver, 'ensure_type') and hasattr(resolver, 'enable_from_attribute_in_type_adapter')
@@ -0,0 +1,33 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+BUDGET_MS = os.getenv('IMPORT_TIME_BUDGET_MS')  # cold start of a worker importing src.main, checked when set
+DEFERRED = ('fastmcp', 'mcp', 'fastapi_voyager')  # imported on the first request to /mcp, /voyager
+
+
+def _importtime(module: str) -> dict[str, int]:
+    """cumulative import time (us) by module, from `python -X importtime`."""
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                             cwd=ROOT, capture_output=True, text=True, check=True)
+    times = {}
+    for line in process.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, name = line.split('|')
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_main_deferred_imports():
+    times = _importtime('src.main')
+    assert not [name for name in times if name.split('.')[0] in DEFERRED]
+
+
+@pytest.mark.skipif(BUDGET_MS is None, reason='IMPORT_TIME_BUDGET_MS not set, timing depends on the machine')
+def test_main_import_time():
+    times = _importtime('src.main')
+    assert times['src.main'] / 1000 < int(BUDGET_MS), f"importing src.main took {times['src.main'] / 1000:.0f} ms"
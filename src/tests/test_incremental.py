@@ -0,0 +1,129 @@
+import asyncio
+import json
+
+from graphql import build_schema, parse
+
+import src.incremental as incremental
+from src.incremental import DIRECTIVES
+from src.services.er_diagram import BaseEntity
+import src.db  # noqa: F401, imports the models before the entities
+import src.services.team.schema, src.services.sprint.schema, src.services.story.schema  # noqa: F401
+import src.services.task.schema, src.services.user.schema  # noqa: F401
+from pydantic_resolve.graphql import SchemaBuilder
+
+schema = build_schema(SchemaBuilder(BaseEntity.get_diagram()).build_schema() + DIRECTIVES)
+
+QUERY = '''
+query Teams($defer: Boolean!) {
+  teamGetTeams @stream(initialCount: 1) {
+    id
+    ... @defer(label: "sprints", if: $defer) { sprints { id stories { id tasks @defer { id } } } }
+  }
+}
+'''
+
+
+def _plan(query, variables=None):
+    document = parse(query)
+    return incremental.plan(schema, document, document.definitions[0], variables)
+
+
+def test_plan():
+    plan = _plan(QUERY, {'defer': True})
+    assert 'sprints' not in plan.query and '$defer' not in plan.query
+    outer, inner = plan.deferred
+    assert (outer.label, outer.path, outer.keys, outer.enclosing) == ('sprints', ('teamGetTeams',), ['sprints'], [])
+    assert (inner.path, inner.keys, inner.enclosing) == (('teamGetTeams', 'sprints', 'stories'), ['tasks'], [0])
+    assert 'tasks' not in outer.query and 'tasks' in inner.query
+    assert [(s.path, s.initial_count) for s in plan.streams] == [(('teamGetTeams',), 1)]
+
+    assert len(_plan(QUERY, {'defer': False}).deferred) == 1  # @defer(if: false) is ignored
+    assert _plan('{ teamGetTeams { id } }') is None
+    assert _plan('mutation { userDeleteUser(id: 1) { id } }') is None
+
+
+def test_filler():
+    plan = _plan('{ teamGetTeams { ... @defer { name } } }')
+    assert plan.fillers == [(('teamGetTeams',), 'id')]  # a selection set can't be empty
+
+
+def _parts(body):
+    return [json.loads(p.split(b'\r\n\r\n', 1)[1]) for p in body[:-len(incremental.END)].split(b'\r\n---\r\n')[1:]]
+
+
+class Handler:
+    async def execute(self, query, variables=None, operation_name=None):
+        teams = [{'id': 1, 'name': 'a'}, {'id': 2, 'name': 'b'}]
+        keys = [k for k in ('id', 'name') if k in query]
+        return {'data': {'teamGetTeams': [{k: t[k] for k in keys} for t in teams]}}
+
+
+async def test_multipart():
+    plan = _plan('{ teamGetTeams @stream(initialCount: 1) { ... @defer { name } } }')
+    body = b''.join([chunk async for chunk in incremental.execute(Handler(), plan, None, None)])
+    assert body.endswith(incremental.END)
+    assert _parts(body) == [
+        {'data': {'teamGetTeams': [{}]}, 'hasNext': True},
+        {'incremental': [{'items': [{}], 'path': ['teamGetTeams', 1]}], 'hasNext': True},
+        {'incremental': [{'data': {'name': 'a'}, 'path': ['teamGetTeams', 0]},
+                         {'data': {'name': 'b'}, 'path': ['teamGetTeams', 1]}], 'hasNext': False},
+    ]
+
+
+class MovingHandler:
+    """the rows change between the initial and the deferred execution."""
+    def __init__(self):
+        self.runs = 0
+
+    async def execute(self, query, variables=None, operation_name=None):
+        self.runs += 1
+        teams = [{'id': 1, 'name': 'a'}, {'id': 2, 'name': 'b'}]
+        if self.runs > 1:
+            teams = [{'id': 3, 'name': 'c'}] + teams[::-1]
+        keys = [k for k in ('id', 'name') if k in query]
+        return {'data': {'teamGetTeams': [{k: t[k] for k in keys} for t in teams]}}
+
+
+async def test_patch_by_id():
+    plan = _plan('{ teamGetTeams { ... @defer { name } } }')
+    body = b''.join([chunk async for chunk in incremental.execute(MovingHandler(), plan, None, None)])
+    assert _parts(body) == [
+        {'data': {'teamGetTeams': [{}, {}]}, 'hasNext': True},
+        {'incremental': [{'data': {'name': 'b'}, 'path': ['teamGetTeams', 1]},
+                         {'data': {'name': 'a'}, 'path': ['teamGetTeams', 0]}], 'hasNext': False},
+    ]
+
+
+def test_id_on_deferred_paths():
+    plan = _plan('{ teamGetTeams { name sprints { name ... @defer { stories { id } } } } }')
+    assert (('teamGetTeams',), 'id') in plan.fillers and (('teamGetTeams', 'sprints'), 'id') in plan.fillers
+    assert _plan('{ teamGetTeams { id ... @defer { name } } }').fillers == []
+
+
+def test_cached_plan():
+    document = parse(QUERY)
+    prepared = type('Prepared', (), {'document': document, 'incremental_plans': {}})()
+    operation = document.definitions[0]
+    plan = incremental.cached_plan(schema, prepared, operation, {'defer': True})
+    assert incremental.cached_plan(schema, prepared, operation, {'defer': True, 'other': 1}) is plan
+    assert len(incremental.cached_plan(schema, prepared, operation, {'defer': False}).deferred) == 1
+
+
+class Executor:
+    def __init__(self):
+        self.calls = 0
+
+    async def _execute_method(self, method, arguments, operation_type='query', entity=None):
+        self.calls += 1
+        await asyncio.sleep(0)
+        return [{'id': 1}]
+
+
+async def test_shared_roots():
+    executor = incremental.with_shared_roots(Executor)()
+    with incremental.shared_roots():
+        rows = await asyncio.gather(*(executor._execute_method(len, {'limit': 1}) for _ in range(3)))
+        await executor._execute_method(len, {'limit': 2})
+    assert rows == [[{'id': 1}]] * 3 and executor.calls == 2
+    await executor._execute_method(len, {'limit': 1})  # outside of an incremental execution
+    assert executor.calls == 3
@@ -0,0 +1,76 @@
+import pytest
+from fastmcp import Client
+from graphql import build_schema
+
+import src.db as db
+from src.dataset import DatasetSpec, load
+from src.mcp_budget import (BudgetedAppConfig, CursorError, Projection, ToolBudget, create_budgeted_mcp_server,
+                            decode_cursor, encode_cursor, trim)
+from src.services.er_diagram import BaseEntity
+import src.services.team.schema, src.services.sprint.schema, src.services.story.schema  # noqa: F401
+import src.services.task.schema, src.services.user.schema  # noqa: F401
+
+SCHEMA = build_schema('''
+type Query { tasks: [Task!]! }
+type Task { id: Int! name: String! owner: User }
+type User { id: Int! name: String! level: String! }
+''')
+DATASET = DatasetSpec(teams=1, sprints=1, stories=1, tasks=13, users=3, members=3)
+
+
+def test_cursor():
+    cursor = encode_cursor('{ tasks { id } }', {'tasks': 20})
+    assert decode_cursor(cursor) == ('{ tasks { id } }', {'tasks': 20})
+    with pytest.raises(CursorError):
+        decode_cursor('not a cursor')
+
+
+def test_trim_whole_items():
+    data = {'tasks': [{'id': i, 'owner': {'id': 1}} for i in range(10)]}
+    trimmed, kept, truncated = trim(data, ToolBudget(max_rows=5))
+    assert kept == {'tasks': 2} and trimmed['tasks'] == data['tasks'][:2] and truncated == []
+
+    trimmed, kept, _ = trim(data, ToolBudget(max_bytes=60))
+    assert kept == {'tasks': 2}
+
+
+def test_trim_cuts_an_item_alone_over_budget():
+    data = {'team': {'id': 1, 'tasks': [{'id': i} for i in range(10)]}}
+    trimmed, kept, truncated = trim(data, ToolBudget(max_rows=4))
+    assert trimmed == {'team': {'id': 1, 'tasks': [{'id': 0}, {'id': 1}, {'id': 2}]}}
+    assert kept == {'team': 1} and truncated == ['team.0.tasks']
+
+
+def test_projection():
+    projection = Projection(SCHEMA)
+    assert projection.expand('{ tasks }', {}) == '{\n  tasks {\n    id\n    name\n  }\n}'
+    expanded = projection.expand('{ tasks { id owner } }', {'User': ('name',)})
+    assert 'owner {\n      name\n    }' in expanded
+    assert projection.expand('{ tasks { id } }', {}) == '{ tasks { id } }'
+
+
+@pytest.fixture
+async def database():
+    await load(db.engine, DATASET)
+    yield
+    await db.engine.dispose()  # the in-memory database goes with its connection
+
+
+async def test_pages_cover_every_row_once(database):
+    app = BudgetedAppConfig(name='tasks', er_diagram=BaseEntity.get_diagram(),
+                            enable_from_attribute_in_type_adapter=True,
+                            budgets={'graphql_query': ToolBudget(max_rows=4)})
+    mcp = create_budgeted_mcp_server(apps=[app])
+    arguments = {'app_name': 'tasks', 'query': '{ taskGetTasks { id owner { id } } }'}
+    ids, pages = [], 0
+    async with Client(mcp) as client:
+        while True:
+            response = (await client.call_tool('graphql_query', arguments)).structured_content
+            assert response['success'], response
+            ids.extend(task['id'] for task in response['data']['taskGetTasks'])
+            pages += 1
+            if response['page']['cursor'] is None:
+                break
+            arguments = {'app_name': 'tasks', 'cursor': response['page']['cursor']}
+    assert sorted(ids) == list(range(1, 14)) and len(ids) == len(set(ids))
+    assert pages == 7  # 2 tasks (and their owners) per page
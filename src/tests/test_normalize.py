@@ -0,0 +1,83 @@
+from typing import Optional
+
+from graphql import build_schema, parse
+from pydantic import BaseModel, TypeAdapter
+
+from src.normalize import normalize_graphql, normalize_models
+
+
+class User(BaseModel):
+    id: int
+    name: str
+
+
+class Meta(BaseModel):
+    label: str
+    user: Optional[User] = None
+
+
+class Task(BaseModel):
+    id: int
+    owner: Optional[User] = None
+    meta: Optional[Meta] = None
+
+
+def test_normalize_models():
+    eric = User(id=2, name='Eric')
+    tasks = [Task(id=1, owner=eric, meta=Meta(label='a', user=eric)), Task(id=2, owner=eric), Task(id=3)]
+    adapter = TypeAdapter(list[Task])
+
+    doc = normalize_models(tasks, adapter.dump_python(tasks, mode='json'))
+
+    assert doc['root'] == 'Task'
+    assert doc['data'] == [1, 2, 3]
+    assert doc['entities']['User'] == {'2': {'id': 2, 'name': 'Eric'}}
+    assert doc['entities']['Task']['1'] == {'id': 1, 'owner': 2, 'meta': {'label': 'a', 'user': 2}}
+    assert doc['entities']['Task']['3'] == {'id': 3, 'owner': None, 'meta': None}
+    assert doc['types'] == {'Task': {'owner': 'User', 'meta': 'Meta'}, 'Meta': {'user': 'User'}}
+
+
+class Story(BaseModel):
+    id: int
+    tasks: list[Task] = []
+    task_count: int = 0
+
+    def post_task_count(self):
+        return len(self.tasks)
+
+
+def test_normalize_models_keeps_different_occurrences_inline():
+    # the same story loaded under two sprints, filtered differently: post_task_count differs
+    stories = [Story(id=1, tasks=[Task(id=1), Task(id=2)], task_count=2), Story(id=1, tasks=[Task(id=1)], task_count=1),
+               Story(id=1, tasks=[Task(id=1), Task(id=2)], task_count=2)]
+    adapter = TypeAdapter(list[Story])
+
+    doc = normalize_models(stories, adapter.dump_python(stories, mode='json'))
+
+    assert doc['data'] == [1, {'id': 1, 'tasks': [1], 'task_count': 1}, 1]
+    assert doc['entities']['Story'] == {'1': {'id': 1, 'tasks': [1, 2], 'task_count': 2}}
+
+
+def test_normalize_graphql():
+    schema = build_schema('''
+        type User { id: Int! name: String! }
+        type Task { id: Int! name: String! owner: User }
+        type Query { tasks: [Task!]! }
+    ''')
+    document = parse('''
+        query Tasks { items: tasks { ...TaskFields owner { id name } } }
+        fragment TaskFields on Task { id name }
+    ''')
+    result = {'data': {'items': [
+        {'id': 1, 'name': 'a', 'owner': {'id': 2, 'name': 'Eric'}},
+        {'id': 2, 'name': 'b', 'owner': {'id': 2, 'name': 'Eric'}},
+    ]}}
+
+    doc = normalize_graphql(result, document, schema, 'Tasks')
+
+    assert doc['root'] == 'Query'
+    assert doc['data'] == {'items': [1, 2]}
+    assert doc['entities']['User'] == {'2': {'id': 2, 'name': 'Eric'}}
+    assert doc['entities']['Task']['2'] == {'id': 2, 'name': 'b', 'owner': 2}
+    assert doc['types'] == {'Query': {'items': 'Task'}, 'Task': {'owner': 'User'}}
+    assert 'errors' not in doc
@@ -0,0 +1,46 @@
+import json
+
+import pytest
+
+from src.graphql_documents import DocumentCache, digest
+from src.persisted_queries import PersistedQueries, PersistedQueryError
+
+QUERY = '{ userGetUsers { id name } }'
+
+
+def _persisted(sha256_hash=None):
+    return {'persistedQuery': {'version': 1, 'sha256Hash': sha256_hash or digest(QUERY)}}
+
+
+def _code(persisted, query, extensions):
+    with pytest.raises(PersistedQueryError) as e:
+        persisted.resolve(query, extensions)
+    return e.value.code
+
+
+def test_register_on_miss():
+    persisted = PersistedQueries(DocumentCache())
+    assert _code(persisted, None, _persisted()) == 'PERSISTED_QUERY_NOT_FOUND'
+    assert persisted.resolve(QUERY, _persisted()) == QUERY
+    assert persisted.resolve(None, _persisted()) == QUERY
+    assert _code(persisted, '{ userGetUsers { id } }', _persisted()) == 'BAD_REQUEST'
+    assert persisted.stats() == dict(allow_list=False, hits=1, misses=1, registered=1)
+
+
+def test_allow_list(tmp_path):
+    manifest = tmp_path / 'manifest.json'
+    manifest.write_text(json.dumps({'operations': [{'id': digest(QUERY), 'name': 'users', 'body': QUERY}]}))
+    documents = DocumentCache(max_entries=1)
+    persisted = PersistedQueries(documents, allow_list=True)
+    assert persisted.load(str(manifest)) == 1
+
+    documents.get('{ a }')
+    documents.get('{ b }')  # pinned documents are not evicted
+    assert persisted.resolve(None, _persisted()) == QUERY
+    assert persisted.resolve(QUERY, None) == QUERY
+
+    other = '{ userGetUsers { id } }'
+    assert _code(persisted, other, None) == 'PERSISTED_QUERY_NOT_ALLOWED'
+    assert _code(persisted, other, _persisted(digest(other))) == 'PERSISTED_QUERY_NOT_ALLOWED'
+    documents.get(other)  # cached, but not allowed
+    assert _code(persisted, None, _persisted(digest(other))) == 'PERSISTED_QUERY_NOT_FOUND'
@@ -0,0 +1,79 @@
+import asyncio
+import os
+
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+from pydantic_resolve import Resolver, analysis
+
+import src.etag as etag
+import src.main as main
+from src.identity_map import IdentityMapResolver
+from src.prefork import _analyze, _resolver_classes, preload
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def test_preload_builds_without_starting(monkeypatch):
+    from src.router.sample_1.schema import Sample1TaskDetail
+
+    query = 'query PreforkTeams { teamGetTeams { id name sprints { id name } } }'
+    main.graphql_documents.pin(query)
+    stats = preload(main)
+    assert stats['resolver_metadata'] > 0 and stats['mounts'] == 2 and stats['failed'] == []
+
+    # first resolves in a worker run no analysis: the route's resolver class, the GraphQL one
+    scans = []
+    scan = analysis.Analytic.scan
+    monkeypatch.setattr(analysis.Analytic, 'scan', lambda self, kls: scans.append(kls) or scan(self, kls))
+    assert IdentityMapResolver in _resolver_classes(
+        next(r.endpoint for r in main.app.routes if getattr(r, 'path', '') == '/sample_1/tasks-with-detail'))
+    run(IdentityMapResolver(annotation=Sample1TaskDetail).resolve(()))
+
+    handler = main.graphql_handler
+    parsed = main.graphql_documents.pin(query).parsed['PreforkTeams']
+    model = handler.executor.builder.build_response_model(handler.query_map['teamGetTeams'][0],
+                                                          parsed.field_tree['teamGetTeams'])
+    assert handler.executor.resolver_class is not Resolver
+    run(handler.executor.resolver_class(annotation=model).resolve(()))
+    assert scans == []
+
+    for mount in (main.voyager_mount, main.mcp_mount):
+        assert mount._built is not None and not mount.built  # the lifespan waits for a request
+
+    with TestClient(main.app) as client:
+        assert client.get('/voyager').status_code == 200
+        assert main.voyager_mount.built
+
+
+def test_analyze_reports_broken_models():
+    from src.router.sample_5.schema import Sample5Root
+
+    class Broken(BaseModel):
+        x: int = 0
+
+        def resolve_y(self):
+            return 1
+
+    assert run(_analyze(Resolver, Sample5Root)) is None  # analyzed, only the context of a request is missing
+    assert 'attribute y not found' in run(_analyze(Resolver, Broken))
+
+
+def test_forked_workers_draw_their_own_etag_epoch():
+    epochs = []
+    for _ in range(2):
+        read, write = os.pipe()
+        pid = os.fork()
+        if pid == 0:  # child
+            os.write(write, etag.EPOCH.encode())
+            os._exit(0)
+        os.close(write)
+        epochs.append(os.read(read, 64).decode())
+        os.close(read)
+        os.waitpid(pid, 0)
+    assert etag.EPOCH not in epochs and epochs[0] != epochs[1]
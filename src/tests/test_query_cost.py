@@ -0,0 +1,54 @@
+from graphql import build_schema, parse
+
+from src.query_cost import Cost, CostAnalyzer
+from src.services.er_diagram import BaseEntity
+import src.db  # noqa: F401, imports the models before the entities
+import src.services.team.schema, src.services.sprint.schema, src.services.story.schema  # noqa: F401
+import src.services.task.schema, src.services.user.schema  # noqa: F401
+from pydantic_resolve.graphql import SchemaBuilder
+
+diagram = BaseEntity.get_diagram()
+schema = build_schema(SchemaBuilder(diagram).build_schema())
+
+NESTED = '''
+fragment owner on Task { owner { id name } }
+query { teamGetTeams { id sprints { id stories { id tasks { id ...owner } } } } }
+'''
+
+
+def _cost(analyzer, query):
+    document = parse(query)
+    return analyzer.analyze(document, document.definitions[-1])
+
+
+def test_cardinalities():
+    analyzer = CostAnalyzer(diagram, schema)
+    # 10 teams, 100 sprints, 1000 stories, 10000 tasks and their 10000 owners
+    assert _cost(analyzer, NESTED) == Cost(cost=21110, depth=5)
+    assert _cost(analyzer, '{ taskGetTasks { id owner { id } } }') == Cost(cost=20, depth=2)
+
+
+def test_weights_and_list_sizes():
+    analyzer = CostAnalyzer(diagram, schema, list_sizes={'Team.sprints': 2}, weights={'Task.owner': 0, 'Team.name': 1})
+    assert _cost(analyzer, NESTED) == Cost(cost=10 + 20 + 200 + 2000, depth=5)
+    assert _cost(analyzer, '{ teamGetTeams { id name } }').cost == 20
+
+
+def test_budget():
+    analyzer = CostAnalyzer(diagram, schema, max_cost=20000, max_depth=4)
+    cost = _cost(analyzer, NESTED)
+    assert analyzer.check(cost)['message'] == 'Query depth 5 exceeds the maximum depth of 4.'
+    analyzer.max_depth = None
+    assert analyzer.check(cost)['extensions'] == {'code': 'QUERY_TOO_EXPENSIVE'}
+    assert analyzer.check(Cost(cost=20, depth=2)) is None
+    assert analyzer.stats() == dict(rejected=2, throttled=0)
+
+
+
+def test_batch_budget():
+    analyzer = CostAnalyzer(diagram, schema, max_cost=150)
+    assert analyzer.check_batch([Cost(cost=110, depth=2)]) is None
+    error = analyzer.check_batch([Cost(cost=110, depth=2), Cost(cost=110, depth=2)])
+    assert error == {'message': 'Batch cost 220 exceeds the maximum cost of 150.',
+                     'extensions': {'code': 'QUERY_TOO_EXPENSIVE'}}
+    assert analyzer.check_batch([]) is None and analyzer.stats()['rejected'] == 1
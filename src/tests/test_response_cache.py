@@ -0,0 +1,112 @@
+import asyncio
+import pytest
+from sqlalchemy import select
+import src.db  # noqa: F401, imports the models before the entities
+import src.changes as changes
+from src.response_cache import ResponseCache, CachePolicy, graphql_cache_key, scanned_tables, ANY_ROW
+from src.services.user.model import User
+from src.services.team.model import TeamUser
+
+
+@pytest.fixture
+def make_cache():
+    """ResponseCache factory, the caches stop listening to changes after the test."""
+    caches = []
+
+    def make(**kwargs):
+        caches.append(ResponseCache(**kwargs))
+        return caches[-1]
+    yield make
+    for cache in caches:
+        changes.unsubscribe(cache.invalidate)
+
+
+def _put(cache, key, body, rows, policy=CachePolicy()):
+    with cache.track() as dependencies:
+        dependencies.rows.update(rows)
+    return cache.put(key, body, 'application/json', dependencies, policy)
+
+
+def test_lru_bounds(make_cache):
+    cache = make_cache(max_entries=2, max_bytes=10)
+    _put(cache, 'a', b'1234', [])
+    _put(cache, 'b', b'1234', [])
+    cache.get('a')
+    _put(cache, 'c', b'1234', [])
+
+    assert cache.get('b') is None  # least recently used
+    assert cache.get('a') is not None
+    assert cache.evictions == 1
+
+
+def test_invalidate_by_row_and_table(make_cache):
+    cache = make_cache()
+    _put(cache, 'team-1', b'{}', [('team', 1), ('user', 2)])
+    _put(cache, 'team-2', b'{}', [('team', 2), ('user', 5)])
+    _put(cache, 'users', b'[]', [('user', ANY_ROW)])
+
+    changes.notify('user', 2)
+    assert cache.get('team-1') is None
+    assert cache.get('team-2') is not None
+    assert cache.get('users') is None
+
+    changes.notify('team')
+    assert len(cache) == 0
+
+
+def test_skip_put_when_changed_during_compute(make_cache):
+    cache = make_cache()
+    with cache.track() as dependencies:
+        dependencies.rows.update([('task', 1), ('user', 2)])
+        changes.notify('task', 2)  # unrelated row
+    assert cache.put('tasks', b'[]', 'application/json', dependencies) is True
+
+    with cache.track() as dependencies:
+        dependencies.rows.update([('task', 1), ('user', 2)])
+        changes.notify('user', 2)
+    assert cache.put('tasks', b'[]', 'application/json', dependencies) is False
+
+
+async def test_stale_while_revalidate(make_cache):
+    cache = make_cache()
+    policy = CachePolicy(max_stale=30)
+    _put(cache, 'page', b'old', [('team', 1)], policy)
+
+    changes.notify('team', 1)
+    entry = cache.get('page')
+    assert entry.body == b'old' and cache.is_stale(entry)
+
+    calls = []
+    async def refresh():
+        calls.append(1)
+        await asyncio.sleep(0)
+        _put(cache, 'page', b'new', [('team', 1)], policy)
+
+    cache.revalidate('page', refresh)
+    cache.revalidate('page', refresh)  # already refreshing
+    await asyncio.sleep(0.01)
+
+    assert calls == [1]
+    entry = cache.get('page')
+    assert entry.body == b'new' and not cache.is_stale(entry)
+
+
+def test_hard_ttl(make_cache):
+    cache = make_cache()
+    _put(cache, 'page', b'old', [], CachePolicy(soft_ttl=0, hard_ttl=0))
+    assert cache.get('page') is None
+
+
+def test_scanned_tables():
+    assert scanned_tables(select(User)) == {'user'}
+    assert scanned_tables(select(User).where(User.id.in_([1, 2]))) == set()
+    assert scanned_tables(select(User).join(TeamUser, TeamUser.user_id == User.id)
+                          .where(TeamUser.team_id.in_([1]))
+                          .where(User.level == 'senior')) == {'user'}
+
+
+def test_graphql_cache_key():
+    a = graphql_cache_key('{ userGetUsers { id } }', None, None)
+    b = graphql_cache_key('query {\n  userGetUsers {\n    id\n  }\n}', {}, None)
+    assert a == b
+    assert graphql_cache_key('mutation { userDeleteUser(id: 1) }', None, None) is None
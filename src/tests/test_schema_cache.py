@@ -0,0 +1,41 @@
+from starlette.requests import Request
+
+from src.formats import DEFAULT
+from src.schema_cache import INTROSPECTION_QUERY, SchemaCache, cached_response
+from src.services.er_diagram import BaseEntity
+import src.db  # noqa: F401, imports the models before the entities
+import src.services.team.schema, src.services.sprint.schema, src.services.story.schema  # noqa: F401
+import src.services.task.schema, src.services.user.schema  # noqa: F401
+
+
+class Base:
+    """a registry of entities which may change, like BaseEntity"""
+    entities = list(BaseEntity.entities)
+    get_diagram = staticmethod(BaseEntity.get_diagram)
+
+
+def _request(etag=None):
+    headers = [(b'if-none-match', etag.encode())] if etag else []
+    return Request({'type': 'http', 'method': 'GET', 'path': '/schema', 'headers': headers})
+
+
+def test_built_once_per_diagram():
+    cache = SchemaCache(Base)
+    artifacts = cache.current()
+    assert b'type Team' in artifacts.sdl and b'directive @defer' in artifacts.sdl
+    assert artifacts.introspect(INTROSPECTION_QUERY) is artifacts.introspect(INTROSPECTION_QUERY)
+    assert cache.current() is artifacts and cache.builds == 1
+
+    team = artifacts.introspect('{ __type(name: "Team") { name } }')
+    assert team.data == {'data': {'__type': {'name': 'Team'}}}
+    assert team.body(DEFAULT) == b'{"data":{"__type":{"name":"Team"}}}'
+
+    Base.entities.append(object())
+    assert cache.current() is not artifacts and cache.builds == 2
+
+
+def test_etag():
+    response = cached_response(_request(), b'type Query', 'text/plain')
+    assert response.status_code == 200
+    assert cached_response(_request(response.headers['etag']), b'type Query', 'text/plain').status_code == 304
+    assert cached_response(_request(response.headers['etag']), b'type Team', 'text/plain').status_code == 200
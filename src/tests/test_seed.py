@@ -0,0 +1,40 @@
+import json
+
+from sqlalchemy import inspect, select, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import src.db  # noqa: F401
+from src.seed import bulk_load, load_path
+from src.services.task.model import Task
+
+
+async def test_load_dataset_directory(tmp_path):
+    (tmp_path / 'team.csv').write_text('id,name\n1,team-a\n2,team-b\n')
+    (tmp_path / 'task.ndjson').write_text('\n'.join(
+        json.dumps(dict(id=i, name=f'task-{i}', owner_id=1, story_id=i % 3, estimate=2)) for i in range(1, 8)))
+    (tmp_path / 'README.md').write_text('not a table')
+
+    engine = create_async_engine('sqlite+aiosqlite://')
+    report = await load_path(engine, tmp_path, batch_size=3)
+    assert report.rows == {'task': 7, 'team': 2} and report.total == 9 and report.rows_per_second > 0
+
+    async with engine.connect() as conn:
+        assert (await conn.execute(text('select id, name from team order by id'))).all() == [(1, 'team-a'), (2, 'team-b')]
+        assert (await conn.execute(select(Task.id).where(Task.story_id == 1))).scalars().all() == [1, 4, 7]
+        indexes = await conn.run_sync(lambda sync: inspect(sync).get_indexes('task'))
+        assert [i['column_names'] for i in indexes] == [['story_id']]
+    await engine.dispose()
+
+
+async def test_load_is_one_transaction():
+    engine = create_async_engine('sqlite+aiosqlite://')
+    rows = [dict(id=1, name='a', level='junior'), dict(id=1, name='duplicate', level='junior')]
+    try:
+        await bulk_load(engine, {'user': rows}, batch_size=1)
+    except Exception:
+        pass
+    else:
+        raise AssertionError('duplicate key loaded')
+    async with engine.connect() as conn:
+        assert (await conn.execute(text('select count(*) from user'))).scalar() == 0
+    await engine.dispose()
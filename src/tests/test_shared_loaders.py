@@ -0,0 +1,50 @@
+import asyncio
+from typing import Optional
+
+from pydantic import BaseModel
+from pydantic_resolve import Loader, Resolver, build_object
+
+from src.shared_loaders import shared_loaders, with_shared_loaders
+
+USERS = {1: dict(id=1, name='John'), 2: dict(id=2, name='Eric')}
+calls = []
+
+
+async def user_loader(keys):
+    calls.append(sorted(keys))
+    return build_object([USERS[k] for k in keys if k in USERS], keys, lambda u: u['id'])
+
+
+class User(BaseModel):
+    id: int
+    name: str
+
+
+class Task(BaseModel):
+    id: int
+    owner_id: int
+    owner: Optional[User] = None
+
+    def resolve_owner(self, loader=Loader(user_loader)):
+        return loader.load(self.owner_id)
+
+
+SharedResolver = with_shared_loaders(Resolver)
+
+
+async def _resolve_twice():
+    first = [Task(id=1, owner_id=1), Task(id=2, owner_id=2)]
+    second = [Task(id=3, owner_id=2)]
+    return await asyncio.gather(SharedResolver().resolve(first), SharedResolver().resolve(second))
+
+
+async def test_loaders_shared_inside_block():
+    calls.clear()
+    with shared_loaders():
+        first, second = await _resolve_twice()
+    assert calls == [[1, 2]]  # one batch, key 2 loaded once
+    assert second[0].owner.name == 'Eric'
+
+    calls.clear()
+    await _resolve_twice()
+    assert len(calls) == 2  # outside of the block, each resolver has its own loader
@@ -0,0 +1,51 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src import snapshot
+from src.dataset import DatasetSpec, load
+
+
+async def count(engine, table: str) -> int:
+    async with engine.connect() as conn:
+        return (await conn.execute(text(f'select count(*) from {table}'))).scalar()
+
+
+async def test_restore_into_memory(tmp_path):
+    path = str(tmp_path / 'db.snapshot')
+    spec = DatasetSpec(teams=3)
+    version = snapshot.version(repr(spec))
+    assert version == snapshot.version(repr(spec)) != snapshot.version(repr(DatasetSpec(teams=4)))
+
+    built = []
+
+    async def build():
+        built.append(True)
+        await load(engine, spec)
+
+    engine = create_async_engine('sqlite+aiosqlite://')
+    assert 'built and saved' in await snapshot.restore_or_build(engine, path, version, build)
+    assert snapshot.snapshot_version(path) == version and built == [True]
+    await engine.dispose()
+
+    engine = create_async_engine('sqlite+aiosqlite://')
+    assert 'restored' in await snapshot.restore_or_build(engine, path, version, build)
+    assert built == [True]
+    assert await count(engine, 'task') == spec.rows['task']
+    async with engine.connect() as conn:  # indexes come with the pages
+        assert (await conn.execute(text("select count(*) from sqlite_master where type = 'index'"))).scalar() == 4
+    await engine.dispose()
+
+
+async def test_other_version_is_rebuilt(tmp_path):
+    path = str(tmp_path / 'db.snapshot')
+    engine = create_async_engine('sqlite+aiosqlite://')
+    await load(engine, DatasetSpec(teams=1))
+    await snapshot.save(engine, path, 1)
+    await engine.dispose()
+
+    engine = create_async_engine('sqlite+aiosqlite://')
+    assert not await snapshot.restore(engine, path, 2)
+    assert not await snapshot.restore(engine, str(tmp_path / 'missing'), 1)
+    assert await snapshot.restore(engine, path, 1)
+    assert await count(engine, 'team') == 1
+    await engine.dispose()
@@ -0,0 +1,34 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+from graphql import parse, validate
+
+import src.main as main
+from src.warmup import generated_queries, route_paths, warmup
+
+
+def test_generated_queries_are_valid():
+    queries = generated_queries(main.graphql_handler.schema, depth=3)
+    assert len(queries) == len(main.graphql_handler.schema.query_type.fields)
+    for query in queries:
+        assert validate(main.graphql_handler.schema, parse(query)) == []
+
+
+async def warmed():
+    if warmup._task is not None:
+        await asyncio.wait_for(asyncio.shield(warmup._task), 30)
+
+
+def test_ready_after_warmup():
+    paths = route_paths(main.app)
+    assert '/sample_5/page-info/1' in paths and '/ready' not in paths and '/graphql' not in paths
+
+    with TestClient(main.app) as client:
+        client.portal.call(warmed)
+        response = client.get('/ready')
+        assert response.status_code == 200
+        report = response.json()['warmup']
+        assert report['routes'] == len(paths)
+        assert report['graphql'] >= len(main.graphql_handler.schema.query_type.fields)
+        assert not [f for f in report['failed'] if f['path'] == '/graphql']
+
@@ -0,0 +1,169 @@
+"""
+Warmup of a worker before it takes traffic, and its readiness.
+
+The first request to a route pays one-time costs: the Resolver's analysis of
+the response model, the discovery of its loaders, the compilation of the
+SQLAlchemy statements, the response models of a GraphQL selection. In a
+rolling deploy that first request is a production request, and the p99 of
+every new worker spikes.
+
+`Warmup.run` is started by the lifespan once the database is ready. It sends,
+in process through the whole ASGI stack (middlewares, ETags, caches):
+- a GET to every API route in the OpenAPI schema, path parameters set to
+  `WARMUP_PATH_PARAM` (1); routes with a body or required query parameters
+  are skipped
+- a POST /graphql of every query operation of the persisted documents without
+  required variables, and unless only those are allowed, of one generated
+  query per root field selecting `WARMUP_GRAPHQL_DEPTH` (3) levels of fields
+  without required arguments
+
+`/ready` answers 503 until it is done, then 200 with the report; a request
+that fails is logged and reported, it doesn't keep the worker out of service.
+`WARMUP=0` skips it, the worker is ready once the database is.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Optional
+
+from fastapi.routing import APIRoute
+from graphql import GraphQLNonNull, GraphQLObjectType, GraphQLSchema, get_named_type
+from graphql.language.ast import NonNullTypeNode, OperationType
+from starlette.types import ASGIApp
+
+logger = logging.getLogger(__name__)
+
+WARMUP = os.getenv('WARMUP', '1') == '1'
+WARMUP_PATH_PARAM = os.getenv('WARMUP_PATH_PARAM', '1')
+WARMUP_GRAPHQL_DEPTH = int(os.getenv('WARMUP_GRAPHQL_DEPTH', '3'))
+GRAPHQL_PATH = '/graphql'
+
+
+async def request(app: ASGIApp, method: str, path: str, body: Optional[dict] = None) -> int:
+    """status of a request sent to app in process, the response body is dropped."""
+    content = json.dumps(body).encode() if body is not None else b''
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'scheme': 'http',
+        'method': method, 'path': path, 'raw_path': path.encode(), 'root_path': '', 'query_string': b'',
+        'headers': [(b'host', b'warmup'), (b'accept', b'application/json'),
+                    (b'content-type', b'application/json'), (b'content-length', str(len(content)).encode())],
+        'client': ('127.0.0.1', 0), 'server': ('warmup', 80),
+    }
+    received = False
+    status = 500
+
+    async def receive():
+        nonlocal received
+        if received:
+            await asyncio.Event().wait()  # no disconnect while the response is sent
+        received = True
+        return {'type': 'http.request', 'body': content, 'more_body': False}
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    await app(scope, receive, send)
+    return status
+
+
+def route_paths(app) -> list[str]:
+    """GET paths of the API routes, path parameters filled (GraphQL is warmed by its queries)."""
+    paths = []
+    for route in app.routes:
+        if isinstance(route, APIRoute) and 'GET' in route.methods and route.include_in_schema \
+                and route.path != GRAPHQL_PATH and not route.dependant.body_params \
+                and not any(p.required for p in route.dependant.query_params):
+            paths.append(route.path_format.format(**{name: WARMUP_PATH_PARAM for name in route.param_convertors}))
+    return paths
+
+
+def selection(type_: GraphQLObjectType, depth: int) -> str:
+    fields = []
+    for name, field in type_.fields.items():
+        if any(isinstance(arg.type, GraphQLNonNull) and arg.default_value is None for arg in field.args.values()):
+            continue
+        named = get_named_type(field.type)
+        if isinstance(named, GraphQLObjectType):
+            if depth > 1:
+                fields.append(f'{name} {selection(named, depth - 1)}')
+        else:
+            fields.append(name)
+    return '{ ' + ' '.join(fields) + ' }'
+
+
+def generated_queries(schema: GraphQLSchema, depth: int) -> list[str]:
+    """one query per root field of schema, its fields selected depth levels deep."""
+    return [f'query Warmup {{ {name} {selection(get_named_type(field.type), depth)} }}'
+            for name, field in schema.query_type.fields.items()
+            if isinstance(get_named_type(field.type), GraphQLObjectType)
+            and not any(isinstance(arg.type, GraphQLNonNull) for arg in field.args.values())]
+
+
+def persisted_operations(documents) -> list[dict[str, Any]]:
+    """a GraphQL request for each query operation of the pinned documents without required variables."""
+    requests = []
+    for prepared in documents.pinned():
+        for node in prepared.document.definitions:
+            if getattr(node, 'operation', None) != OperationType.QUERY:
+                continue
+            if any(isinstance(v.type, NonNullTypeNode) and v.default_value is None
+                   for v in node.variable_definitions or ()):
+                continue
+            requests.append({'query': prepared.query, 'operationName': node.name.value if node.name else None})
+    return requests
+
+
+class Warmup:
+    def __init__(self):
+        self.ready = False
+        self.report: dict[str, Any] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, app, handler, documents, persisted_queries):
+        """run the warmup in the background, the worker answers /ready with 503 meanwhile."""
+        self.ready = False
+        if not WARMUP:
+            self.ready = True
+            return
+        self._task = asyncio.create_task(self.run(app, handler, documents, persisted_queries))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run(self, app, handler, documents, persisted_queries):
+        start = time.perf_counter()
+        failed = []
+        graphql = persisted_operations(documents)
+        if not persisted_queries.allow_list:
+            graphql += [{'query': q} for q in generated_queries(handler.schema, WARMUP_GRAPHQL_DEPTH)]
+        paths = route_paths(app)
+
+        for method, path, body in [('GET', p, None) for p in paths] + [('POST', GRAPHQL_PATH, b) for b in graphql]:
+            try:
+                status = await request(app, method, path, body)
+            except Exception as e:
+                logger.warning(f'warmup {method} {path} failed: {e!r}')
+                status = type(e).__name__
+            if status != 200:
+                entry = {'method': method, 'path': path, 'status': status}
+                if body is not None:
+                    entry['operation'] = body.get('operationName') or body['query'][:80]
+                failed.append(entry)
+
+        self.report = dict(routes=len(paths), graphql=len(graphql), failed=failed,
+                           seconds=round(time.perf_counter() - start, 3))
+        self.ready = True
+        logger.info(f'warmup done: {self.report}')
+
+
+warmup = Warmup()